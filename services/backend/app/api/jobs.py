@@ -0,0 +1,84 @@
+from app.database import get_database
+from app.services.jobs import (
+    CreateJobPayload,
+    InvalidJobError,
+    JobModel,
+    JobResultUnavailableError,
+    cancel_job_svc,
+    create_job_svc,
+    get_job_result_svc,
+    get_job_svc,
+)
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from prisma import Prisma
+
+router = APIRouter()
+
+
+@router.post("", response_model=JobModel, status_code=202)
+async def create_job(payload: CreateJobPayload, db: Prisma = Depends(get_database)):
+    """
+    Queue an export or a log generation to run in the background
+    """
+
+    try:
+        return await create_job_svc(payload, db)
+    except InvalidJobError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=JobModel)
+async def get_job(job_id: str, db: Prisma = Depends(get_database)):
+    """
+    Get the status and progress of a job
+    """
+
+    try:
+        job = await get_job_svc(job_id, db)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/{job_id}", response_model=JobModel)
+async def cancel_job(job_id: str, db: Prisma = Depends(get_database)):
+    """
+    Cancel a queued or running job
+    """
+
+    try:
+        job = await cancel_job_svc(job_id, db)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, db: Prisma = Depends(get_database)):
+    """
+    Download the file of a finished export, Range requests resume it
+    """
+
+    try:
+        result = await get_job_result_svc(job_id, db)
+        if not result:
+            raise HTTPException(status_code=404, detail="Job not found")
+        path, media_type, filename = result
+        return FileResponse(path, media_type=media_type, filename=filename)
+    except HTTPException:
+        raise
+    except JobResultUnavailableError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
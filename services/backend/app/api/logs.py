@@ -1,9 +1,18 @@
-import csv
-from io import StringIO
+from functools import partial
 
-from app.database import get_database
+import asyncpg
+from app.database import get_database, get_read_database, get_read_pool
+from app.models.log_models import CountMode
 from app.services.create_log import CreateLogPayload, CreateLogResponse, create_log_svc
 from app.services.delete_log import delete_log_svc
+from app.services.export_logs import (
+    ExportCompression,
+    ExportFormat,
+    ExportLogsParameter,
+    UnsupportedExportError,
+    export_content_info,
+    export_logs_svc,
+)
 from app.services.generate_logs import (
     GenerateLogsPayload,
     GenerateLogsResponse,
@@ -11,128 +20,302 @@ from app.services.generate_logs import (
 )
 from app.services.get_aggregated_logs import (
     GetAggregatedLogsResponse,
+    UnsupportedCountModeError,
     get_aggregated_logs_svc,
 )
 from app.services.get_log import GetLogResponse, get_log_svc
-from app.services.get_logs import GetLogsParameter, GetLogsResponse, get_logs_svc
+from app.services.get_log_patterns import (
+    GetLogPatternsParameter,
+    GetLogPatternsResponse,
+    get_log_patterns_svc,
+)
+from app.services.get_logs import (
+    GetLogsParameter,
+    GetLogsResponse,
+    get_logs_svc,
+    normalize_sort,
+)
+from app.services.get_logs_fast import get_logs_fast_svc
+from app.services.get_logs_histogram import (
+    GetLogsHistogramParameter,
+    GetLogsHistogramResponse,
+    HistogramInterval,
+    HistogramRangeError,
+    HistogramSplit,
+    get_logs_histogram_svc,
+)
+from app.services.ingest_logs import (
+    BulkIngestLogsResponse,
+    IngestPayloadError,
+    IngestPayloadTooLargeError,
+    IngestQueueFullError,
+    ingest_logs_svc,
+    ingest_queue,
+    parse_ingest_body,
+    read_ingest_body,
+)
+from app.services.log_archive import ArchivedLogError
+from app.services.log_purge import (
+    LOG_PURGE_BATCH_SIZE,
+    EmptyPurgeFilterError,
+    LogPurgeJobModel,
+    LogPurgeParameter,
+    cancel_log_purge_svc,
+    create_log_purge_svc,
+    get_log_purge_svc,
+)
+from app.services.log_stream import StreamLogsParameter, stream_logs_svc
+from app.services.response_cache import cached_response
 from app.services.update_log import UpdateLogResponse, update_log_svc
-from fastapi import APIRouter, Depends, HTTPException
+from app.utils.cursor import InvalidCursorError
+from app.utils.log_filters import LogFilterParameter
+from app.utils.metadata import InvalidMetadataFilterError, parse_metadata_filters
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from prisma import Prisma
+from pydantic import ValidationError
 
 router = APIRouter()
 
 
-@router.get("", response_model=GetLogsResponse)
-async def get_logs(
-    severity: str | None = None,
-    source: str | None = None,
+def log_filter_query(
+    severity: list[str] | None = Query(
+        None, description="Severities to include, comma separated or repeated"
+    ),
+    exclude_severity: list[str] | None = Query(None),
+    min_severity: str | None = Query(
+        None, description="Only this severity and the more severe ones"
+    ),
+    source: list[str] | None = Query(
+        None, description="Sources to include, comma separated or repeated"
+    ),
+    exclude_source: list[str] | None = Query(None),
+    source_prefix: str | None = None,
+    q: str | None = Query(None, min_length=3),
     start_date: str | None = None,
     end_date: str | None = None,
+) -> LogFilterParameter:
+    """The filters shared by the log endpoints"""
+    try:
+        return LogFilterParameter(
+            severity=severity,
+            exclude_severity=exclude_severity,
+            min_severity=min_severity,
+            source=source,
+            exclude_source=exclude_source,
+            source_prefix=source_prefix,
+            q=q,
+            start_date=start_date,
+            end_date=end_date,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def metadata_filters(request: Request) -> dict[str, str]:
+    """The `meta.<key>=<value>` query parameters"""
+    try:
+        return parse_metadata_filters(request.query_params)
+    except InvalidMetadataFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("", response_model=GetLogsResponse)
+async def get_logs(
+    request: Request,
+    filters: LogFilterParameter = Depends(log_filter_query),
     limit: int = 100,
     offset: int = 0,
     sort_by: str = "timestamp",
     sort_order: str = "desc",
-    db: Prisma = Depends(get_database),
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.EXACT,
+    meta: dict[str, str] = Depends(metadata_filters),
+    db: Prisma = Depends(get_read_database),
+    pool: asyncpg.Pool | None = Depends(get_read_pool),
 ):
     """
     Get log entries based on filters
     """
 
     parameter = GetLogsParameter(
-        severity=severity,
-        source=source,
-        start_date=start_date,
-        end_date=end_date,
+        **filters.model_dump(),
         limit=limit,
         offset=offset,
         sort_by=sort_by,
         sort_order=sort_order,
+        cursor=cursor,
+        count_mode=count_mode,
+        meta=meta,
     )
 
+    normalize_sort(parameter)
+
     try:
-        return await get_logs_svc(parameter, db)
+        if pool is not None:
+            compute = partial(get_logs_fast_svc, parameter, db, pool)
+        else:
+            compute = partial(get_logs_svc, parameter, db)
+        return await cached_response(request, "logs", parameter, compute)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/aggregated", response_model=GetAggregatedLogsResponse)
 async def get_aggreagated_logs(
-    severity: str | None = None,
-    source: str | None = None,
-    start_date: str | None = None,
-    end_date: str | None = None,
+    request: Request,
+    filters: LogFilterParameter = Depends(log_filter_query),
     limit: int = 100,
     offset: int = 0,
-    db: Prisma = Depends(get_database),
+    count_mode: CountMode = CountMode.EXACT,
+    meta: dict[str, str] = Depends(metadata_filters),
+    db: Prisma = Depends(get_read_database),
 ):
     """
     Get aggregated log entries based on filters
     """
 
     parameter = GetLogsParameter(
-        severity=severity,
-        source=source,
-        start_date=start_date,
-        end_date=end_date,
+        **filters.model_dump(),
         limit=limit,
         offset=offset,
+        count_mode=count_mode,
+        meta=meta,
     )
 
     try:
-        return await get_aggregated_logs_svc(parameter, db)
+        return await cached_response(
+            request,
+            "aggregated",
+            parameter,
+            lambda: get_aggregated_logs_svc(parameter, db),
+        )
+    except UnsupportedCountModeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/download")
 async def download_logs(
-    severity: str | None = None,
-    source: str | None = None,
-    start_date: str | None = None,
-    end_date: str | None = None,
-    limit: int = 10000,
+    filters: LogFilterParameter = Depends(log_filter_query),
+    limit: int | None = None,
     offset: int = 0,
     sort_by: str = "timestamp",
     sort_order: str = "desc",
-    db: Prisma = Depends(get_database),
+    cursor: str | None = None,
+    format: ExportFormat = ExportFormat.CSV,
+    compression: ExportCompression = ExportCompression.NONE,
+    meta: dict[str, str] = Depends(metadata_filters),
+    db: Prisma = Depends(get_read_database),
 ):
     """
     Download log entries based on filters
     """
 
-    parameter = GetLogsParameter(
-        severity=severity,
-        source=source,
-        start_date=start_date,
-        end_date=end_date,
+    parameter = ExportLogsParameter(
+        **filters.model_dump(),
         limit=limit,
         offset=offset,
         sort_by=sort_by,
         sort_order=sort_order,
+        cursor=cursor,
+        format=format,
+        compression=compression,
+        meta=meta,
     )
 
     try:
-        logs_response = await get_logs_svc(parameter, db)
+        media_type, filename = export_content_info(parameter)
+        chunks = export_logs_svc(parameter, db)
 
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["id", "severity", "message", "source", "timestamp"])
-        for log in logs_response.logs:
-            writer.writerow(
-                [log.id, log.severity, log.message, log.source, log.timestamp]
-            )
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+    except (InvalidCursorError, UnsupportedExportError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        output.seek(0)
-        return StreamingResponse(
-            output,
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=logs.csv"},
+
+@router.get("/histogram", response_model=GetLogsHistogramResponse)
+async def get_logs_histogram(
+    filters: LogFilterParameter = Depends(log_filter_query),
+    interval: HistogramInterval = HistogramInterval.ONE_HOUR,
+    split_by: HistogramSplit | None = None,
+    db: Prisma = Depends(get_read_database),
+):
+    """
+    Get log counts per time interval based on filters
+    """
+
+    parameter = GetLogsHistogramParameter(
+        **filters.model_dump(),
+        interval=interval,
+        split_by=split_by,
+    )
+
+    try:
+        return await get_logs_histogram_svc(parameter, db)
+    except HistogramRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/patterns", response_model=GetLogPatternsResponse)
+async def get_log_patterns(
+    request: Request,
+    filters: LogFilterParameter = Depends(log_filter_query),
+    limit: int = 20,
+    count_mode: CountMode = CountMode.EXACT,
+    meta: dict[str, str] = Depends(metadata_filters),
+    db: Prisma = Depends(get_read_database),
+):
+    """
+    Get the most frequent message patterns based on filters
+    """
+
+    try:
+        parameter = GetLogPatternsParameter(
+            **filters.model_dump(), limit=limit, count_mode=count_mode, meta=meta
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        return await cached_response(
+            request,
+            "patterns",
+            parameter,
+            lambda: get_log_patterns_svc(parameter, db),
         )
+    except UnsupportedCountModeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stream")
+async def stream_logs(
+    filters: LogFilterParameter = Depends(log_filter_query),
+):
+    """
+    Stream new log entries matching the filters as server-sent events
+    """
+
+    parameter = StreamLogsParameter(
+        **filters.model_dump(exclude={"start_date", "end_date"})
+    )
+
+    return StreamingResponse(
+        stream_logs_svc(parameter),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/generate", response_model=GenerateLogsResponse)
 async def generate_log(
     payload: GenerateLogsPayload, db: Prisma = Depends(get_database)
@@ -159,8 +342,94 @@ async def create_log(payload: CreateLogPayload, db: Prisma = Depends(get_databas
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/bulk", response_model=BulkIngestLogsResponse, status_code=201)
+async def ingest_logs(
+    request: Request, response: Response, db: Prisma = Depends(get_database)
+):
+    """
+    Create log entries in bulk from a JSON array or NDJSON body
+    """
+
+    try:
+        ingest_queue.check()
+        body = await read_ingest_body(
+            request.stream(), request.headers.get("content-encoding")
+        )
+        items, errors = parse_ingest_body(body, request.headers.get("content-type"))
+        result = await ingest_logs_svc(items, errors, db)
+        response.status_code = result.status_code
+        return result
+    except IngestQueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except IngestPayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestPayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/purge", response_model=LogPurgeJobModel, status_code=202)
+async def purge_logs(
+    filters: LogFilterParameter = Depends(log_filter_query),
+    batch_size: int = Query(LOG_PURGE_BATCH_SIZE, ge=100, le=100_000),
+    meta: dict[str, str] = Depends(metadata_filters),
+    db: Prisma = Depends(get_database),
+):
+    """
+    Delete every log matching the filters in the background
+    """
+
+    parameter = LogPurgeParameter(**filters.model_dump(), meta=meta)
+
+    try:
+        return await create_log_purge_svc(parameter, db, batch_size)
+    except EmptyPurgeFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/purge/{job_id}", response_model=LogPurgeJobModel)
+async def get_purge(job_id: str, db: Prisma = Depends(get_database)):
+    """
+    Get the progress of a purge
+    """
+
+    try:
+        job = await get_log_purge_svc(job_id, db)
+        if not job:
+            raise HTTPException(status_code=404, detail="Purge not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/purge/{job_id}", response_model=LogPurgeJobModel)
+async def cancel_purge(job_id: str, db: Prisma = Depends(get_database)):
+    """
+    Cancel a queued or running purge
+    """
+
+    try:
+        job = await cancel_log_purge_svc(job_id, db)
+        if not job:
+            raise HTTPException(status_code=404, detail="Purge not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{log_id}", response_model=GetLogResponse)
-async def get_log(log_id: str, db: Prisma = Depends(get_database)):
+async def get_log(log_id: str, db: Prisma = Depends(get_read_database)):
     """
     Get a log entry by ID
     """
@@ -170,6 +439,8 @@ async def get_log(log_id: str, db: Prisma = Depends(get_database)):
         if not log:
             raise HTTPException(status_code=404, detail="Log not found")
         return log
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -183,7 +454,14 @@ async def update_log(
     """
 
     try:
-        return await update_log_svc(log_id, payload, db)
+        log = await update_log_svc(log_id, payload, db)
+        if not log:
+            raise HTTPException(status_code=404, detail="Log not found")
+        return log
+    except HTTPException:
+        raise
+    except ArchivedLogError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -196,5 +474,7 @@ async def delete_log(log_id: str, db: Prisma = Depends(get_database)):
 
     try:
         await delete_log_svc(log_id, db)
+    except ArchivedLogError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
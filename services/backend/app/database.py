@@ -1,27 +1,228 @@
+import asyncio
+import os
+from datetime import timedelta
+from typing import Any, Optional
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+import asyncpg
 from dotenv import load_dotenv
 from prisma import Prisma
 
 # Load environment variables
 load_dotenv()
 
-# Global prisma instance
-db = Prisma()
+# Connections per client and process, the total is workers x this value
+DATABASE_POOL_SIZE = os.getenv("DATABASE_POOL_SIZE")
+# How long a query waits for a free connection before failing
+DATABASE_POOL_TIMEOUT_SECONDS = os.getenv("DATABASE_POOL_TIMEOUT_SECONDS", "10")
+DATABASE_CONNECT_TIMEOUT_SECONDS = int(
+    os.getenv("DATABASE_CONNECT_TIMEOUT_SECONDS", "10")
+)
+# Client side limit for a query round trip, 0 disables it
+DATABASE_QUERY_TIMEOUT_SECONDS = float(
+    os.getenv("DATABASE_QUERY_TIMEOUT_SECONDS", "30")
+)
+# Server side `statement_timeout`, 0 disables it
+DATABASE_STATEMENT_TIMEOUT_MS = int(os.getenv("DATABASE_STATEMENT_TIMEOUT_MS", "0"))
+# Read-only replica for the read endpoints, the primary serves them when unset
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Serve the list endpoint through asyncpg instead of the Prisma engine
+LOG_LIST_FAST_PATH = os.getenv("LOG_LIST_FAST_PATH", "true").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+
+# Prisma connection URL parameters that libpq based drivers don't accept
+_PRISMA_URL_PARAMETERS = {
+    "schema",
+    "connection_limit",
+    "pool_timeout",
+    "socket_timeout",
+    "pgbouncer",
+    "statement_cache_size",
+}
+
+# Gauges and histograms of the Prisma engine reported by `pool_stats`
+_POOL_GAUGES = {
+    "prisma_pool_connections_open": "open",
+    "prisma_pool_connections_busy": "busy",
+    "prisma_pool_connections_idle": "idle",
+    "prisma_client_queries_wait": "waiting_queries",
+}
+_POOL_HISTOGRAMS = {
+    "prisma_client_queries_wait_histogram_ms": "wait_ms",
+    "prisma_client_queries_duration_histogram_ms": "query_ms",
+}
+
+
+def database_url(url: str) -> str:
+    """
+    Add the pool and timeout settings to a connection URL.
+
+    Settings already present in the URL take precedence.
+    """
+
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    settings = {
+        "connection_limit": DATABASE_POOL_SIZE,
+        "pool_timeout": DATABASE_POOL_TIMEOUT_SECONDS,
+        "connect_timeout": str(DATABASE_CONNECT_TIMEOUT_SECONDS),
+    }
+    if DATABASE_STATEMENT_TIMEOUT_MS:
+        settings["options"] = f"-c statement_timeout={DATABASE_STATEMENT_TIMEOUT_MS}"
+    for key, value in settings.items():
+        if value is not None:
+            query.setdefault(key, value)
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+def libpq_url(url: str) -> tuple[str, Optional[str]]:
+    """
+    Connection URL for libpq based drivers and the schema it selects.
+
+    Prisma specific parameters are removed, the `schema` one has to be
+    applied as `search_path` by the caller.
+    """
+
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    dsn = urlunsplit(
+        parts._replace(
+            query=urlencode(
+                {
+                    key: value
+                    for key, value in query.items()
+                    if key not in _PRISMA_URL_PARAMETERS
+                }
+            )
+        )
+    )
+    return dsn, query.get("schema")
+
+
+def _create_client(url: Optional[str]) -> Prisma:
+    http = {}
+    if DATABASE_QUERY_TIMEOUT_SECONDS:
+        http["timeout"] = DATABASE_QUERY_TIMEOUT_SECONDS
+
+    return Prisma(
+        datasource={"url": database_url(url)} if url else None,
+        connect_timeout=timedelta(seconds=DATABASE_CONNECT_TIMEOUT_SECONDS),
+        http=http,
+    )
+
+
+# Global prisma instances
+db = _create_client(os.getenv("DATABASE_URL"))
+replica_db = _create_client(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else db
+
+# asyncpg pool on the read database for the raw SQL read paths
+read_pool: Optional[asyncpg.Pool] = None
+
+_connect_lock = asyncio.Lock()
+
+
+async def _connect(client: Prisma) -> Prisma:
+    # Concurrent first requests must not each start a query engine
+    if not client.is_connected():
+        async with _connect_lock:
+            if not client.is_connected():
+                await client.connect()
+    return client
 
 
 async def get_database() -> Prisma:
-    """Get database connection"""
-    if not db.is_connected():
-        await db.connect()
-    return db
+    """Get the primary database connection"""
+    return await _connect(db)
+
+
+async def get_read_database() -> Prisma:
+    """Get the connection for read-only queries, the replica when configured"""
+    return await _connect(replica_db)
+
+
+async def create_read_pool() -> asyncpg.Pool:
+    """asyncpg pool on the replica, or the primary, with the same limits"""
+    dsn, schema = libpq_url(DATABASE_REPLICA_URL or os.environ["DATABASE_URL"])
+
+    server_settings = {}
+    if schema:
+        server_settings["search_path"] = schema
+    if DATABASE_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(DATABASE_STATEMENT_TIMEOUT_MS)
+
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=1,
+        max_size=int(DATABASE_POOL_SIZE or 10),
+        timeout=DATABASE_CONNECT_TIMEOUT_SECONDS,
+        command_timeout=DATABASE_QUERY_TIMEOUT_SECONDS or None,
+        server_settings=server_settings,
+    )
+
+
+async def get_read_pool() -> Optional[asyncpg.Pool]:
+    """The asyncpg read pool, `None` when the fast path is disabled"""
+    return read_pool
+
+
+async def connect_database() -> None:
+    """Connect every client, called when the application starts"""
+    global read_pool
+
+    await _connect(db)
+    await _connect(replica_db)
+    if LOG_LIST_FAST_PATH and read_pool is None:
+        read_pool = await create_read_pool()
 
 
 async def disconnect_database():
     """Disconnect from database"""
-    if db.is_connected():
-        await db.disconnect()
+    global read_pool
+
+    if read_pool is not None:
+        await read_pool.close()
+        read_pool = None
+    for client in {id(db): db, id(replica_db): replica_db}.values():
+        if client.is_connected():
+            await client.disconnect()
 
 
 async def init_database():
     """Initialize database connection for testing or manual use"""
     await db.connect()
     return db
+
+
+async def pool_stats(client: Prisma) -> dict[str, Any]:
+    """Connection pool utilization and wait times of a client"""
+    metrics = await client.get_metrics()
+
+    stats: dict[str, Any] = {}
+    for gauge in metrics.gauges:
+        if gauge.key in _POOL_GAUGES:
+            stats[_POOL_GAUGES[gauge.key]] = gauge.value
+    for histogram in metrics.histograms:
+        if histogram.key in _POOL_HISTOGRAMS:
+            value = histogram.value
+            stats[_POOL_HISTOGRAMS[histogram.key]] = {
+                "count": value.count,
+                "avg": round(value.sum / value.count, 3) if value.count else 0,
+            }
+    return stats
+
+
+async def database_stats() -> dict[str, Any]:
+    """Pool statistics of the primary and, when configured, the replica"""
+    stats = {"primary": await pool_stats(db)}
+    if replica_db is not db:
+        stats["replica"] = await pool_stats(replica_db)
+    if read_pool is not None:
+        stats["read_pool"] = {
+            "size": read_pool.get_size(),
+            "idle": read_pool.get_idle_size(),
+            "max": read_pool.get_max_size(),
+        }
+    return stats
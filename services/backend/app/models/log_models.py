@@ -1,7 +1,9 @@
+import json
 from datetime import datetime
 from enum import Enum
+from typing import Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class SeverityLevel(str, Enum):
@@ -12,9 +14,44 @@ class SeverityLevel(str, Enum):
     FATAL = "FATAL"
 
 
+# Codes stored in the smallint `severity` column, in level order
+SEVERITY_CODES = {severity.value: code for code, severity in enumerate(SeverityLevel)}
+SEVERITY_NAMES = list(SEVERITY_CODES)
+
+
+def severity_code(severity: str) -> int:
+    return SEVERITY_CODES[SeverityLevel(severity).value]
+
+
+def severity_name(severity: int | str) -> str:
+    """Name of a stored severity code, names are returned as they are"""
+    return SEVERITY_NAMES[severity] if isinstance(severity, int) else severity
+
+
 class LogModel(BaseModel):
+    # Plain strings like the rows Prisma returns
+    model_config = ConfigDict(use_enum_values=True)
+
     id: str
     severity: SeverityLevel
     message: str
     source: str
     timestamp: datetime
+    metadata: dict[str, Any] = Field(default_factory=dict)
+
+    @field_validator("metadata", mode="before")
+    @classmethod
+    def _parse_metadata(cls, value: Any) -> Any:
+        # Raw queries may hand jsonb over as text
+        if isinstance(value, (str, bytes)):
+            return json.loads(value)
+        return value if value is not None else {}
+
+
+class CountMode(str, Enum):
+    # Count the matching rows
+    EXACT = "exact"
+    # Planner or rollup based estimate
+    ESTIMATED = "estimated"
+    # Skip the count, only report whether more rows follow
+    NONE = "none"
@@ -1,5 +1,17 @@
-from app.models.log_models import LogModel, SeverityLevel
-from prisma import Prisma
+from datetime import UTC, datetime
+from typing import Any
+
+from app.models.log_models import LogModel, SeverityLevel, severity_code
+from app.services.log_patterns import log_patterns
+from app.services.log_rollups import record_created_logs
+from app.services.log_sources import log_sources
+from app.services.log_stream import log_stream_hub
+from app.services.log_write_buffer import WriteDurability, log_write_buffer
+from app.services.metrics import instrumented
+from app.services.response_cache import response_cache
+from app.utils.patterns import message_pattern
+from app.utils.time_buckets import truncate_ms
+from prisma import Json, Prisma
 from pydantic import BaseModel, Field
 from uuid_utils import uuid7
 
@@ -8,31 +20,57 @@ class CreateLogPayload(BaseModel):
     severity: SeverityLevel
     message: str = Field(..., max_length=1024)
     source: str = Field(..., max_length=256)
+    metadata: dict[str, Any] = Field(default_factory=dict)
 
 
 class CreateLogResponse(LogModel):
     status_code: int
 
 
+@instrumented()
 async def create_log_svc(log: CreateLogPayload, db: Prisma) -> CreateLogResponse:
     """
     Service to create a new log entry
+
+    With the write buffer enabled the id and timestamp are assigned here
+    and the row is inserted by the buffer's next batch.
     """
 
-    created_log = await db.log.create(
-        data={
+    if log_write_buffer.running:
+        row = {
             "id": str(uuid7()),
             "severity": log.severity,
             "message": log.message,
             "source": log.source,
+            "timestamp": truncate_ms(datetime.now(UTC)),
+            "metadata": log.metadata,
         }
-    )
-
-    return CreateLogResponse(
-        id=created_log.id,
-        severity=created_log.severity,
-        message=created_log.message,
-        source=created_log.source,
-        timestamp=created_log.timestamp,
-        status_code=201,
-    )
+        await log_write_buffer.submit(row)
+
+        return CreateLogResponse(
+            **row,
+            status_code=(
+                202 if log_write_buffer.durability == WriteDurability.ENQUEUE else 201
+            ),
+        )
+
+    source_ids = await log_sources.ids(db, [log.source])
+    await log_patterns.register(db, [log.message])
+
+    async with db.tx() as transaction:
+        created_log = await transaction.log.create(
+            data={
+                "id": str(uuid7()),
+                "severity": severity_code(log.severity),
+                "message": log.message,
+                "source_id": source_ids[log.source],
+                "metadata": Json(log.metadata),
+                "pattern_id": message_pattern(log.message)[0],
+            }
+        )
+        [created] = await log_sources.log_models(db, [created_log])
+        await record_created_logs(transaction, [created])
+    await response_cache.invalidate(created.timestamp, created.timestamp)
+    await log_stream_hub.publish(db, [created])
+
+    return CreateLogResponse(**created.model_dump(), status_code=201)
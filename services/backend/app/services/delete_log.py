@@ -1,9 +1,31 @@
+from app.services.log_archive import ArchivedLogError, log_archive
+from app.services.log_rollups import record_deleted_logs
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented
+from app.services.response_cache import response_cache
 from prisma import Prisma
 
 
+@instrumented()
 async def delete_log_svc(log_id: str, db: Prisma) -> None:
     """
     Service to delete a log entry by ID
+
+    Archived logs are read-only, deleting one raises `ArchivedLogError`.
     """
 
-    await db.log.delete(where={"id": log_id})
+    async with db.tx() as transaction:
+        log = await transaction.log.find_first(where={"id": log_id})
+        if not log:
+            if await log_archive.find(db, log_id):
+                raise ArchivedLogError("Log is archived")
+            return
+
+        await transaction.log.delete(
+            where={"id_timestamp": {"id": log.id, "timestamp": log.timestamp}}
+        )
+        [deleted] = await log_sources.log_models(db, [log])
+        await record_deleted_logs(
+            transaction, [{**deleted.model_dump(), "pattern_id": log.pattern_id}]
+        )
+    await response_cache.invalidate(log.timestamp, log.timestamp)
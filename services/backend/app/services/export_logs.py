@@ -0,0 +1,386 @@
+import csv
+import json
+import zlib
+from enum import Enum
+from io import StringIO
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+from app.services.get_logs import GetLogsParameter, find_logs, normalize_sort
+from app.services.log_sources import log_sources
+from app.utils.cursor import decode_cursor, encode_cursor, keyset_values
+from prisma import Prisma
+from pydantic import Field
+
+EXPORT_BATCH_SIZE = 5000
+
+# Parquet readers work best with large row groups, so keyset batches are
+# buffered up to this many rows before a row group is written
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+EXPORT_COLUMNS = ["id", "severity", "message", "source", "timestamp", "metadata"]
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+class ExportCompression(str, Enum):
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+class UnsupportedExportError(ValueError):
+    pass
+
+
+class ExportLogsParameter(GetLogsParameter):
+    limit: Optional[int] = Field(None, gte=1)
+    format: ExportFormat = ExportFormat.CSV
+    compression: ExportCompression = ExportCompression.NONE
+
+
+ARROW_SCHEMA = pa.schema(
+    [
+        pa.field("id", pa.string(), nullable=False),
+        pa.field("severity", pa.dictionary(pa.int8(), pa.string()), nullable=False),
+        pa.field("message", pa.string(), nullable=False),
+        pa.field("source", pa.dictionary(pa.int32(), pa.string()), nullable=False),
+        pa.field("timestamp", pa.timestamp("ms", tz="UTC"), nullable=False),
+        # JSON text, the keys differ from log to log
+        pa.field("metadata", pa.string(), nullable=False),
+    ]
+)
+
+_MEDIA_TYPES = {
+    ExportFormat.CSV: ("text/csv", "csv"),
+    ExportFormat.NDJSON: ("application/x-ndjson", "ndjson"),
+    ExportFormat.ARROW: ("application/vnd.apache.arrow.stream", "arrows"),
+    ExportFormat.PARQUET: ("application/vnd.apache.parquet", "parquet"),
+}
+
+_COMPRESSED_MEDIA_TYPES = {
+    ExportCompression.GZIP: ("application/gzip", "gz"),
+    ExportCompression.ZSTD: ("application/zstd", "zst"),
+}
+
+
+def export_content_info(parameter: ExportLogsParameter) -> tuple[str, str]:
+    """Media type and attachment filename of an export"""
+    media_type, extension = _MEDIA_TYPES[parameter.format]
+    filename = f"logs.{extension}"
+
+    text_format = parameter.format in {ExportFormat.CSV, ExportFormat.NDJSON}
+    if text_format and parameter.compression != ExportCompression.NONE:
+        media_type, suffix = _COMPRESSED_MEDIA_TYPES[parameter.compression]
+        filename = f"{filename}.{suffix}"
+
+    return media_type, filename
+
+
+async def iter_log_pages(
+    parameter: ExportLogsParameter,
+    db: Prisma,
+    position: Optional[list[Any]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[tuple[list[Any], str]]:
+    """
+    Yield the filtered logs in keyset-ordered batches, each with the cursor
+    an export resumes from after it.
+
+    Every batch seeks from the last row of the previous one, so each query
+    costs the same regardless of how deep into the export it is. Archived
+    logs are merged in, see `find_logs`.
+    """
+
+    remaining = parameter.limit
+    skip = 0 if position else parameter.offset
+
+    while remaining is None or remaining > 0:
+        take = batch_size if remaining is None else min(batch_size, remaining)
+
+        rows = await find_logs(parameter, position, skip, take, db)
+        if not rows:
+            return
+
+        last = SimpleNamespace(**rows[-1])
+        yield (
+            await log_sources.log_models(db, rows),
+            encode_cursor(parameter.sort_by, parameter.sort_order, last),
+        )
+
+        if len(rows) < take:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        position = keyset_values(parameter.sort_by, last)
+        skip = 0
+
+
+async def iter_log_batches(
+    parameter: ExportLogsParameter,
+    db: Prisma,
+    position: Optional[list[Any]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[list[Any]]:
+    """Yield the filtered logs in keyset-ordered batches, see `iter_log_pages`"""
+    async for logs, _ in iter_log_pages(parameter, db, position, batch_size):
+        yield logs
+
+
+def _metadata_json(log: Any) -> str:
+    return json.dumps(log.metadata or {}, separators=(",", ":"))
+
+
+async def _encode_csv(
+    batches: AsyncIterator[list[Any]], header: bool = True
+) -> AsyncIterator[bytes]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue().encode()
+
+    async for logs in batches:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerows(
+            [
+                log.id,
+                log.severity,
+                log.message,
+                log.source,
+                log.timestamp,
+                _metadata_json(log),
+            ]
+            for log in logs
+        )
+        yield buffer.getvalue().encode()
+
+
+async def _encode_ndjson(batches: AsyncIterator[list[Any]]) -> AsyncIterator[bytes]:
+    async for logs in batches:
+        yield "".join(
+            json.dumps(
+                {
+                    "id": log.id,
+                    "severity": log.severity,
+                    "message": log.message,
+                    "source": log.source,
+                    "timestamp": log.timestamp.isoformat(),
+                    "metadata": log.metadata or {},
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+            for log in logs
+        ).encode()
+
+
+async def _compress(
+    chunks: AsyncIterator[bytes], compression: ExportCompression
+) -> AsyncIterator[bytes]:
+    if compression == ExportCompression.GZIP:
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """Writable file object that hands the written bytes back in chunks"""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _Dictionary:
+    """Append-only dictionary shared by every record batch of an export"""
+
+    def __init__(self) -> None:
+        self.indices: dict[str, int] = {}
+
+    def encode(self, values: list[str], index_type: pa.DataType) -> pa.Array:
+        for value in values:
+            if value not in self.indices:
+                self.indices[value] = len(self.indices)
+        return pa.DictionaryArray.from_arrays(
+            pa.array([self.indices[value] for value in values], index_type),
+            pa.array(list(self.indices), pa.string()),
+        )
+
+
+def _to_record_batch(
+    logs: list[Any], severities: _Dictionary, sources: _Dictionary
+) -> pa.RecordBatch:
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([log.id for log in logs], pa.string()),
+            severities.encode([log.severity for log in logs], pa.int8()),
+            pa.array([log.message for log in logs], pa.string()),
+            sources.encode([log.source for log in logs], pa.int32()),
+            pa.array([log.timestamp for log in logs], pa.timestamp("ms", tz="UTC")),
+            pa.array([_metadata_json(log) for log in logs], pa.string()),
+        ],
+        schema=ARROW_SCHEMA,
+    )
+
+
+async def _encode_arrow(
+    batches: AsyncIterator[list[Any]], compression: ExportCompression
+) -> AsyncIterator[bytes]:
+    sink = _ChunkSink()
+    options = pa.ipc.IpcWriteOptions(
+        compression="zstd" if compression == ExportCompression.ZSTD else None,
+        emit_dictionary_deltas=True,
+    )
+    writer = pa.ipc.new_stream(sink, ARROW_SCHEMA, options=options)
+    severities, sources = _Dictionary(), _Dictionary()
+
+    async for logs in batches:
+        writer.write_batch(_to_record_batch(logs, severities, sources))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+async def _encode_parquet(
+    batches: AsyncIterator[list[Any]], compression: ExportCompression
+) -> AsyncIterator[bytes]:
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(
+        sink,
+        ARROW_SCHEMA,
+        compression=compression.value,
+        use_dictionary=["severity", "source"],
+    )
+    severities, sources = _Dictionary(), _Dictionary()
+    pending: list[pa.RecordBatch] = []
+    pending_rows = 0
+
+    async for logs in batches:
+        pending.append(_to_record_batch(logs, severities, sources))
+        pending_rows += len(logs)
+        if pending_rows >= PARQUET_ROW_GROUP_SIZE:
+            writer.write_table(pa.Table.from_batches(pending).unify_dictionaries())
+            pending, pending_rows = [], 0
+            yield sink.drain()
+
+    if pending:
+        writer.write_table(pa.Table.from_batches(pending).unify_dictionaries())
+    writer.close()
+    yield sink.drain()
+
+
+def appendable_export(parameter: ExportLogsParameter) -> bool:
+    """
+    Whether an export can be written in pieces and concatenated: CSV and
+    NDJSON, where each compressed piece is a gzip member or zstd frame
+    """
+    return parameter.format in {ExportFormat.CSV, ExportFormat.NDJSON}
+
+
+def prepare_export(parameter: ExportLogsParameter) -> Optional[list[Any]]:
+    """Validate the export parameters, returns the cursor's keyset position"""
+    normalize_sort(parameter)
+
+    if (
+        parameter.format == ExportFormat.ARROW
+        and parameter.compression == ExportCompression.GZIP
+    ):
+        raise UnsupportedExportError("Arrow exports only support zstd compression")
+
+    if parameter.cursor:
+        return decode_cursor(parameter.cursor, parameter.sort_by, parameter.sort_order)
+    return None
+
+
+def encode_export(
+    parameter: ExportLogsParameter,
+    batches: AsyncIterator[list[Any]],
+    header: bool = True,
+) -> AsyncIterator[bytes]:
+    """Encode batches of logs in the requested format and compression"""
+    if parameter.format == ExportFormat.ARROW:
+        return _encode_arrow(batches, parameter.compression)
+    if parameter.format == ExportFormat.PARQUET:
+        return _encode_parquet(batches, parameter.compression)
+
+    if parameter.format == ExportFormat.NDJSON:
+        chunks = _encode_ndjson(batches)
+    else:
+        chunks = _encode_csv(batches, header)
+
+    if parameter.compression == ExportCompression.NONE:
+        return chunks
+    return _compress(chunks, parameter.compression)
+
+
+async def export_next_cursor(
+    parameter: ExportLogsParameter, db: Prisma, cursor: Optional[str]
+) -> Optional[str]:
+    """
+    `cursor` of the last exported row when more rows follow it, None
+    otherwise. Seeks a single row past it on the keyset.
+    """
+
+    if not cursor:
+        return None
+    position = decode_cursor(cursor, parameter.sort_by, parameter.sort_order)
+    rows = await find_logs(parameter, position, 0, 1, db)
+    return cursor if rows else None
+
+
+def export_logs_svc(
+    parameter: ExportLogsParameter, db: Prisma, batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Service to stream log entries in the requested export format
+
+    The parameters are validated eagerly so a bad request fails before the
+    response starts. Rows are fetched lazily as the client consumes the
+    stream; when the client goes away the response is cancelled and no
+    further batches are queried.
+    """
+
+    position = prepare_export(parameter)
+    return encode_export(
+        parameter, iter_log_batches(parameter, db, position, batch_size)
+    )
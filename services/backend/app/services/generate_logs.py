@@ -1,7 +1,14 @@
 import random
 from datetime import datetime, timedelta
-from typing import Any, Dict
-
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.services.log_patterns import log_patterns
+from app.services.log_rollups import record_created_logs
+from app.services.log_sources import log_sources
+from app.services.log_stream import log_stream_hub
+from app.services.metrics import instrumented
+from app.services.response_cache import response_cache
+from app.utils.time_buckets import truncate_ms
 from prisma import Prisma
 from pydantic import BaseModel, Field
 from uuid_utils import uuid7
@@ -106,7 +113,7 @@ def generate_random_timestamp(days_back: int) -> datetime:
     start_time = now - timedelta(days=days_back)
     time_between = now - start_time
     random_seconds = random.randrange(int(time_between.total_seconds()))
-    return start_time + timedelta(seconds=random_seconds)
+    return truncate_ms(start_time + timedelta(seconds=random_seconds))
 
 
 def generate_random_log_data(days_back: int = 7) -> Dict[str, Any]:
@@ -121,22 +128,46 @@ def generate_random_log_data(days_back: int = 7) -> Dict[str, Any]:
         "message": message,
         "source": source,
         "timestamp": generate_random_timestamp(days_back),
+        "metadata": dict(random.choice(SAMPLE_METADATA)),
     }
 
 
-async def generate_logs_svc(
-    payload: GenerateLogsPayload, db: Prisma
-) -> GenerateLogsResponse:
+async def insert_random_logs(
+    db: Prisma,
+    count: int,
+    days_back: int,
+    checkpoint: Optional[Callable[[Prisma], Awaitable[None]]] = None,
+) -> None:
     """
-    Service to generate random log entries
+    Insert `count` random logs in one transaction. `checkpoint` runs inside
+    that transaction, so a job's progress commits together with the rows.
     """
 
     generated_logs = []
-    for _ in range(payload.count):
-        log_data = generate_random_log_data(payload.days_back)
+    for _ in range(count):
+        log_data = generate_random_log_data(days_back)
 
         generated_logs.append(log_data)
 
-    await db.log.create_many(data=generated_logs)
+    await log_patterns.register(db, (log["message"] for log in generated_logs))
+    data = await log_sources.prisma_log_rows(db, generated_logs)
+    async with db.tx() as transaction:
+        await transaction.log.create_many(data=data)
+        await record_created_logs(transaction, generated_logs)
+        if checkpoint is not None:
+            await checkpoint(transaction)
+    await response_cache.invalidate()
+    await log_stream_hub.publish(db, generated_logs)
+
+
+@instrumented()
+async def generate_logs_svc(
+    payload: GenerateLogsPayload, db: Prisma
+) -> GenerateLogsResponse:
+    """
+    Service to generate random log entries
+    """
+
+    await insert_random_logs(db, payload.count, payload.days_back)
 
     return GenerateLogsResponse(count=payload.count, status_code=201)
@@ -1,23 +1,44 @@
 import asyncio
+import logging
+from collections import Counter
 from datetime import datetime
 from typing import Any, Optional
 
-from app.models.log_models import SeverityLevel
+from app.models.log_models import SEVERITY_NAMES, CountMode, SeverityLevel
+from app.services.log_analytics import log_analytics
+from app.services.log_archive import log_archive
+from app.services.log_counts import rounded_rollup_plan
+from app.services.log_rollups import rollup_bucket_filter
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented
+from app.utils.log_filters import (
+    LogFilterParameter,
+    compile_log_filter,
+    log_filter_conditions,
+    prisma_rollup_where,
+)
+from app.utils.sql import SqlParams, driver_value, range_condition
+from app.utils.time_buckets import TimeRangePlan, exclusive_end, plan_time_range
 from prisma import Prisma
 from pydantic import BaseModel, Field
 
+logger = logging.getLogger(__name__)
 
-class GetAggregatedLogsParameter(BaseModel):
-    severity: Optional[SeverityLevel] = None
-    source: Optional[str] = None
-    start_date: Optional[datetime] = None
-    end_date: Optional[datetime] = None
+
+class GetAggregatedLogsParameter(LogFilterParameter):
     limit: int = Field(100, gte=1, lt=1001)
     offset: int = Field(0, gte=0)
+    count_mode: CountMode = CountMode.EXACT
+    meta: dict[str, str] = Field(default_factory=dict)
+
+
+class UnsupportedCountModeError(ValueError):
+    pass
 
 
 class GetAggregatedLogsResponse(BaseModel):
     status_code: int
+    count_mode: CountMode
     severity_counts: dict[SeverityLevel, int]
     source_counts: dict[str, int]
     total_logs: int
@@ -55,65 +76,181 @@ def _extract_total_count(count_value: Any) -> int:
     return 0
 
 
+def _extract_sum(sum_value: Any) -> int:
+    value = _get_entry_value(sum_value, "count") if sum_value is not None else None
+    if value is None:
+        return 0
+    return int(value)
+
+
+def raw_counts_query(
+    parameter: GetAggregatedLogsParameter,
+    ranges: Optional[list[tuple[Optional[datetime], Optional[datetime]]]] = None,
+) -> tuple[str, list[Any]]:
+    """
+    The grouping of the raw logs as SQL, over the requested time range or
+    the given plan ranges. Also explained for the slow-query log.
+    """
+
+    params = SqlParams()
+    conditions = log_filter_conditions(
+        parameter, params, include_time_range=ranges is None
+    )
+    if ranges:
+        bounds = [
+            f"({range_condition('timestamp', start, end, params)})"
+            for start, end in ranges
+        ]
+        conditions.append("(" + " OR ".join(bounds) + ")")
+
+    query = f"""
+        SELECT "severity", "source_id", count(*) AS "_count"
+        FROM "logs"
+        WHERE {" AND ".join(conditions) or "TRUE"}
+        GROUP BY "severity", "source_id"
+    """
+    return query, [driver_value(value) for value in params.values]
+
+
+async def _postgres_counts(
+    parameter: GetAggregatedLogsParameter,
+    db: Prisma,
+    ranges: Optional[list[tuple[Optional[datetime], Optional[datetime]]]],
+) -> list[dict[str, Any]]:
+    if ranges == []:
+        return []
+    query, values = raw_counts_query(parameter, ranges)
+    rows = [
+        {**row, "severity": SEVERITY_NAMES[row["severity"]]}
+        for row in await db.query_raw(query, *values)
+    ]
+
+    archived = Counter()
+    async for batch in log_archive.rows(db, parameter, ranges):
+        archived.update((row["severity"], row["source_id"]) for row in batch)
+    rows += [
+        {"severity": severity, "source_id": source_id, "_count": count}
+        for (severity, source_id), count in archived.items()
+    ]
+
+    names = await log_sources.names(db, (row["source_id"] for row in rows))
+    return [{**row, "source": names[row["source_id"]]} for row in rows]
+
+
+async def _raw_counts(
+    parameter: GetAggregatedLogsParameter,
+    db: Prisma,
+    ranges: Optional[list[tuple[Optional[datetime], Optional[datetime]]]] = None,
+) -> list[dict[str, Any]]:
+    """Raw counts, compacted historical days are read from the analytics files"""
+    if ranges is None:
+        return await _postgres_counts(parameter, db, ranges)
+
+    ranges, scan = await log_analytics.route(db, parameter, ranges)
+    if scan is None:
+        return await _postgres_counts(parameter, db, ranges)
+
+    async def analytics_counts() -> list[dict[str, Any]]:
+        try:
+            return await log_analytics.counts(parameter, scan)
+        except Exception:
+            logger.exception("Analytics query failed, reading Postgres instead")
+            return await _postgres_counts(parameter, db, scan.ranges)
+
+    groups = await asyncio.gather(
+        analytics_counts(), _postgres_counts(parameter, db, ranges)
+    )
+    return [row for rows in groups for row in rows]
+
+
+@instrumented(explain=raw_counts_query)
 async def get_aggregated_logs_svc(
     parameter: GetAggregatedLogsParameter, db: Prisma
 ) -> GetAggregatedLogsResponse:
     """
     Service to get log entries based on filters
+
+    Whole day/hour/minute buckets inside the range are summed from the
+    rollup table, only the partial buckets at the edges are counted from
+    the raw logs. In `estimated` mode the edges are widened to whole
+    minutes so no raw rows are read at all.
     """
 
-    filters = {}
-    if parameter.severity:
-        filters["severity"] = parameter.severity
-    if parameter.source:
-        filters["source"] = parameter.source
-    if parameter.start_date and parameter.end_date:
-        filters["timestamp"] = {
-            "gte": parameter.start_date,
-            "lte": parameter.end_date,
-        }
-    elif parameter.start_date:
-        filters["timestamp"] = {"gte": parameter.start_date}
-    elif parameter.end_date:
-        filters["timestamp"] = {"lte": parameter.end_date}
-
-    total_logs, severities, sources = await asyncio.gather(
-        db.log.count(where=filters),
-        db.log.group_by(
-            by=["severity"],
-            where=filters,
-            count=True,
-        ),
-        db.log.group_by(
-            by=["source"],
-            where=filters,
-            count=True,
-        ),
-    )
+    if parameter.count_mode == CountMode.NONE:
+        raise UnsupportedCountModeError(
+            "Aggregations need counts, use count_mode=exact or estimated"
+        )
 
-    severity_counts = {}
-    for entry in severities:
-        severity_value = _get_entry_value(entry, "severity")
-        if severity_value is None:
-            continue
-        try:
-            severity_key = SeverityLevel(severity_value)
-        except ValueError:
-            continue
+    count_mode = parameter.count_mode
+
+    queries = []
+    if parameter.meta:
+        # The rollups don't know the metadata, the raw rows are grouped
+        plan = TimeRangePlan(rollup=[], raw=[])
+        queries.append(_raw_counts(parameter, db))
+        count_mode = CountMode.EXACT
+    elif compile_log_filter(parameter).needs_raw_rows:
+        # Rollups only know severity and source, a search reads raw rows
+        plan = TimeRangePlan(
+            rollup=[],
+            raw=[(parameter.start_date, exclusive_end(parameter.end_date))],
+        )
+        count_mode = CountMode.EXACT
+    elif count_mode == CountMode.ESTIMATED:
+        plan = rounded_rollup_plan(
+            parameter.start_date, exclusive_end(parameter.end_date)
+        )
+    else:
+        plan = plan_time_range(parameter.start_date, exclusive_end(parameter.end_date))
 
-        count_value = _extract_total_count(_get_entry_value(entry, "_count"))
-        severity_counts[severity_key] = count_value
+    if plan.rollup:
+        queries.append(
+            db.logrollup.group_by(
+                by=["severity", "source"],
+                where={
+                    **prisma_rollup_where(parameter),
+                    "OR": rollup_bucket_filter(plan.rollup),
+                },
+                sum={"count": True},
+            )
+        )
+    if plan.raw:
+        queries.append(_raw_counts(parameter, db, plan.raw))
 
+    total_logs = 0
+    severity_counts = {}
     source_counts = {}
-    for entry in sources:
-        source_value = _get_entry_value(entry, "source")
-        if source_value is None:
-            continue
-        count_value = _extract_total_count(_get_entry_value(entry, "_count"))
-        source_counts[source_value] = count_value
+    for groups in await asyncio.gather(*queries):
+        for entry in groups:
+            if _get_entry_value(entry, "_sum") is not None:
+                count_value = _extract_sum(_get_entry_value(entry, "_sum"))
+            else:
+                count_value = _extract_total_count(_get_entry_value(entry, "_count"))
+            if not count_value:
+                continue
+
+            total_logs += count_value
+
+            source_value = _get_entry_value(entry, "source")
+            if source_value is not None:
+                source_counts[source_value] = (
+                    source_counts.get(source_value, 0) + count_value
+                )
+
+            severity_value = _get_entry_value(entry, "severity")
+            if severity_value is None:
+                continue
+            try:
+                severity_key = SeverityLevel(severity_value)
+            except ValueError:
+                continue
+            severity_counts[severity_key] = (
+                severity_counts.get(severity_key, 0) + count_value
+            )
 
     return GetAggregatedLogsResponse(
         status_code=200,
+        count_mode=count_mode,
         severity_counts=severity_counts,
         source_counts=source_counts,
         total_logs=total_logs,
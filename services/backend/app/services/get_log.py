@@ -1,4 +1,7 @@
 from app.models.log_models import LogModel
+from app.services.log_archive import log_archive
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented
 from prisma import Prisma
 
 
@@ -6,20 +9,18 @@ class GetLogResponse(LogModel):
     pass
 
 
+@instrumented(rows=lambda log: 1)
 async def get_log_svc(log_id: str, db: Prisma) -> None:
     """
-    Service to get a log entry by ID
+    Service to get a log entry by ID, from the archive when it was moved there
     """
 
-    log = await db.log.find_unique(where={"id": log_id})
+    log = await db.log.find_first(where={"id": log_id})
+    if not log:
+        log = await log_archive.find(db, log_id)
 
     if not log:
         return None
 
-    return GetLogResponse(
-        id=log.id,
-        severity=log.severity,
-        message=log.message,
-        source=log.source,
-        timestamp=log.timestamp,
-    )
+    [model] = await log_sources.log_models(db, [log])
+    return GetLogResponse(**model.model_dump())
@@ -0,0 +1,299 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Optional
+
+from app.models.log_models import CountMode
+from app.services.get_aggregated_logs import UnsupportedCountModeError
+from app.services.log_archive import log_archive
+from app.services.log_counts import rounded_rollup_plan
+from app.services.metrics import instrumented
+from app.utils.log_filters import (
+    LogFilterParameter,
+    compile_log_filter,
+    log_filter_conditions,
+)
+from app.utils.patterns import pattern_key
+from app.utils.sql import SqlParams, driver_value, range_condition
+from app.utils.time_buckets import (
+    TimeRangePlan,
+    exclusive_end,
+    plan_time_range,
+    to_utc,
+)
+from prisma import Prisma
+from pydantic import BaseModel, Field
+
+
+class GetLogPatternsParameter(LogFilterParameter):
+    limit: int = Field(20, ge=1, le=500)
+    count_mode: CountMode = CountMode.EXACT
+    meta: dict[str, str] = Field(default_factory=dict)
+
+
+class LogPatternModel(BaseModel):
+    pattern_id: str
+    template: Optional[str]
+    count: int
+    first_seen: Optional[datetime]
+    last_seen: Optional[datetime]
+
+
+class GetLogPatternsResponse(BaseModel):
+    status_code: int
+    count_mode: CountMode
+    patterns: list[LogPatternModel]
+    # Matching logs that have a pattern, over all patterns
+    total_logs: int
+
+
+def _timestamp(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return to_utc(value)
+
+
+def raw_patterns_query(
+    parameter: GetLogPatternsParameter,
+    ranges: Optional[list[tuple[Optional[datetime], Optional[datetime]]]] = None,
+) -> tuple[str, list[Any]]:
+    """
+    The patterns of the raw logs as SQL, over the requested time range or
+    the given plan ranges. Also explained for the slow-query log.
+    """
+
+    params = SqlParams()
+    conditions = log_filter_conditions(
+        parameter, params, include_time_range=ranges is None
+    )
+    if ranges:
+        bounds = [
+            f"({range_condition('timestamp', start, end, params)})"
+            for start, end in ranges
+        ]
+        conditions.append("(" + " OR ".join(bounds) + ")")
+    conditions.append('"pattern_id" IS NOT NULL')
+
+    query = f"""
+        SELECT "pattern_id", count(*) AS "count",
+            min("timestamp") AS "first", max("timestamp") AS "last"
+        FROM "logs"
+        WHERE {" AND ".join(conditions)}
+        GROUP BY "pattern_id"
+    """
+    return query, [driver_value(value) for value in params.values]
+
+
+async def _raw_patterns(
+    parameter: GetLogPatternsParameter,
+    db: Prisma,
+    ranges: list[tuple[Optional[datetime], Optional[datetime]]],
+) -> list[dict[str, Any]]:
+    if not ranges:
+        return []
+    query, values = raw_patterns_query(parameter, ranges)
+    patterns = {
+        int(row["pattern_id"]): {
+            "pattern_id": int(row["pattern_id"]),
+            "count": int(row["count"]),
+            "first": _timestamp(row["first"]),
+            "last": _timestamp(row["last"]),
+        }
+        for row in await db.query_raw(query, *values)
+    }
+
+    async for batch in log_archive.rows(db, parameter, ranges):
+        for row in batch:
+            if row["pattern_id"] is None:
+                continue
+            timestamp = row["timestamp"]
+            pattern = patterns.setdefault(
+                row["pattern_id"],
+                {
+                    "pattern_id": row["pattern_id"],
+                    "count": 0,
+                    "first": timestamp,
+                    "last": timestamp,
+                },
+            )
+            pattern["count"] += 1
+            pattern["first"] = min(pattern["first"], timestamp)
+            pattern["last"] = max(pattern["last"], timestamp)
+    return list(patterns.values())
+
+
+async def _rollup_patterns(
+    parameter: GetLogPatternsParameter,
+    db: Prisma,
+    ranges: list[tuple[str, Optional[datetime], Optional[datetime]]],
+) -> list[dict[str, Any]]:
+    if not ranges:
+        return []
+
+    params = SqlParams()
+    conditions = log_filter_conditions(
+        parameter, params, include_time_range=False, rollups=True
+    )
+    branches = [
+        f'("granularity" = {params.add(granularity)} AND '
+        f"{range_condition('bucket', start, end, params)})"
+        for granularity, start, end in ranges
+    ]
+    conditions.append("(" + " OR ".join(branches) + ")")
+
+    return await db.query_raw(
+        f"""
+        SELECT "pattern_id", SUM("count")::bigint AS "count"
+        FROM "log_pattern_rollups"
+        WHERE {" AND ".join(conditions)}
+        GROUP BY "pattern_id"
+        """,
+        *[driver_value(value) for value in params.values],
+    )
+
+
+async def _rollup_seen(
+    parameter: GetLogPatternsParameter,
+    db: Prisma,
+    pattern_ids: list[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> list[dict[str, Any]]:
+    """
+    First and last minute each pattern was seen in, between `start` and
+    `end`. Every pattern costs two short walks of the pattern index.
+    """
+
+    if not pattern_ids:
+        return []
+
+    params = SqlParams()
+    ids = params.add(pattern_ids, "bigint[]")
+    conditions = log_filter_conditions(
+        parameter, params, include_time_range=False, rollups=True
+    )
+    conditions.append(range_condition("bucket", start, end, params))
+    where = " AND ".join(
+        [
+            '"pattern_id" = p."pattern_id"',
+            "\"granularity\" = 'minute'",
+            '"count" > 0',
+            *conditions,
+        ]
+    )
+
+    return await db.query_raw(
+        f"""
+        SELECT p."pattern_id", f."bucket" AS "first", l."bucket" AS "last"
+        FROM unnest({ids}) AS p("pattern_id")
+        CROSS JOIN LATERAL (
+            SELECT "bucket" FROM "log_pattern_rollups" WHERE {where}
+            ORDER BY "bucket" LIMIT 1
+        ) f
+        CROSS JOIN LATERAL (
+            SELECT "bucket" FROM "log_pattern_rollups" WHERE {where}
+            ORDER BY "bucket" DESC LIMIT 1
+        ) l
+        """,
+        *[driver_value(value) for value in params.values],
+    )
+
+
+async def _templates(db: Prisma, pattern_ids: list[int]) -> dict[int, str]:
+    if not pattern_ids:
+        return {}
+    rows = await db.query_raw(
+        """
+        SELECT "pattern_id", "template" FROM "log_patterns"
+        WHERE "pattern_id" = ANY($1::bigint[])
+        """,
+        pattern_ids,
+    )
+    return {int(row["pattern_id"]): row["template"] for row in rows}
+
+
+@instrumented(explain=raw_patterns_query)
+async def get_log_patterns_svc(
+    parameter: GetLogPatternsParameter, db: Prisma
+) -> GetLogPatternsResponse:
+    """
+    Service to get the most frequent message patterns matching the filters
+
+    Counts are planned like `/aggregated`: whole buckets come from the
+    pattern rollups and only the partial edges from the raw logs. First
+    and last seen are exact on the edges and to the minute elsewhere.
+    """
+
+    if parameter.count_mode == CountMode.NONE:
+        raise UnsupportedCountModeError(
+            "Patterns need counts, use count_mode=exact or estimated"
+        )
+
+    count_mode = parameter.count_mode
+    end = exclusive_end(parameter.end_date)
+    if compile_log_filter(parameter).needs_raw_rows:
+        # The rollups only know severity and source
+        plan = TimeRangePlan(rollup=[], raw=[(parameter.start_date, end)])
+        count_mode = CountMode.EXACT
+    elif count_mode == CountMode.ESTIMATED:
+        plan = rounded_rollup_plan(parameter.start_date, end)
+    else:
+        plan = plan_time_range(parameter.start_date, end)
+
+    rollup_rows, raw_rows = await asyncio.gather(
+        _rollup_patterns(parameter, db, plan.rollup),
+        _raw_patterns(parameter, db, plan.raw),
+    )
+
+    counts: dict[int, int] = {}
+    first_seen: dict[int, datetime] = {}
+    last_seen: dict[int, datetime] = {}
+    rollup_ids = set()
+    for row in rollup_rows:
+        pattern_id, count = int(row["pattern_id"]), int(row["count"])
+        if count > 0:
+            counts[pattern_id] = counts.get(pattern_id, 0) + count
+            rollup_ids.add(pattern_id)
+    for row in raw_rows:
+        pattern_id = int(row["pattern_id"])
+        counts[pattern_id] = counts.get(pattern_id, 0) + int(row["count"])
+        first_seen[pattern_id] = _timestamp(row["first"])
+        last_seen[pattern_id] = _timestamp(row["last"])
+
+    top = sorted(counts, key=lambda pattern_id: (-counts[pattern_id], pattern_id))
+    top = top[: parameter.limit]
+
+    # The rollup ranges are contiguous, between the raw edges if any
+    starts = [start for _, start, _ in plan.rollup]
+    ends = [end for _, _, end in plan.rollup]
+    seen_rows, templates = await asyncio.gather(
+        _rollup_seen(
+            parameter,
+            db,
+            [pattern_id for pattern_id in top if pattern_id in rollup_ids],
+            None if None in starts else min(starts, default=None),
+            None if None in ends else max(ends, default=None),
+        ),
+        _templates(db, top),
+    )
+
+    for row in seen_rows:
+        pattern_id = int(row["pattern_id"])
+        first, last = _timestamp(row["first"]), _timestamp(row["last"])
+        first_seen[pattern_id] = min(first, first_seen.get(pattern_id, first))
+        last_seen[pattern_id] = max(last, last_seen.get(pattern_id, last))
+
+    return GetLogPatternsResponse(
+        status_code=200,
+        count_mode=count_mode,
+        patterns=[
+            LogPatternModel(
+                pattern_id=pattern_key(pattern_id),
+                template=templates.get(pattern_id),
+                count=counts[pattern_id],
+                first_seen=first_seen.get(pattern_id),
+                last_seen=last_seen.get(pattern_id),
+            )
+            for pattern_id in top
+        ],
+        total_logs=sum(counts.values()),
+    )
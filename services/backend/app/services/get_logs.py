@@ -1,81 +1,267 @@
 import asyncio
 from datetime import datetime
-from typing import Optional
+from types import SimpleNamespace
+from typing import Any, Optional
 
-from app.models.log_models import LogModel, SeverityLevel
+from app.models.log_models import CountMode, LogModel, severity_name
+from app.services.log_archive import log_archive, sort_log_rows
+from app.services.log_counts import estimate_log_count
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented
+from app.utils.cursor import (
+    decode_cursor,
+    encode_cursor,
+    keyset_columns,
+    keyset_values,
+)
+from app.utils.log_filters import LogFilterParameter, log_filter_conditions
+from app.utils.sql import SqlParams, driver_value, keyset_condition
+from app.utils.time_buckets import to_utc
 from prisma import Prisma
 from pydantic import BaseModel, Field
 
 
-class GetLogsParameter(BaseModel):
-    severity: Optional[SeverityLevel] = None
-    source: Optional[str] = None
-    start_date: Optional[datetime] = None
-    end_date: Optional[datetime] = None
+class GetLogsParameter(LogFilterParameter):
     limit: int = Field(100, gte=1, lt=999999)
     offset: int = Field(0, gte=0)
     sort_by: str = "timestamp"
     sort_order: str = "desc"
+    cursor: Optional[str] = None
+    count_mode: CountMode = CountMode.EXACT
+    # `meta.<key>=<value>` filters on the metadata column
+    meta: dict[str, str] = Field(default_factory=dict)
 
 
 class GetLogsResponse(BaseModel):
     status_code: int
     logs: list[LogModel]
-    total: int
-    total_pages: int
+    # Mode that produced `total`, both totals are null in `none` mode
+    count_mode: CountMode
+    total: Optional[int]
+    total_pages: Optional[int]
+    has_more: bool
+    next_cursor: Optional[str] = None
 
 
-async def get_logs_svc(parameter: GetLogsParameter, db: Prisma) -> GetLogsResponse:
-    """
-    Service to get log entries based on filters
-    """
-
-    filters = {}
-
-    if parameter.severity:
-        filters["severity"] = parameter.severity
-    if parameter.source:
-        filters["source"] = parameter.source
-    if parameter.start_date and parameter.end_date:
-        filters["timestamp"] = {
-            "gte": parameter.start_date,
-            "lte": parameter.end_date,
-        }
-    elif parameter.start_date:
-        filters["timestamp"] = {"gte": parameter.start_date}
-    elif parameter.end_date:
-        filters["timestamp"] = {"lte": parameter.end_date}
-
+def normalize_sort(parameter: GetLogsParameter) -> None:
+    """Fall back to the default ordering for unsupported sort values"""
     if parameter.sort_by not in {"timestamp", "severity", "source"}:
         parameter.sort_by = "timestamp"
     if parameter.sort_order not in {"asc", "desc"}:
         parameter.sort_order = "desc"
 
-    # Run count and find_many queries in parallel for better performance
-    total_count, logs = await asyncio.gather(
-        db.log.count(where=filters),
-        db.log.find_many(
-            where=filters,
-            order={parameter.sort_by: parameter.sort_order},
-            skip=parameter.offset,
-            take=parameter.limit,
+
+async def count_logs(
+    parameter: GetLogsParameter, db: Prisma
+) -> tuple[Optional[int], CountMode]:
+    """
+    Total for the requested count mode, `None` when counting is skipped,
+    and the mode that produced it. An exact count becomes an estimate when
+    the archive estimates its share, see `LogArchive.count`.
+    """
+
+    if parameter.count_mode == CountMode.NONE:
+        return None, CountMode.NONE
+    if parameter.count_mode == CountMode.ESTIMATED:
+        return await estimate_log_count(parameter, db), CountMode.ESTIMATED
+
+    params = SqlParams()
+    conditions = log_filter_conditions(parameter, params) or ["TRUE"]
+    row, (archived, exact) = await asyncio.gather(
+        db.query_first(
+            f'SELECT count(*) AS "count" FROM "logs" WHERE {" AND ".join(conditions)}',
+            *[driver_value(value) for value in params.values],
         ),
+        log_archive.count(db, parameter),
+    )
+    total = (int(row["count"]) if row else 0) + archived
+    return total, CountMode.EXACT if exact else CountMode.ESTIMATED
+
+
+def total_pages(total_count: Optional[int], limit: int) -> Optional[int]:
+    if total_count is None:
+        return None
+    return (total_count + limit - 1) // limit
+
+
+def logs_query(
+    parameter: GetLogsParameter,
+    position: Optional[list[Any]],
+    offset: int,
+    limit: int,
+) -> tuple[str, list[Any]]:
+    """Raw SQL reading `limit` filtered logs after a keyset position"""
+    if parameter.sort_by == "source":
+        return _source_logs_query(parameter, position, offset, limit)
+
+    params = SqlParams()
+    conditions = log_filter_conditions(parameter, params)
+
+    columns = keyset_columns(parameter.sort_by)
+    if position:
+        conditions.append(
+            keyset_condition(columns, parameter.sort_order, position, params)
+        )
+
+    direction = "DESC" if parameter.sort_order == "desc" else "ASC"
+    order = ", ".join(f'"{column}" {direction}' for column in columns)
+    query = f"""
+        SELECT "id", "severity", "message", "source_id", "timestamp", "metadata"
+        FROM "logs"
+        WHERE {" AND ".join(conditions) or "TRUE"}
+        ORDER BY {order}
+        LIMIT {params.add(limit)} OFFSET {params.add(offset)}
+    """
+    return query, [driver_value(value) for value in params.values]
+
+
+def _source_logs_query(
+    parameter: GetLogsParameter,
+    position: Optional[list[Any]],
+    offset: int,
+    limit: int,
+) -> tuple[str, list[Any]]:
+    """
+    `logs_query` ordered by source name, then timestamp and id.
+
+    Logs only store the source id, so the sources are walked in name order
+    and the logs of each are read through the `(source_id, timestamp, id)`
+    index. Names compare bytewise like Python strings, so archived rows
+    merge in the same order.
+    """
+
+    params = SqlParams()
+    conditions = log_filter_conditions(parameter, params)
+    sources = "TRUE"
+    if position:
+        name = params.add(position[0], "text")
+        inclusive = "<=" if parameter.sort_order == "desc" else ">="
+        sources = f's."name" COLLATE "C" {inclusive} {name}'
+        tail = keyset_condition(
+            ["timestamp", "id"], parameter.sort_order, position[1:], params
+        )
+        conditions.append(f'(s."name" COLLATE "C" <> {name} OR ({tail}))')
+
+    direction = "DESC" if parameter.sort_order == "desc" else "ASC"
+    query = f"""
+        SELECT l.*, s."name" AS "source"
+        FROM "log_sources" s CROSS JOIN LATERAL (
+            SELECT "id", "severity", "message", "source_id", "timestamp", "metadata"
+            FROM "logs"
+            WHERE "source_id" = s."id" AND {" AND ".join(conditions) or "TRUE"}
+            ORDER BY "timestamp" {direction}, "id" {direction}
+            LIMIT {params.add(offset + limit)}
+        ) l
+        WHERE {sources}
+        ORDER BY s."name" COLLATE "C" {direction}, l."timestamp" {direction},
+            l."id" {direction}
+        LIMIT {params.add(limit)} OFFSET {params.add(offset)}
+    """
+    return query, [driver_value(value) for value in params.values]
+
+
+def page_position(parameter: GetLogsParameter) -> tuple[Optional[list[Any]], int]:
+    """Keyset position and offset of the requested page"""
+    if parameter.cursor:
+        position = decode_cursor(
+            parameter.cursor, parameter.sort_by, parameter.sort_order
+        )
+        return position, 0
+    return None, parameter.offset
+
+
+def page_query(parameter: GetLogsParameter) -> tuple[str, list[Any]]:
+    """
+    The page query as raw SQL with its driver values, read by the fast
+    path and explained for the slow-query log
+    """
+
+    position, offset = page_position(parameter)
+    # One extra row tells whether another page follows without a count
+    return logs_query(parameter, position, offset, parameter.limit + 1)
+
+
+async def find_log_rows(
+    query: str, values: list[Any], db: Prisma
+) -> list[dict[str, Any]]:
+    """Run a `logs_query` through Prisma, timestamps parsed as UTC"""
+    rows = await db.query_raw(query, *values)
+    for row in rows:
+        if isinstance(row["timestamp"], str):
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        row["timestamp"] = to_utc(row["timestamp"])
+        row["severity"] = severity_name(row["severity"])
+    return rows
+
+
+async def find_logs(
+    parameter: GetLogsParameter,
+    position: Optional[list[Any]],
+    offset: int,
+    limit: int,
+    db: Prisma,
+) -> list[dict[str, Any]]:
+    """
+    Like `find_log_rows` for a `logs_query`, merged with the archived logs.
+
+    A full page of hot rows bounds the archived rows that can still sort
+    into it, so pages that don't reach the archive cost one summary query.
+    """
+
+    rows = await find_log_rows(*logs_query(parameter, position, offset, limit), db)
+    until = None
+    if len(rows) == limit:
+        until = keyset_values(parameter.sort_by, SimpleNamespace(**rows[-1]))
+    archived = await log_archive.page(db, parameter, position, offset + limit, until)
+    if not archived:
+        return rows
+
+    if offset:
+        # The offset applies to the merged rows
+        rows = await find_log_rows(
+            *logs_query(parameter, position, 0, offset + limit), db
+        )
+    # Rows of a partition being archived can show up on both sides
+    merged = {row["id"]: row for row in [*archived, *rows]}
+    rows = sort_log_rows(list(merged.values()), parameter.sort_by, parameter.sort_order)
+    return rows[offset : offset + limit]
+
+
+@instrumented(rows=lambda response: len(response.logs), explain=page_query)
+async def get_logs_svc(parameter: GetLogsParameter, db: Prisma) -> GetLogsResponse:
+    """
+    Service to get log entries based on filters
+
+    Cursor mode seeks straight to the page through the keyset indexes
+    instead of letting Postgres scan and discard `offset` rows. Archived
+    logs are read through, see `find_logs`.
+    """
+
+    normalize_sort(parameter)
+
+    # Run count and page queries in parallel for better performance
+    position, offset = page_position(parameter)
+    (total_count, count_mode), rows = await asyncio.gather(
+        count_logs(parameter, db),
+        find_logs(parameter, position, offset, parameter.limit + 1, db),
     )
 
-    # Calculate total pages
-    total_pages = (total_count + parameter.limit - 1) // parameter.limit
+    # The page query reads one extra row to tell whether another page follows
+    has_more = len(rows) > parameter.limit
+    rows = rows[: parameter.limit]
 
-    log_list = [
-        LogModel(
-            id=log.id,
-            severity=log.severity,
-            message=log.message,
-            source=log.source,
-            timestamp=log.timestamp,
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(
+            parameter.sort_by, parameter.sort_order, SimpleNamespace(**rows[-1])
         )
-        for log in logs
-    ]
 
     return GetLogsResponse(
-        logs=log_list, status_code=200, total=total_count, total_pages=total_pages
+        logs=await log_sources.log_models(db, rows),
+        status_code=200,
+        count_mode=count_mode,
+        total=total_count,
+        total_pages=total_pages(total_count, parameter.limit),
+        has_more=has_more,
+        next_cursor=next_cursor,
     )
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from enum import Enum
+from typing import Any, Optional
+
+from app.models.log_models import SeverityLevel
+from app.services.log_analytics import log_analytics
+from app.services.log_archive import log_archive
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented
+from app.utils.log_filters import (
+    LogFilterParameter,
+    compile_log_filter,
+    log_filter_conditions,
+)
+from app.utils.sql import (
+    SqlParams,
+    driver_value,
+    range_condition,
+    severity_name_sql,
+)
+from app.utils.time_buckets import (
+    GRANULARITIES,
+    TimeRangePlan,
+    exclusive_end,
+    plan_time_range,
+    to_utc,
+)
+from prisma import Prisma
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_DEFAULT_BUCKETS = 60
+HISTOGRAM_MAX_BUCKETS = 1000
+
+# Buckets are aligned on this origin, like `date_bin` in the queries
+HISTOGRAM_ORIGIN = datetime(2000, 1, 1, tzinfo=UTC)
+
+
+class HistogramInterval(str, Enum):
+    ONE_MINUTE = "1m"
+    FIVE_MINUTES = "5m"
+    ONE_HOUR = "1h"
+    ONE_DAY = "1d"
+
+
+class HistogramSplit(str, Enum):
+    SEVERITY = "severity"
+    SOURCE = "source"
+
+
+_INTERVALS: dict[HistogramInterval, tuple[timedelta, str]] = {
+    # interval -> (step, coarsest rollup granularity that fits in a step)
+    HistogramInterval.ONE_MINUTE: (timedelta(minutes=1), "minute"),
+    HistogramInterval.FIVE_MINUTES: (timedelta(minutes=5), "minute"),
+    HistogramInterval.ONE_HOUR: (timedelta(hours=1), "hour"),
+    HistogramInterval.ONE_DAY: (timedelta(days=1), "day"),
+}
+
+
+class HistogramRangeError(ValueError):
+    pass
+
+
+class GetLogsHistogramParameter(LogFilterParameter):
+    interval: HistogramInterval = HistogramInterval.ONE_HOUR
+    split_by: Optional[HistogramSplit] = None
+
+
+class GetLogsHistogramResponse(BaseModel):
+    status_code: int
+    interval: HistogramInterval
+    buckets: list[datetime]
+    counts: list[int]
+    series: dict[str, list[int]]
+
+
+def _floor_step(value: datetime, step: timedelta) -> datetime:
+    return HISTOGRAM_ORIGIN + ((value - HISTOGRAM_ORIGIN) // step) * step
+
+
+def _interval_literal(step: timedelta) -> str:
+    return f"{int(step.total_seconds())} seconds"
+
+
+def _plan(parameter: GetLogsHistogramParameter, start: datetime, end: datetime):
+    # Rollups only know severity and source, anything else reads raw rows
+    if compile_log_filter(parameter).needs_raw_rows:
+        return TimeRangePlan(rollup=[], raw=[(start, end)])
+
+    _, granularity = _INTERVALS[parameter.interval]
+    granularities = tuple(GRANULARITIES)
+    return plan_time_range(
+        start, end, granularities[granularities.index(granularity) :]
+    )
+
+
+def _grouped_query(
+    table: str,
+    time_column: str,
+    count_expression: str,
+    ranges: list[str],
+    parameter: GetLogsHistogramParameter,
+    params: SqlParams,
+    step: str,
+) -> str:
+    rollups = table == "log_rollups"
+    split = "NULL"
+    if parameter.split_by == HistogramSplit.SOURCE and not rollups:
+        # Mapped to the names once the rows are read
+        split = '"source_id"'
+    elif parameter.split_by == HistogramSplit.SEVERITY and not rollups:
+        split = severity_name_sql()
+    elif parameter.split_by:
+        split = f'"{parameter.split_by.value}"::text'
+    conditions = log_filter_conditions(
+        parameter, params, include_time_range=False, rollups=rollups
+    )
+    conditions.append("(" + " OR ".join(ranges) + ")")
+
+    return f"""
+        SELECT
+            date_bin({step}, "{time_column}", TIMESTAMP '2000-01-01') AS "bucket",
+            {split} AS "key",
+            {count_expression} AS "count"
+        FROM "{table}"
+        WHERE {" AND ".join(conditions)}
+        GROUP BY 1, 2
+    """
+
+
+async def _query_rollups(
+    parameter: GetLogsHistogramParameter,
+    plan: TimeRangePlan,
+    step: timedelta,
+    db: Prisma,
+) -> list[dict[str, Any]]:
+    params = SqlParams()
+    step_placeholder = params.add(_interval_literal(step), "interval")
+    ranges = [
+        f'("granularity" = {params.add(granularity)} AND '
+        f'{range_condition("bucket", start, end, params)})'
+        for granularity, start, end in plan.rollup
+    ]
+    query = _grouped_query(
+        "log_rollups",
+        "bucket",
+        'SUM("count")::bigint',
+        ranges,
+        parameter,
+        params,
+        step_placeholder,
+    )
+    return await db.query_raw(query, *[driver_value(value) for value in params.values])
+
+
+async def _query_raw_logs(
+    parameter: GetLogsHistogramParameter,
+    plan: TimeRangePlan,
+    step: timedelta,
+    db: Prisma,
+) -> list[dict[str, Any]]:
+    """Raw rows per bucket, compacted historical days are read from the files"""
+    raw, scan = await log_analytics.route(db, parameter, plan.raw)
+    if scan is None:
+        return await _query_postgres_logs(parameter, raw, step, db)
+
+    async def analytics_rows() -> list[dict[str, Any]]:
+        split = parameter.split_by.value if parameter.split_by else None
+        try:
+            return await log_analytics.histogram(parameter, scan, step, split)
+        except Exception:
+            logger.exception("Analytics query failed, reading Postgres instead")
+            return await _query_postgres_logs(parameter, scan.ranges, step, db)
+
+    groups = await asyncio.gather(
+        analytics_rows(), _query_postgres_logs(parameter, raw, step, db)
+    )
+    return [row for rows in groups for row in rows]
+
+
+async def _query_postgres_logs(
+    parameter: GetLogsHistogramParameter,
+    raw: list[tuple[Optional[datetime], Optional[datetime]]],
+    step: timedelta,
+    db: Prisma,
+) -> list[dict[str, Any]]:
+    if not raw:
+        return []
+    params = SqlParams()
+    step_placeholder = params.add(_interval_literal(step), "interval")
+    ranges = [
+        f"({range_condition('timestamp', start, end, params)})" for start, end in raw
+    ]
+    query = _grouped_query(
+        "logs", "timestamp", "count(*)", ranges, parameter, params, step_placeholder
+    )
+    rows = await db.query_raw(query, *[driver_value(value) for value in params.values])
+
+    archived = Counter()
+    async for batch in log_archive.rows(db, parameter, raw):
+        for row in batch:
+            key = None
+            if parameter.split_by == HistogramSplit.SOURCE:
+                key = row["source_id"]
+            elif parameter.split_by:
+                key = row[parameter.split_by.value]
+            archived[_floor_step(row["timestamp"], step), key] += 1
+    rows += [
+        {"bucket": bucket.isoformat(), "key": key, "count": count}
+        for (bucket, key), count in archived.items()
+    ]
+
+    if parameter.split_by == HistogramSplit.SOURCE:
+        names = await log_sources.names(db, (row["key"] for row in rows))
+        rows = [{**row, "key": names[row["key"]]} for row in rows]
+    return rows
+
+
+@instrumented(rows=lambda response: len(response.buckets))
+async def get_logs_histogram_svc(
+    parameter: GetLogsHistogramParameter, db: Prisma
+) -> GetLogsHistogramResponse:
+    """
+    Service to count log entries per time interval
+
+    Whole buckets are read from the rollups and the partial edges from the
+    raw logs, both grouped per interval in SQL. Empty buckets are filled
+    with zeros so every series lines up with `buckets`.
+    """
+
+    step, _ = _INTERVALS[parameter.interval]
+
+    end = exclusive_end(parameter.end_date or datetime.now(UTC))
+    if parameter.start_date:
+        start = to_utc(parameter.start_date)
+    else:
+        start = _floor_step(end, step) - step * (HISTOGRAM_DEFAULT_BUCKETS - 1)
+
+    first_bucket = _floor_step(start, step)
+    bucket_count = max(0, -((first_bucket - end) // step))
+    if bucket_count > HISTOGRAM_MAX_BUCKETS:
+        raise HistogramRangeError(
+            f"The range spans {bucket_count} buckets, the maximum is "
+            f"{HISTOGRAM_MAX_BUCKETS}; use a larger interval or a shorter range"
+        )
+
+    plan = _plan(parameter, start, end)
+    queries = []
+    if plan.rollup:
+        queries.append(_query_rollups(parameter, plan, step, db))
+    if plan.raw:
+        queries.append(_query_raw_logs(parameter, plan, step, db))
+
+    buckets = [first_bucket + step * index for index in range(bucket_count)]
+    counts = [0] * bucket_count
+    series: dict[str, list[int]] = {}
+    if parameter.split_by == HistogramSplit.SEVERITY:
+        series = {severity.value: [0] * bucket_count for severity in SeverityLevel}
+
+    for rows in await asyncio.gather(*queries):
+        for row in rows:
+            bucket = to_utc(datetime.fromisoformat(row["bucket"]))
+            index = (bucket - first_bucket) // step
+            if not 0 <= index < bucket_count:
+                continue
+
+            counts[index] += row["count"]
+            if parameter.split_by and row["key"] is not None:
+                values = series.setdefault(row["key"], [0] * bucket_count)
+                values[index] += row["count"]
+
+    return GetLogsHistogramResponse(
+        status_code=200,
+        interval=parameter.interval,
+        buckets=buckets,
+        counts=counts,
+        series=series,
+    )
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import zlib
+from datetime import UTC, datetime, timedelta
+from typing import Any, AsyncIterator, Optional
+
+from app.services.create_log import CreateLogPayload
+from app.services.log_patterns import log_patterns
+from app.services.log_rollups import record_created_logs
+from app.services.log_sources import log_sources
+from app.services.log_stream import log_stream_hub
+from app.services.metrics import instrumented
+from app.services.response_cache import response_cache
+from app.utils.time_buckets import truncate_ms
+from prisma import Prisma
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from uuid_utils import uuid7
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", "100000"))
+INGEST_MAX_PENDING_ROWS = int(os.getenv("INGEST_MAX_PENDING_ROWS", "200000"))
+# Limit of the body after gzip decompression, enforced while it is read
+INGEST_MAX_BODY_BYTES = int(os.getenv("INGEST_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+INGEST_RETRY_AFTER_SECONDS = 1
+INGEST_TX_TIMEOUT = timedelta(seconds=30)
+
+_payload_list_adapter = TypeAdapter(list[CreateLogPayload])
+
+
+class IngestPayloadError(ValueError):
+    pass
+
+
+class IngestPayloadTooLargeError(IngestPayloadError):
+    pass
+
+
+class IngestQueueFullError(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Ingest queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class BulkIngestItemError(BaseModel):
+    index: int
+    message: str
+
+
+class BulkIngestFailedRange(BaseModel):
+    # Positions in the batch, end exclusive. None of the valid items in the
+    # range were stored, they can be sent again without creating duplicates
+    start: int
+    end: int
+    message: str
+
+
+class BulkIngestLogsResponse(BaseModel):
+    status_code: int
+    accepted: int
+    rejected: int
+    errors: list[BulkIngestItemError]
+    # Valid items that were not stored because their chunk failed to write
+    failed: int = 0
+    failed_ranges: list[BulkIngestFailedRange] = []
+
+
+class IngestQueue:
+    """
+    Admission control for bulk ingest.
+
+    Tracks how many accepted rows are still waiting to be written across
+    all in-flight requests and refuses new work once that backlog is full,
+    instead of letting requests pile up on the connection pool.
+    """
+
+    def __init__(self, max_pending_rows: int) -> None:
+        self.max_pending_rows = max_pending_rows
+        self.pending_rows = 0
+
+    def check(self) -> None:
+        """Fail fast before a request body is even read"""
+        if self.pending_rows >= self.max_pending_rows:
+            raise IngestQueueFullError(INGEST_RETRY_AFTER_SECONDS)
+
+    def reserve(self, rows: int) -> None:
+        if self.pending_rows and self.pending_rows + rows > self.max_pending_rows:
+            raise IngestQueueFullError(INGEST_RETRY_AFTER_SECONDS)
+        self.pending_rows += rows
+
+    def release(self, rows: int) -> None:
+        self.pending_rows = max(0, self.pending_rows - rows)
+
+
+ingest_queue = IngestQueue(INGEST_MAX_PENDING_ROWS)
+
+
+async def read_ingest_body(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str],
+    max_bytes: int = INGEST_MAX_BODY_BYTES,
+) -> bytes:
+    """
+    Read a bulk ingest body, gunzipping it as it arrives.
+
+    The request fails as soon as the decompressed body grows past
+    `max_bytes`, so a small gzip bomb never gets expanded in memory.
+    """
+
+    gzipped = bool(content_encoding) and content_encoding.lower() == "gzip"
+    decompressor = zlib.decompressobj(wbits=31)
+    parts: list[bytes] = []
+    size = 0
+
+    def append(data: bytes) -> None:
+        nonlocal size
+        size += len(data)
+        if size > max_bytes:
+            raise IngestPayloadTooLargeError(
+                f"The body may be at most {max_bytes} bytes once decompressed"
+            )
+        parts.append(data)
+
+    # Whether the current gzip member has started but not ended yet
+    in_member = False
+    try:
+        async for chunk in chunks:
+            if not gzipped:
+                append(chunk)
+                continue
+            while chunk:
+                in_member = True
+                # Never inflate more than the remaining allowance at once
+                append(decompressor.decompress(chunk, max_bytes - size + 1))
+                chunk = decompressor.unconsumed_tail
+                if decompressor.eof:
+                    # Bodies may hold several concatenated gzip members
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=31)
+                    in_member = False
+    except zlib.error:
+        raise IngestPayloadError("Body is not valid gzip data")
+    if in_member:
+        raise IngestPayloadError("Body is not valid gzip data")
+    return b"".join(parts)
+
+
+def parse_ingest_body(
+    body: bytes, content_type: Optional[str]
+) -> tuple[list[Any], list[BulkIngestItemError]]:
+    """
+    Decode a bulk ingest body into raw items.
+
+    Accepts a JSON array or NDJSON (one object per line). Lines of an
+    NDJSON body that are not valid JSON are reported as item errors rather
+    than failing the whole request.
+    """
+
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in {"application/x-ndjson", "application/ndjson"}:
+        items: list[Any] = []
+        errors: list[BulkIngestItemError] = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                errors.append(BulkIngestItemError(index=len(items), message=str(e)))
+                items.append(None)
+        return items, errors
+
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise IngestPayloadError(f"Body is not valid JSON: {e}")
+    if not isinstance(items, list):
+        raise IngestPayloadError("Body must be a JSON array of logs")
+    return items, []
+
+
+def _validate_items(
+    items: list[Any], errors: list[BulkIngestItemError]
+) -> list[tuple[int, CreateLogPayload]]:
+    """
+    Validate the whole batch at once and only revisit it when it fails.
+    Returns the valid items with their position in the batch.
+    """
+
+    if not errors:
+        try:
+            return list(enumerate(_payload_list_adapter.validate_python(items)))
+        except ValidationError:
+            pass
+
+    failed = {error.index for error in errors}
+    valid = []
+    for index, item in enumerate(items):
+        if index in failed:
+            continue
+        try:
+            valid.append((index, CreateLogPayload.model_validate(item)))
+        except ValidationError as e:
+            message = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'item'}: "
+                f"{error['msg']}"
+                for error in e.errors()
+            )
+            errors.append(BulkIngestItemError(index=index, message=message))
+
+    errors.sort(key=lambda error: error.index)
+    return valid
+
+
+async def _write_chunk(rows: list[dict[str, Any]], db: Prisma) -> None:
+    await log_patterns.register(db, (row["message"] for row in rows))
+    data = await log_sources.prisma_log_rows(db, rows)
+    async with db.tx(timeout=INGEST_TX_TIMEOUT) as transaction:
+        await transaction.log.create_many(data=data)
+        await record_created_logs(transaction, rows)
+
+
+@instrumented()
+async def ingest_logs_svc(
+    items: list[Any], errors: list[BulkIngestItemError], db: Prisma
+) -> BulkIngestLogsResponse:
+    """
+    Service to validate and insert a batch of log entries
+
+    Valid items are written with multi-row inserts of INGEST_CHUNK_SIZE
+    rows, invalid ones are reported back by their position in the batch.
+    Every chunk commits on its own; a chunk that fails to write is reported
+    as a range of positions and the remaining chunks are still written.
+    """
+
+    if len(items) > INGEST_MAX_ITEMS:
+        raise IngestPayloadError(
+            f"A batch may contain at most {INGEST_MAX_ITEMS} logs, got {len(items)}"
+        )
+
+    logs = _validate_items(items, errors)
+
+    ingest_queue.reserve(len(logs))
+    pending = len(logs)
+    accepted = 0
+    failed_ranges = []
+    try:
+        for offset in range(0, len(logs), INGEST_CHUNK_SIZE):
+            chunk = logs[offset : offset + INGEST_CHUNK_SIZE]
+            timestamp = truncate_ms(datetime.now(UTC))
+            rows = [
+                {
+                    "id": str(uuid7()),
+                    "severity": log.severity,
+                    "message": log.message,
+                    "source": log.source,
+                    "timestamp": timestamp,
+                    "metadata": log.metadata,
+                }
+                for _, log in chunk
+            ]
+            try:
+                await _write_chunk(rows, db)
+            except Exception as e:
+                logger.exception("Failed to write %d ingested logs", len(rows))
+                failed_ranges.append(
+                    BulkIngestFailedRange(
+                        start=chunk[0][0], end=chunk[-1][0] + 1, message=str(e)
+                    )
+                )
+            else:
+                accepted += len(rows)
+                await response_cache.invalidate(timestamp, timestamp)
+                await log_stream_hub.publish(db, rows)
+            finally:
+                ingest_queue.release(len(chunk))
+                pending -= len(chunk)
+    finally:
+        ingest_queue.release(pending)
+
+    failed = len(logs) - accepted
+    if errors and not logs:
+        # Every item was invalid, retrying the same batch can't help
+        status_code = 422
+    elif failed and not accepted:
+        # Nothing was stored, the whole batch can be retried
+        status_code = 503
+    elif failed or errors:
+        status_code = 207
+    else:
+        status_code = 201
+
+    return BulkIngestLogsResponse(
+        status_code=status_code,
+        accepted=accepted,
+        rejected=len(errors),
+        errors=errors,
+        failed=failed,
+        failed_ranges=failed_ranges,
+    )
@@ -0,0 +1,448 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import UTC, datetime, timedelta
+from enum import Enum
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Optional
+
+from app.services.export_logs import (
+    ExportLogsParameter,
+    appendable_export,
+    encode_export,
+    export_content_info,
+    export_next_cursor,
+    iter_log_pages,
+    prepare_export,
+)
+from app.services.generate_logs import insert_random_logs
+from app.services.metrics import instrumented
+from app.utils.cursor import decode_cursor
+from app.utils.metadata import METADATA_FILTER_PREFIX, parse_metadata_filters
+from prisma import Json, Prisma
+from pydantic import BaseModel, Field
+from uuid_utils import uuid7
+
+logger = logging.getLogger(__name__)
+
+# Result files of export jobs, every API process must see the same directory
+JOB_DIR = Path(os.getenv("JOB_DIR", "jobs"))
+# Run queued jobs inside the API process, at most JOB_CONCURRENCY at a time
+JOB_WORKER = os.getenv("JOB_WORKER", "true").lower() in {"1", "true", "yes"}
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+# Finished jobs and their result files are removed after this many hours
+JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+JOB_POLL_SECONDS = 5
+JOB_EXPIRY_INTERVAL = timedelta(hours=1)
+# Running jobs not updated for this long belong to a dead worker
+JOB_STALE_AFTER = timedelta(minutes=5)
+
+# Logs inserted per transaction by generate jobs
+GENERATE_JOB_BATCH_SIZE = 1000
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Wakes the worker when a job is queued or finished by this process
+_wakeup = asyncio.Event()
+
+
+class JobKind(str, Enum):
+    EXPORT = "export"
+    GENERATE = "generate"
+
+
+class InvalidJobError(ValueError):
+    pass
+
+
+class JobResultUnavailableError(ValueError):
+    pass
+
+
+class _JobStopped(Exception):
+    """The job was cancelled while it ran"""
+
+
+class GenerateJobParameter(BaseModel):
+    count: int = Field(..., ge=1, le=10_000_000)
+    days_back: int = Field(..., ge=0, le=365)
+
+
+class CreateJobPayload(BaseModel):
+    kind: JobKind
+    # Export jobs take the download parameters, generate jobs count/days_back
+    parameters: dict[str, Any] = Field(default_factory=dict)
+
+
+class JobModel(BaseModel):
+    id: str
+    kind: JobKind
+    status: str
+    parameters: dict[str, Any]
+    rows: int
+    total: Optional[int] = None
+    bytes: int
+    error: Optional[str] = None
+    # Set on a finished export with a limit when more rows follow, pass it
+    # as the cursor of the next export
+    next_cursor: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _job_model(job: Any) -> JobModel:
+    model = JobModel.model_validate(job.model_dump())
+    if job.kind == JobKind.EXPORT and job.status == DONE:
+        model.next_cursor = job.checkpoint
+    return model
+
+
+def _result_path(job_id: str) -> Path:
+    return JOB_DIR / job_id
+
+
+def _export_parameter(parameters: dict[str, Any]) -> ExportLogsParameter:
+    parameter = ExportLogsParameter.model_validate(parameters)
+    parameter.meta = parse_metadata_filters(
+        {METADATA_FILTER_PREFIX + key: value for key, value in parameter.meta.items()}
+    )
+    prepare_export(parameter)
+    return parameter
+
+
+@instrumented()
+async def create_job_svc(payload: CreateJobPayload, db: Prisma) -> JobModel:
+    """
+    Service to queue an export or a log generation
+
+    The parameters are validated before the job is queued, so a bad
+    request fails right away instead of in the worker.
+    """
+
+    try:
+        if payload.kind == JobKind.EXPORT:
+            parameter = _export_parameter(payload.parameters)
+            parameters = parameter.model_dump(mode="json", exclude_defaults=True)
+            total = parameter.limit
+        else:
+            parameter = GenerateJobParameter.model_validate(payload.parameters)
+            parameters = parameter.model_dump(mode="json")
+            total = parameter.count
+    except ValueError as e:
+        raise InvalidJobError(str(e)) from e
+
+    job = await db.job.create(
+        data={
+            "id": str(uuid7()),
+            "kind": payload.kind.value,
+            "status": PENDING,
+            "parameters": Json(parameters),
+            "total": total,
+        }
+    )
+    _wakeup.set()
+    return _job_model(job)
+
+
+@instrumented()
+async def get_job_svc(job_id: str, db: Prisma) -> Optional[JobModel]:
+    """
+    Service to get a job with its progress
+    """
+
+    job = await db.job.find_unique(where={"id": job_id})
+    return _job_model(job) if job else None
+
+
+@instrumented()
+async def cancel_job_svc(job_id: str, db: Prisma) -> Optional[JobModel]:
+    """
+    Service to cancel a queued or running job
+
+    A running job stops at its next checkpoint. Logs already generated
+    stay, a partial export file is removed.
+    """
+
+    await db.job.update_many(
+        where={"id": job_id, "status": {"in": [PENDING, RUNNING]}},
+        data={"status": CANCELLED, "updated_at": _now(), "finished_at": _now()},
+    )
+    return await get_job_svc(job_id, db)
+
+
+async def get_job_result_svc(
+    job_id: str, db: Prisma
+) -> Optional[tuple[Path, str, str]]:
+    """
+    Service to locate the result file of a finished export
+
+    Returns the path, media type and attachment filename.
+    """
+
+    job = await db.job.find_unique(where={"id": job_id})
+    if not job:
+        return None
+    if job.kind != JobKind.EXPORT.value:
+        raise JobResultUnavailableError("Only export jobs have a result")
+    if job.status != DONE:
+        raise JobResultUnavailableError(f"The job is {job.status}")
+
+    path = _result_path(job.id)
+    if not path.is_file():
+        raise JobResultUnavailableError("The result is no longer available")
+    media_type, filename = export_content_info(
+        ExportLogsParameter.model_validate(job.parameters)
+    )
+    return path, media_type, filename
+
+
+async def claim_job(db: Prisma) -> Optional[str]:
+    """Take the oldest queued job, or a running one whose worker died"""
+    row = await db.query_first(
+        """
+        UPDATE "jobs" SET "status" = $1, "updated_at" = $2::timestamp
+        WHERE "id" = (
+            SELECT "id" FROM "jobs"
+            WHERE "status" = $3 OR ("status" = $1 AND "updated_at" < $4::timestamp)
+            ORDER BY "created_at"
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING "id"
+        """,
+        RUNNING,
+        _now().isoformat(),
+        PENDING,
+        (_now() - JOB_STALE_AFTER).isoformat(),
+    )
+    return row["id"] if row else None
+
+
+async def _checkpoint(db: Prisma, job_id: str, data: dict[str, Any]) -> None:
+    """Record progress, which also tells other workers the job is alive"""
+    updated = await db.job.update_many(
+        where={"id": job_id, "status": RUNNING},
+        data={**data, "updated_at": _now()},
+    )
+    if not updated:
+        raise _JobStopped()
+
+
+def _append(file: BinaryIO, data: bytes) -> None:
+    file.write(data)
+    file.flush()
+    os.fsync(file.fileno())
+
+
+async def _batches(*batches: list[Any]) -> AsyncIterator[list[Any]]:
+    for batch in batches:
+        yield batch
+
+
+async def _run_export(db: Prisma, job: Any) -> None:
+    """
+    Write the export into the job's result file.
+
+    CSV and NDJSON are encoded batch by batch and checkpointed with the
+    cursor after each batch and the file size, so a restarted job
+    truncates whatever was written after the checkpoint and continues
+    from the cursor. Arrow and Parquet files can't be appended to, an
+    interrupted job of those formats starts over. The last checkpoint
+    keeps the cursor only when more rows follow a limited export.
+    """
+
+    parameter = ExportLogsParameter.model_validate(job.parameters)
+    position = prepare_export(parameter)
+    appendable = appendable_export(parameter)
+
+    path = _result_path(job.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    rows, size, cursor = job.rows, job.bytes, None
+    if appendable and job.checkpoint and path.exists():
+        cursor = job.checkpoint
+        position = decode_cursor(cursor, parameter.sort_by, parameter.sort_order)
+        if parameter.limit is not None:
+            parameter.limit -= rows
+    else:
+        rows = size = 0
+
+    with open(path, "r+b" if size else "wb") as file:
+        file.truncate(size)
+        file.seek(size)
+
+        if appendable:
+            async for logs, cursor in iter_log_pages(parameter, db, position):
+                chunks = encode_export(parameter, _batches(logs), header=size == 0)
+                data = b"".join([chunk async for chunk in chunks])
+                await asyncio.to_thread(_append, file, data)
+                rows += len(logs)
+                size += len(data)
+                await _checkpoint(
+                    db, job.id, {"checkpoint": cursor, "rows": rows, "bytes": size}
+                )
+            if size == 0:
+                # No matching logs, still a valid file with the CSV header
+                chunks = encode_export(parameter, _batches([]))
+                data = b"".join([chunk async for chunk in chunks])
+                await asyncio.to_thread(_append, file, data)
+                size = len(data)
+        else:
+
+            async def counted() -> AsyncIterator[list[Any]]:
+                nonlocal rows, cursor
+                async for logs, cursor in iter_log_pages(parameter, db, position):
+                    yield logs
+                    rows += len(logs)
+                    await _checkpoint(db, job.id, {"rows": rows, "bytes": size})
+
+            async for data in encode_export(parameter, counted()):
+                await asyncio.to_thread(_append, file, data)
+                size += len(data)
+
+    if parameter.limit is None:
+        cursor = None
+    cursor = await export_next_cursor(parameter, db, cursor)
+    await _checkpoint(db, job.id, {"checkpoint": cursor, "rows": rows, "bytes": size})
+
+
+async def _run_generate(db: Prisma, job: Any) -> None:
+    """Insert the logs in batches, each committed with the job's progress"""
+    parameter = GenerateJobParameter.model_validate(job.parameters)
+    rows = job.rows
+
+    while rows < parameter.count:
+        count = min(GENERATE_JOB_BATCH_SIZE, parameter.count - rows)
+        rows += count
+
+        async def checkpoint(transaction: Prisma, rows: int = rows) -> None:
+            # Raising rolls the batch back when the job was cancelled
+            await _checkpoint(transaction, job.id, {"rows": rows})
+
+        await insert_random_logs(db, count, parameter.days_back, checkpoint)
+
+
+async def _finish_job(
+    db: Prisma, job_id: str, status: str, error: Optional[str] = None
+) -> None:
+    await db.job.update_many(
+        where={"id": job_id, "status": RUNNING},
+        data={
+            "status": status,
+            "error": error,
+            "updated_at": _now(),
+            "finished_at": _now(),
+        },
+    )
+
+
+async def run_job(job_id: str, db: Prisma) -> None:
+    """Run a claimed job from its last checkpoint until it is done"""
+    job = await db.job.find_unique(where={"id": job_id})
+    if not job:
+        return
+
+    try:
+        if job.kind == JobKind.EXPORT.value:
+            await _run_export(db, job)
+        else:
+            await _run_generate(db, job)
+    except _JobStopped:
+        logger.info("Job %s stopped, it was cancelled", job_id)
+        if job.kind == JobKind.EXPORT.value:
+            _result_path(job_id).unlink(missing_ok=True)
+        return
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        await _finish_job(db, job_id, FAILED, str(e))
+        if job.kind == JobKind.EXPORT.value:
+            _result_path(job_id).unlink(missing_ok=True)
+        return
+
+    await _finish_job(db, job_id, DONE)
+    logger.info("Job %s finished", job_id)
+
+
+async def expire_jobs_svc(
+    db: Prisma, ttl_hours: int, now: Optional[datetime] = None
+) -> int:
+    """
+    Service to remove the jobs that finished more than `ttl_hours` ago,
+    together with their result files
+    """
+
+    if ttl_hours <= 0:
+        return 0
+
+    now = now or _now()
+    jobs = await db.job.find_many(
+        where={
+            "status": {"in": [DONE, FAILED, CANCELLED]},
+            "finished_at": {"lt": now - timedelta(hours=ttl_hours)},
+        }
+    )
+    for job in jobs:
+        _result_path(job.id).unlink(missing_ok=True)
+    if jobs:
+        await db.job.delete_many(where={"id": {"in": [job.id for job in jobs]}})
+    return len(jobs)
+
+
+async def run_job_worker(db: Prisma) -> None:
+    """
+    Background loop running up to JOB_CONCURRENCY queued jobs at a time
+
+    On shutdown the running jobs are cancelled and queued again, the next
+    worker resumes them from their checkpoint.
+    """
+
+    running: dict[str, asyncio.Task] = {}
+    next_expiry = 0.0
+
+    def finished(job_id: str) -> None:
+        running.pop(job_id, None)
+        _wakeup.set()
+
+    try:
+        while True:
+            _wakeup.clear()
+            try:
+                if time.monotonic() >= next_expiry:
+                    await expire_jobs_svc(db, JOB_RESULT_TTL_HOURS)
+                    next_expiry = time.monotonic() + JOB_EXPIRY_INTERVAL.total_seconds()
+
+                while len(running) < JOB_CONCURRENCY:
+                    job_id = await claim_job(db)
+                    if not job_id:
+                        break
+                    running[job_id] = asyncio.create_task(run_job(job_id, db))
+                    running[job_id].add_done_callback(
+                        lambda _, job_id=job_id: finished(job_id)
+                    )
+            except Exception:
+                logger.exception("Job worker failed")
+
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_SECONDS)
+            except TimeoutError:
+                pass
+    finally:
+        interrupted, tasks = list(running), list(running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if interrupted:
+            await db.job.update_many(
+                where={"id": {"in": interrupted}, "status": RUNNING},
+                data={"status": PENDING, "updated_at": _now()},
+            )
@@ -0,0 +1,558 @@
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.database import libpq_url
+from app.services.log_archive import iter_archived_rows
+from app.utils.log_filters import compile_log_filter
+from app.utils.sql import SqlParams, escape_like, severity_name_sql
+from app.utils.time_buckets import to_utc_naive
+from prisma import Prisma
+from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
+
+try:
+    import duckdb
+except ImportError:  # Only needed for the analytics backend
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# Directory of the compacted Parquet files, the backend is off when unset.
+# Every API process reading it must see the same directory.
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR")
+# Days younger than this are never compacted and always read from Postgres
+ANALYTICS_HOT_DAYS = int(os.getenv("ANALYTICS_HOT_DAYS", "2"))
+# Run the compaction periodically inside the API process
+ANALYTICS_COMPACTION = os.getenv("ANALYTICS_COMPACTION", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+ANALYTICS_COMPACTION_INTERVAL = timedelta(
+    seconds=int(os.getenv("ANALYTICS_COMPACTION_INTERVAL_SECONDS", "3600"))
+)
+
+# Superseded files are kept this long for queries that already listed them
+_SUPERSEDED_GRACE = timedelta(minutes=10)
+# Leftovers of a compaction that died are removed after this long
+_STAGING_GRACE = timedelta(days=1)
+_ROW_GROUP_SIZE = 100_000
+_FETCH_SIZE = 50_000
+
+_SCHEMA = pa.schema(
+    [
+        pa.field("timestamp", pa.timestamp("us"), nullable=False),
+        pa.field("severity", pa.dictionary(pa.int8(), pa.string()), nullable=False),
+        pa.field("source", pa.dictionary(pa.int32(), pa.string()), nullable=False),
+        pa.field("message", pa.string(), nullable=False),
+    ]
+)
+
+Range = tuple[Optional[datetime], Optional[datetime]]
+
+
+@dataclass
+class AnalyticsScan:
+    """Time ranges of a query that are read from the Parquet files"""
+
+    ranges: list[Range]
+    files: list[str] = field(default_factory=list)
+
+
+def _closed_before(now: Optional[datetime] = None) -> date:
+    """Days before this one are closed and can be compacted"""
+    today = (now or datetime.now(UTC)).date()
+    return today - timedelta(days=ANALYTICS_HOT_DAYS)
+
+
+async def touch_log_days(db: Prisma, timestamps: Iterable[datetime]) -> None:
+    """
+    Invalidate the compaction of the days the given logs belong to.
+
+    Runs in the transaction of the write, so a compaction either sees the
+    write or is superseded by the version it bumps. Writes to the hot
+    window cost nothing, a day of margin covers a day boundary passing
+    between the write and the compactor.
+    """
+
+    horizon = _closed_before() + timedelta(days=1)
+    days = {
+        to_utc_naive(timestamp).date()
+        for timestamp in timestamps
+        if to_utc_naive(timestamp).date() < horizon
+    }
+    if days:
+        await _bump_versions(db, sorted(days))
+
+
+async def touch_log_day_range(db: Prisma, start: datetime, end: datetime) -> None:
+    """Invalidate every day in [start, end], for writes that bypass the services"""
+    day, last = to_utc_naive(start).date(), to_utc_naive(end).date()
+    await _bump_versions(
+        db, [day + timedelta(days=offset) for offset in range((last - day).days + 1)]
+    )
+
+
+async def _bump_versions(db: Prisma, days: list[date]) -> None:
+    await db.execute_raw(
+        """
+        INSERT INTO "log_day_versions" ("day", "version")
+        SELECT unnest($1::date[]), 1
+        ON CONFLICT ("day") DO UPDATE SET "version" = "log_day_versions"."version" + 1
+        """,
+        [day.isoformat() for day in days],
+    )
+
+
+def _day_dir(day: date) -> Path:
+    return Path(ANALYTICS_DIR) / f"day={day.isoformat()}"
+
+
+def _version_dir(day: date, version: int) -> Path:
+    return _day_dir(day) / f"version={version}"
+
+
+def _parse_day(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class LogAnalytics:
+    """
+    Read side of the compacted logs, queried in-process with DuckDB.
+
+    A compacted day is only used while its version in `log_day_versions`
+    still matches the one its files were written from, so the result is
+    the same as reading the rows from Postgres.
+    """
+
+    def __init__(self, directory: Optional[str]) -> None:
+        self.enabled = bool(directory)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _cursor(self):
+        if duckdb is None:
+            raise RuntimeError(
+                "ANALYTICS_DIR requires the duckdb package, "
+                "install the backend with the 'analytics' extra"
+            )
+        with self._lock:
+            if self._connection is None:
+                self._connection = duckdb.connect(":memory:")
+            return self._connection.cursor()
+
+    async def route(
+        self, db: Prisma, parameter: Any, ranges: list[Range]
+    ) -> tuple[list[Range], Optional[AnalyticsScan]]:
+        """
+        Split raw-row ranges between Postgres and the compacted days.
+
+        Only days a range covers entirely are read from the files. Returns
+        the ranges left to Postgres and the scan of the others, or every
+        range and `None` when nothing can be read from the files.
+        """
+
+        if not self.enabled or not ranges or compile_log_filter(parameter).meta:
+            # Metadata filters only exist as jsonb in Postgres
+            return ranges, None
+
+        starts = [start for start, _ in ranges]
+        ends = [end for _, end in ranges]
+        params = SqlParams()
+        conditions = [
+            'c."version" = COALESCE(v."version", 0)',
+            'c."rows" > 0',
+            f'c."day" < {params.add(_closed_before().isoformat(), "date")}',
+        ]
+        if None not in starts:
+            first = to_utc_naive(min(starts)).date().isoformat()
+            conditions.append(f'c."day" >= {params.add(first, "date")}')
+        if None not in ends:
+            last = to_utc_naive(max(ends)).isoformat()
+            conditions.append(f'c."day" < {params.add(last, "timestamp")}')
+        rows = await db.query_raw(
+            f"""
+            SELECT c."day", c."version" FROM "log_compactions" c
+            LEFT JOIN "log_day_versions" v ON v."day" = c."day"
+            WHERE {" AND ".join(conditions)}
+            ORDER BY c."day"
+            """,
+            *params.values,
+        )
+        days = {_parse_day(row["day"]): int(row["version"]) for row in rows}
+        if not days:
+            return ranges, None
+
+        postgres: list[Range] = []
+        scan = AnalyticsScan(ranges=[])
+        used: set[date] = set()
+        for start, end in ranges:
+            start = to_utc_naive(start) if start is not None else None
+            end = to_utc_naive(end) if end is not None else None
+            cursor = start
+            for day in sorted(days):
+                day_start = datetime.combine(day, datetime.min.time())
+                day_end = day_start + timedelta(days=1)
+                # Partial days are cheaper to read from Postgres' indexes
+                if (start is not None and start > day_start) or (
+                    end is not None and end < day_end
+                ):
+                    continue
+                if cursor is None or cursor < day_start:
+                    postgres.append((cursor, day_start))
+                if scan.ranges and scan.ranges[-1][1] == day_start:
+                    scan.ranges[-1] = (scan.ranges[-1][0], day_end)
+                else:
+                    scan.ranges.append((day_start, day_end))
+                used.add(day)
+                cursor = day_end
+            if cursor is None or end is None or cursor < end:
+                postgres.append((cursor, end))
+
+        if not scan.ranges:
+            return ranges, None
+        files = await asyncio.to_thread(
+            lambda: [
+                sorted(_version_dir(day, days[day]).glob("*.parquet"))
+                for day in sorted(used)
+            ]
+        )
+        if not all(files):
+            # Compacted on a host whose directory this process doesn't see
+            logger.warning("Compacted logs missing under %s", ANALYTICS_DIR)
+            return ranges, None
+        scan.files = [str(path) for paths in files for path in paths]
+        return postgres, scan
+
+    def _conditions(self, parameter: Any, scan: AnalyticsScan, params: SqlParams):
+        compiled = compile_log_filter(parameter)
+        if compiled.empty:
+            return ["FALSE"]
+
+        conditions = []
+        if compiled.severities is not None:
+            conditions.append(
+                f'list_contains({params.add(list(compiled.severities))}, "severity")'
+            )
+        if compiled.sources is not None:
+            conditions.append(
+                f'list_contains({params.add(list(compiled.sources))}, "source")'
+            )
+        if compiled.exclude_sources:
+            conditions.append(
+                "NOT list_contains("
+                f'{params.add(list(compiled.exclude_sources))}, "source")'
+            )
+        if compiled.source_prefix:
+            conditions.append(
+                f'starts_with("source", {params.add(compiled.source_prefix)})'
+            )
+        if compiled.q:
+            pattern = params.add(f"%{escape_like(compiled.q)}%")
+            conditions.append(f"\"message\" ILIKE {pattern} ESCAPE '\\'")
+
+        bounds = []
+        for start, end in scan.ranges:
+            bound = []
+            if start is not None:
+                bound.append(f'"timestamp" >= {params.add(start)}')
+            if end is not None:
+                bound.append(f'"timestamp" < {params.add(end)}')
+            bounds.append("(" + (" AND ".join(bound) or "TRUE") + ")")
+        conditions.append("(" + " OR ".join(bounds) + ")")
+        return conditions
+
+    async def _query(self, query: str, values: list[Any]) -> list[dict[str, Any]]:
+        def run() -> list[dict[str, Any]]:
+            cursor = self._cursor()
+            try:
+                cursor.execute(query, values)
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+        return await asyncio.to_thread(run)
+
+    async def counts(self, parameter: Any, scan: AnalyticsScan) -> list[dict]:
+        """Log counts per severity and source, like the raw Postgres grouping"""
+        params = SqlParams()
+        conditions = self._conditions(parameter, scan, params)
+        return await self._query(
+            f"""
+            SELECT "severity", "source", count(*) AS "_count"
+            FROM {_read_parquet(scan.files)}
+            WHERE {" AND ".join(conditions)}
+            GROUP BY "severity", "source"
+            """,
+            params.values,
+        )
+
+    async def histogram(
+        self,
+        parameter: Any,
+        scan: AnalyticsScan,
+        step: timedelta,
+        split: Optional[str],
+    ) -> list[dict]:
+        """Log counts per `step` bucket and `split` column, aligned on 2000-01-01"""
+        params = SqlParams()
+        seconds = params.add(int(step.total_seconds()))
+        conditions = self._conditions(parameter, scan, params)
+        key = f'"{split}"' if split else "NULL"
+        rows = await self._query(
+            f"""
+            SELECT
+                time_bucket(to_seconds({seconds}), "timestamp", TIMESTAMP '2000-01-01')
+                    AS "bucket",
+                {key} AS "key",
+                count(*) AS "count"
+            FROM {_read_parquet(scan.files)}
+            WHERE {" AND ".join(conditions)}
+            GROUP BY 1, 2
+            """,
+            params.values,
+        )
+        # Shaped like the rows of a Prisma raw query
+        return [{**row, "bucket": row["bucket"].isoformat()} for row in rows]
+
+
+def _read_parquet(files: list[str]) -> str:
+    # Table function arguments can't be query parameters
+    paths = ", ".join("'" + path.replace("'", "''") + "'" for path in files)
+    return f"read_parquet([{paths}])"
+
+
+log_analytics = LogAnalytics(ANALYTICS_DIR)
+
+
+def _write_day(database_url: str, day: date, directory: Path) -> tuple[int, int, int]:
+    """
+    Write the logs of a day into one Parquet file per source, archived
+    logs included.
+
+    The version and the rows are read in one repeatable read snapshot.
+    Returns the version, the number of rows and the bytes written.
+    """
+
+    dsn, schema = libpq_url(database_url)
+    connection = psycopg2.connect(
+        dsn, options=f"-c search_path={schema}" if schema else None
+    )
+    connection.set_session(
+        isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True
+    )
+    start = datetime.combine(day, datetime.min.time())
+    writers: dict[int, pq.ParquetWriter] = {}
+    buffers: dict[int, list[tuple]] = {}
+
+    def flush(source_id: int) -> None:
+        rows = buffers.pop(source_id, [])
+        if not rows:
+            return
+        if source_id not in writers:
+            writers[source_id] = pq.ParquetWriter(
+                directory / f"source_id={source_id}.parquet",
+                _SCHEMA,
+                compression="zstd",
+            )
+        columns = list(zip(*rows))
+        writers[source_id].write_table(
+            pa.table(
+                {
+                    "timestamp": pa.array(columns[0], pa.timestamp("us")),
+                    "severity": pa.array(columns[1]).dictionary_encode(),
+                    "source": pa.array(columns[2]).dictionary_encode(),
+                    "message": pa.array(columns[3], pa.string()),
+                }
+            ).cast(_SCHEMA)
+        )
+
+    written = 0
+
+    def append(source_id: int, values: tuple) -> None:
+        nonlocal written
+        rows = buffers.setdefault(source_id, [])
+        rows.append(values)
+        if len(rows) >= _ROW_GROUP_SIZE:
+            flush(source_id)
+        written += 1
+
+    try:
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT "version" FROM "log_day_versions" WHERE "day" = %s', (day,)
+                )
+                row = cursor.fetchone()
+                version = row[0] if row else 0
+
+            with connection.cursor(name="log_compaction") as cursor:
+                cursor.itersize = _FETCH_SIZE
+                cursor.execute(
+                    f"""
+                    SELECT l."source_id", l."timestamp",
+                        {severity_name_sql('l."severity"')}, s."name", l."message"
+                    FROM "logs" l JOIN "log_sources" s ON s."id" = l."source_id"
+                    WHERE l."timestamp" >= %s AND l."timestamp" < %s
+                    """,
+                    (start, start + timedelta(days=1)),
+                )
+                for source_id, *values in cursor:
+                    append(source_id, tuple(values))
+
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT "id", "name" FROM "log_sources"')
+                names = dict(cursor.fetchall())
+            for row in iter_archived_rows(connection, start, start + timedelta(days=1)):
+                append(
+                    row["source_id"],
+                    (
+                        to_utc_naive(row["timestamp"]),
+                        row["severity"],
+                        names[row["source_id"]],
+                        row["message"],
+                    ),
+                )
+        for source_id in list(buffers):
+            flush(source_id)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        connection.close()
+
+    size = sum(path.stat().st_size for path in directory.glob("*.parquet"))
+    return version, written, size
+
+
+def _compact_day(database_url: str, day: date) -> tuple[int, int, int]:
+    """Compact a day into a fresh directory, moved in place once complete"""
+    staging = _day_dir(day) / f"staging-{os.getpid()}-{time.time_ns()}"
+    staging.mkdir(parents=True)
+    try:
+        version, rows, size = _write_day(database_url, day, staging)
+        target = _version_dir(day, version)
+        if target.exists():
+            shutil.rmtree(target)
+        staging.rename(target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return version, rows, size
+
+
+def _remove_superseded(current: dict[date, int]) -> None:
+    """Delete the files of versions and days that are no longer read"""
+    now = time.time()
+    for day_dir in Path(ANALYTICS_DIR).glob("day=*"):
+        day = date.fromisoformat(day_dir.name.removeprefix("day="))
+        for path in day_dir.iterdir():
+            if path.name == f"version={current.get(day)}":
+                continue
+            grace = (
+                _STAGING_GRACE
+                if path.name.startswith("staging-")
+                else _SUPERSEDED_GRACE
+            )
+            if path.stat().st_mtime < now - grace.total_seconds():
+                shutil.rmtree(path, ignore_errors=True)
+        if not any(day_dir.iterdir()):
+            day_dir.rmdir()
+
+
+async def compact_logs_svc(
+    db: Prisma, progress: Optional[Callable[[date, int], None]] = None
+) -> int:
+    """
+    Service to compact the closed days that changed since their compaction
+
+    Days are written oldest first, one repeatable read snapshot each, and
+    recorded in `log_compactions` with the version they were read at.
+    Returns the number of days compacted.
+    """
+
+    if not ANALYTICS_DIR:
+        raise RuntimeError("Set ANALYTICS_DIR to compact logs for analytics")
+
+    Path(ANALYTICS_DIR).mkdir(parents=True, exist_ok=True)
+    with open(Path(ANALYTICS_DIR) / ".compaction.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process on this host is compacting
+            return 0
+        return await _compact_logs(db, progress)
+
+
+async def _compact_logs(
+    db: Prisma, progress: Optional[Callable[[date, int], None]]
+) -> int:
+    closed_before = _closed_before().isoformat()
+    rows = await db.query_raw(
+        """
+        SELECT "day" FROM (
+            SELECT "bucket"::date AS "day" FROM "log_rollups"
+            WHERE "granularity" = 'day' AND "bucket" < $1::date
+            GROUP BY 1 HAVING SUM("count") > 0
+            UNION
+            SELECT "day" FROM "log_compactions" WHERE "day" < $1::date
+        ) d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM "log_compactions" c
+            LEFT JOIN "log_day_versions" v ON v."day" = c."day"
+            WHERE c."day" = d."day" AND c."version" = COALESCE(v."version", 0)
+        )
+        ORDER BY "day"
+        """,
+        closed_before,
+    )
+
+    database_url = os.environ["DATABASE_URL"]
+    for row in rows:
+        day = _parse_day(row["day"])
+        version, count, size = await asyncio.to_thread(_compact_day, database_url, day)
+        await db.execute_raw(
+            """
+            INSERT INTO "log_compactions" ("day", "version", "rows", "bytes", "compacted_at")
+            VALUES ($1::date, $2, $3, $4, now())
+            ON CONFLICT ("day") DO UPDATE SET
+                "version" = EXCLUDED."version", "rows" = EXCLUDED."rows",
+                "bytes" = EXCLUDED."bytes", "compacted_at" = EXCLUDED."compacted_at"
+            """,
+            day.isoformat(),
+            version,
+            count,
+            size,
+        )
+        if progress is not None:
+            progress(day, count)
+
+    current = await db.query_raw('SELECT "day", "version" FROM "log_compactions"')
+    await asyncio.to_thread(
+        _remove_superseded,
+        {_parse_day(row["day"]): int(row["version"]) for row in current},
+    )
+    return len(rows)
+
+
+async def run_log_compaction(db: Prisma) -> None:
+    """Background loop compacting the closed days periodically"""
+    while True:
+        try:
+            compacted = await compact_logs_svc(db)
+            if compacted:
+                logger.info("Compacted %d day(s) of logs for analytics", compacted)
+        except Exception:
+            logger.exception("Log compaction failed")
+        await asyncio.sleep(ANALYTICS_COMPACTION_INTERVAL.total_seconds())
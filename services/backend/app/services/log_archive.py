@@ -0,0 +1,804 @@
+import asyncio
+import base64
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any, AsyncIterator, Iterator, Optional
+
+import orjson
+import psycopg2
+import zstandard
+from app.database import libpq_url
+from app.utils.cursor import keyset_columns
+from app.utils.log_filters import (
+    SEVERITY_ORDER,
+    CompiledLogFilter,
+    compile_log_filter,
+    log_block_conditions,
+)
+from app.utils.metadata import metadata_matches
+from app.utils.sql import SqlParams, driver_value, severity_name_sql
+from app.utils.time_buckets import exclusive_end, floor_bucket, to_utc, to_utc_naive
+from prisma import Prisma
+
+# Most rows per block, a block never spans more than one source and hour
+LOG_ARCHIVE_BLOCK_ROWS = int(os.getenv("LOG_ARCHIVE_BLOCK_ROWS", "5000"))
+# Size of the zstd dictionary trained for each archived partition
+LOG_ARCHIVE_DICTIONARY_BYTES = int(os.getenv("LOG_ARCHIVE_DICTIONARY_BYTES", "112640"))
+# Most archived rows an exact count decodes, larger counts are estimated
+LOG_ARCHIVE_EXACT_COUNT_ROWS = int(os.getenv("LOG_ARCHIVE_EXACT_COUNT_ROWS", "200000"))
+
+_BLOCK_SPAN = timedelta(hours=1)
+_ZSTD_LEVEL = 12
+_DICTIONARY_SAMPLES = 20_000
+_FETCH_SIZE = 50_000
+# Blocks fetched per query, and decoded rows kept in memory between queries
+_BLOCK_BATCH = 16
+_CACHE_ROWS = 200_000
+
+_SEVERITY_RANK = {severity.value: rank for rank, severity in enumerate(SEVERITY_ORDER)}
+
+_ROW_COLUMNS = (
+    f'"id"::text, "timestamp", {severity_name_sql()}, "source_id", "message", '
+    '"metadata", "pattern_id"'
+)
+
+Range = tuple[Optional[datetime], Optional[datetime]]
+
+
+def _encode_row(row: tuple) -> bytes:
+    id, timestamp, severity, _, message, metadata, pattern_id = row
+    # The source is the block's, every row of a block shares it
+    return orjson.dumps([id, timestamp, severity, message, metadata, pattern_id])
+
+
+def _decode_block(
+    data: bytes,
+    dictionary: Optional[zstandard.ZstdCompressionDict],
+    source_id: int,
+    source: Optional[str] = None,
+) -> list[dict[str, Any]]:
+    """Rows of a block, shaped like the rows of a `logs_query`"""
+    decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return [
+        {
+            "id": id,
+            "severity": severity,
+            "message": message,
+            "source_id": source_id,
+            "source": source,
+            "timestamp": datetime.fromisoformat(timestamp).replace(tzinfo=UTC),
+            "metadata": metadata,
+            "pattern_id": pattern_id,
+        }
+        for id, timestamp, severity, message, metadata, pattern_id in orjson.loads(
+            decompressor.decompress(data)
+        )
+    ]
+
+
+def _connect(database_url: str):
+    dsn, schema = libpq_url(database_url)
+    return psycopg2.connect(dsn, options=f"-c search_path={schema}" if schema else None)
+
+
+def _store_dictionary(
+    cursor: Any, samples: list[bytes]
+) -> tuple[Optional[int], Optional[zstandard.ZstdCompressionDict]]:
+    try:
+        dictionary = zstandard.train_dictionary(LOG_ARCHIVE_DICTIONARY_BYTES, samples)
+    except zstandard.ZstdError:
+        # Too few samples to learn from, the blocks are compressed without
+        return None, None
+    cursor.execute(
+        'INSERT INTO "log_archive_dictionaries" ("data") VALUES (%s) RETURNING "id"',
+        (psycopg2.Binary(dictionary.as_bytes()),),
+    )
+    return cursor.fetchone()[0], dictionary
+
+
+def _block_values(
+    compressor: zstandard.ZstdCompressor,
+    dictionary_id: Optional[int],
+    block: list[tuple],
+) -> tuple:
+    """Column values of a block row, in the order of `_BLOCK_INSERT`"""
+    data = b"[" + b",".join(_encode_row(row) for row in block) + b"]"
+    ids = [row[0] for row in block]
+    severities = sorted({row[2] for row in block}, key=_SEVERITY_RANK.__getitem__)
+    return (
+        dictionary_id,
+        block[0][3],
+        block[0][1],
+        block[-1][1],
+        min(ids),
+        max(ids),
+        severities,
+        len(block),
+        len(data),
+        compressor.compress(data),
+    )
+
+
+_BLOCK_INSERT = """
+    INSERT INTO "log_archive_blocks" ("dictionary_id", "source_id", "start_time",
+        "end_time", "min_id", "max_id", "severities", "rows", "raw_bytes", "data")
+"""
+
+
+def _write_block(
+    cursor: Any,
+    compressor: zstandard.ZstdCompressor,
+    dictionary_id: Optional[int],
+    block: list[tuple],
+) -> None:
+    *values, data = _block_values(compressor, dictionary_id, block)
+    cursor.execute(
+        _BLOCK_INSERT
+        + 'VALUES (%s, %s, %s, %s, %s, %s, %s::"LogSeverity"[], %s, %s, %s)',
+        (*values, psycopg2.Binary(data)),
+    )
+
+
+def archive_partition(database_url: str, name: str) -> int:
+    """
+    Move the rows of a log partition into archive blocks, in one
+    transaction, and return how many were moved.
+
+    Writers to the partition wait until the move commits, readers find the
+    rows in the partition before and in the blocks after it. The partition
+    is truncated rather than dropped, so late rows still have a place and
+    are archived by the next run.
+    """
+
+    connection = _connect(database_url)
+    try:
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE "{name}" IN EXCLUSIVE MODE')
+                cursor.execute(
+                    f'SELECT {_ROW_COLUMNS} FROM "{name}" ORDER BY random() LIMIT %s',
+                    (_DICTIONARY_SAMPLES,),
+                )
+                samples = [_encode_row(row) for row in cursor]
+                if not samples:
+                    return 0
+                dictionary_id, dictionary = _store_dictionary(cursor, samples)
+
+            compressor = zstandard.ZstdCompressor(
+                level=_ZSTD_LEVEL, dict_data=dictionary
+            )
+            moved = 0
+            with (
+                connection.cursor(name="log_archive") as rows,
+                connection.cursor() as cursor,
+            ):
+                rows.itersize = _FETCH_SIZE
+                rows.execute(
+                    f'SELECT {_ROW_COLUMNS} FROM "{name}" '
+                    'ORDER BY "source_id", "timestamp", "id"'
+                )
+                block: list[tuple] = []
+                for row in rows:
+                    if block and (
+                        row[3] != block[0][3]
+                        or floor_bucket(row[1], "hour")
+                        != floor_bucket(block[0][1], "hour")
+                        or len(block) >= LOG_ARCHIVE_BLOCK_ROWS
+                    ):
+                        _write_block(cursor, compressor, dictionary_id, block)
+                        moved += len(block)
+                        block = []
+                    block.append(row)
+                if block:
+                    _write_block(cursor, compressor, dictionary_id, block)
+                    moved += len(block)
+
+            with connection.cursor() as cursor:
+                cursor.execute(f'TRUNCATE "{name}"')
+        return moved
+    finally:
+        connection.close()
+
+
+def iter_archived_rows(
+    connection: Any, start: datetime, end: datetime
+) -> Iterator[dict[str, Any]]:
+    """Rows of the blocks starting in [start, end), on a psycopg2 connection"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT "id", "data" FROM "log_archive_dictionaries" WHERE "id" IN (
+                SELECT "dictionary_id" FROM "log_archive_blocks"
+                WHERE "start_time" >= %s AND "start_time" < %s
+            )
+            """,
+            (start, end),
+        )
+        dictionaries = {
+            id: zstandard.ZstdCompressionDict(bytes(data)) for id, data in cursor
+        }
+
+    with connection.cursor(name="log_archive_rows") as cursor:
+        cursor.itersize = _BLOCK_BATCH
+        cursor.execute(
+            """
+            SELECT "source_id", "dictionary_id", "data" FROM "log_archive_blocks"
+            WHERE "start_time" >= %s AND "start_time" < %s
+            """,
+            (start, end),
+        )
+        for source_id, dictionary_id, data in cursor:
+            yield from _decode_block(
+                bytes(data), dictionaries.get(dictionary_id), source_id
+            )
+
+
+class ArchivedLogError(ValueError):
+    """The log was moved into the archive, which is read-only"""
+
+
+@dataclass(frozen=True)
+class ArchiveBlock:
+    id: int
+    source_id: int
+    source: str
+    start_time: datetime
+    end_time: datetime
+    severities: tuple[str, ...]
+    rows: int
+    dictionary_id: Optional[int]
+
+
+def _timestamp(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return to_utc(value)
+
+
+def _row_matches(compiled: CompiledLogFilter, row: dict[str, Any]) -> bool:
+    # Sources are matched by the block summary, a block holds a single one
+    if compiled.severities is not None and row["severity"] not in compiled.severities:
+        return False
+    if compiled.q and compiled.q.lower() not in row["message"].lower():
+        return False
+    return all(
+        metadata_matches(row["metadata"], key, value)
+        for key, value in compiled.meta.items()
+    )
+
+
+def _in_ranges(timestamp: datetime, ranges: list[Range]) -> bool:
+    return any(
+        (start is None or start <= timestamp) and (end is None or timestamp < end)
+        for start, end in ranges
+    )
+
+
+def _sort_key(columns: list[str], values: list[Any]) -> tuple:
+    return tuple(
+        _SEVERITY_RANK[value] if column == "severity" else value
+        for column, value in zip(columns, values)
+    )
+
+
+def _row_key(columns: list[str], row: dict[str, Any]) -> tuple:
+    return _sort_key(columns, [row[column] for column in columns])
+
+
+def sort_log_rows(
+    rows: list[dict[str, Any]], sort_by: str, sort_order: str
+) -> list[dict[str, Any]]:
+    """Order rows like the keyset index of the sort does"""
+    columns = keyset_columns(sort_by)
+    return sorted(
+        rows,
+        key=lambda row: _row_key(columns, row),
+        reverse=sort_order == "desc",
+    )
+
+
+def _distance(block: ArchiveBlock, moment: datetime) -> timedelta:
+    """How far `moment` lies outside the time span of the block"""
+    if moment < block.start_time:
+        return block.start_time - moment
+    return max(moment - block.end_time, timedelta(0))
+
+
+def _leading_range(column: str, block: ArchiveBlock) -> tuple[Any, Any]:
+    """Lowest and highest sort key a row of the block has on `column`"""
+    if column == "timestamp":
+        return block.start_time, block.end_time
+    if column == "source":
+        return block.source, block.source
+    # Summary severities are listed in level order
+    return _SEVERITY_RANK[block.severities[0]], _SEVERITY_RANK[block.severities[-1]]
+
+
+def _leading_condition(
+    column: str, value: Any, at_most: bool, params: SqlParams
+) -> str:
+    """Blocks that can hold rows whose `column` is at most or at least `value`"""
+    if column == "timestamp":
+        value = to_utc_naive(value)
+        if at_most:
+            return f'"start_time" <= {params.add(value, "timestamp")}'
+        # Blocks span less than an hour, which bounds the index scan
+        return (
+            f'"start_time" > {params.add(value - _BLOCK_SPAN, "timestamp")} AND '
+            f'"end_time" >= {params.add(value, "timestamp")}'
+        )
+    if column == "source":
+        return (
+            '"source_id" IN (SELECT "id" FROM "log_sources" '
+            f'WHERE "name" COLLATE "C" {"<=" if at_most else ">="} {params.add(value)})'
+        )
+    rank = _SEVERITY_RANK[value]
+    severities = [
+        severity.value
+        for index, severity in enumerate(SEVERITY_ORDER)
+        if (index <= rank if at_most else index >= rank)
+    ]
+    placeholder = params.add(severities, '"LogSeverity"[]')
+    return f'"severities" && {placeholder}'
+
+
+_BLOCK_COLUMNS = """
+    "id", "source_id", (
+        SELECT s."name" FROM "log_sources" s
+        WHERE s."id" = "log_archive_blocks"."source_id"
+    ) AS "source", "start_time", "end_time",
+    "severities"::text[] AS "severities", "rows", "dictionary_id"
+"""
+
+
+def _block(row: dict[str, Any]) -> ArchiveBlock:
+    return ArchiveBlock(
+        id=int(row["id"]),
+        source_id=row["source_id"],
+        source=row["source"],
+        start_time=_timestamp(row["start_time"]),
+        end_time=_timestamp(row["end_time"]),
+        severities=tuple(row["severities"]),
+        rows=row["rows"],
+        dictionary_id=row["dictionary_id"],
+    )
+
+
+def _range_condition(start: Any, end: Any, params: SqlParams) -> str:
+    """Blocks overlapping the half-open range [start, end)"""
+    conditions = []
+    if end is not None:
+        conditions.append(
+            f'"start_time" < {params.add(to_utc_naive(end), "timestamp")}'
+        )
+    if start is not None:
+        conditions.append(_leading_condition("timestamp", start, False, params))
+    return "(" + (" AND ".join(conditions) or "TRUE") + ")"
+
+
+class LogArchive:
+    """
+    Read side of the archived logs, stored in `log_archive_blocks`.
+
+    A block's summary (time range, severities, source) is checked in SQL,
+    so only blocks that can hold matching rows are fetched and decoded.
+    Blocks never change once written, decoded ones are kept in a small
+    cache shared by the requests of this process.
+    """
+
+    def __init__(self) -> None:
+        self._dictionaries: dict[int, zstandard.ZstdCompressionDict] = {}
+        self._cache: OrderedDict[int, list[dict[str, Any]]] = OrderedDict()
+        self._cached_rows = 0
+
+    async def _blocks(
+        self,
+        db: Prisma,
+        parameter: Any,
+        ranges: list[Range],
+        bounds: list[tuple[str, Any, bool]] = (),
+    ) -> list[ArchiveBlock]:
+        """
+        Blocks whose summary can match the filters within `ranges`, and
+        the (column, value, at_most) bounds on the leading sort column
+        """
+
+        if not ranges:
+            return []
+        params = SqlParams()
+        conditions = log_block_conditions(parameter, params)
+        branches = [_range_condition(start, end, params) for start, end in ranges]
+        conditions.append("(" + " OR ".join(branches) + ")")
+        for column, value, at_most in bounds:
+            conditions.append(_leading_condition(column, value, at_most, params))
+
+        rows = await db.query_raw(
+            f"""
+            SELECT {_BLOCK_COLUMNS} FROM "log_archive_blocks"
+            WHERE {" AND ".join(conditions)}
+            ORDER BY "start_time"
+            """,
+            *[driver_value(value) for value in params.values],
+        )
+        return [_block(row) for row in rows]
+
+    async def _dictionary(
+        self, db: Prisma, ids: set[int]
+    ) -> dict[int, zstandard.ZstdCompressionDict]:
+        missing = [id for id in ids if id not in self._dictionaries]
+        if missing:
+            rows = await db.query_raw(
+                """
+                SELECT "id", encode("data", 'base64') AS "data"
+                FROM "log_archive_dictionaries" WHERE "id" = ANY($1::int[])
+                """,
+                missing,
+            )
+            for row in rows:
+                self._dictionaries[row["id"]] = zstandard.ZstdCompressionDict(
+                    base64.b64decode(row["data"])
+                )
+        return {id: self._dictionaries[id] for id in ids}
+
+    async def _load(
+        self, db: Prisma, blocks: list[ArchiveBlock]
+    ) -> dict[int, list[dict[str, Any]]]:
+        """Decoded rows of the given blocks"""
+        loaded = {}
+        for block in blocks:
+            if block.id in self._cache:
+                self._cache.move_to_end(block.id)
+                loaded[block.id] = self._cache[block.id]
+        missing = [block for block in blocks if block.id not in loaded]
+        if not missing:
+            return loaded
+
+        # Raw query results can't carry bytea as is
+        rows = await db.query_raw(
+            """
+            SELECT "id", encode("data", 'base64') AS "data"
+            FROM "log_archive_blocks" WHERE "id" = ANY($1::bigint[])
+            """,
+            [block.id for block in missing],
+        )
+        data = {int(row["id"]): row["data"] for row in rows}
+        dictionaries = await self._dictionary(
+            db, {block.dictionary_id for block in missing} - {None}
+        )
+
+        def decode() -> dict[int, list[dict[str, Any]]]:
+            return {
+                block.id: _decode_block(
+                    base64.b64decode(data[block.id]),
+                    dictionaries.get(block.dictionary_id),
+                    block.source_id,
+                    block.source,
+                )
+                for block in missing
+                # Dropped with its partition since the summary was read
+                if block.id in data
+            }
+
+        for id, decoded in (await asyncio.to_thread(decode)).items():
+            loaded[id] = decoded
+            self._cache[id] = decoded
+            self._cached_rows += len(decoded)
+        while self._cached_rows > _CACHE_ROWS and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_rows -= len(evicted)
+        return loaded
+
+    def _ranges(self, parameter: Any) -> list[Range]:
+        """The requested time range, `end_date` is inclusive"""
+        start = to_utc(parameter.start_date) if parameter.start_date else None
+        return [(start, exclusive_end(parameter.end_date))]
+
+    async def rows(
+        self, db: Prisma, parameter: Any, ranges: Optional[list[Range]] = None
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Archived rows matching the filters within the half-open `ranges`,
+        or the requested time range, a batch of blocks at a time.
+        """
+
+        if ranges is None:
+            ranges = self._ranges(parameter)
+        ranges = [
+            (
+                to_utc(start) if start is not None else None,
+                to_utc(end) if end is not None else None,
+            )
+            for start, end in ranges
+        ]
+        compiled = compile_log_filter(parameter)
+        blocks = await self._blocks(db, parameter, ranges)
+        for offset in range(0, len(blocks), _BLOCK_BATCH):
+            batch = blocks[offset : offset + _BLOCK_BATCH]
+            loaded = await self._load(db, batch)
+            yield [
+                row
+                for block in batch
+                for row in loaded.get(block.id, [])
+                if _row_matches(compiled, row) and _in_ranges(row["timestamp"], ranges)
+            ]
+
+    async def count(self, db: Prisma, parameter: Any) -> tuple[int, bool]:
+        """
+        Number of archived logs matching the filters, and whether it is
+        exact. Blocks that match as a whole are counted from their summary
+        without being decoded. When the other blocks hold more than
+        `LOG_ARCHIVE_EXACT_COUNT_ROWS` rows, an even sample of them is
+        decoded and the count extrapolated from its share of matches.
+        """
+
+        compiled = compile_log_filter(parameter)
+        [(start, end)] = ranges = self._ranges(parameter)
+        blocks = await self._blocks(db, parameter, ranges)
+
+        total = 0
+        partial = []
+        for block in blocks:
+            if (
+                not compiled.needs_raw_rows
+                and (start is None or start <= block.start_time)
+                and (end is None or block.end_time < end)
+                and (
+                    compiled.severities is None
+                    or set(block.severities) <= set(compiled.severities)
+                )
+            ):
+                total += block.rows
+            else:
+                partial.append(block)
+
+        partial_rows = sum(block.rows for block in partial)
+        sample = partial
+        if partial_rows > LOG_ARCHIVE_EXACT_COUNT_ROWS:
+            step = -(-partial_rows // LOG_ARCHIVE_EXACT_COUNT_ROWS)
+            sample = partial[::step]
+
+        matched = decoded = 0
+        for offset in range(0, len(sample), _BLOCK_BATCH):
+            batch = sample[offset : offset + _BLOCK_BATCH]
+            loaded = await self._load(db, batch)
+            for block in batch:
+                rows = loaded.get(block.id, [])
+                decoded += len(rows)
+                matched += sum(
+                    1
+                    for row in rows
+                    if _row_matches(compiled, row)
+                    and _in_ranges(row["timestamp"], ranges)
+                )
+
+        if sample is partial:
+            return total + matched, True
+        return total + round(matched * partial_rows / max(decoded, 1)), False
+
+    async def _page_blocks(
+        self,
+        db: Prisma,
+        parameter: Any,
+        position: Optional[list[Any]],
+        until: Optional[list[Any]],
+    ) -> list[ArchiveBlock]:
+        column = keyset_columns(parameter.sort_by)[0]
+        descending = parameter.sort_order == "desc"
+        # Rows after the position and before `until` are bounded on the
+        # leading sort column, so are the blocks that can hold them
+        bounds = []
+        if position:
+            bounds.append((column, position[0], descending))
+        if until:
+            bounds.append((column, until[0], not descending))
+        return await self._blocks(db, parameter, self._ranges(parameter), bounds)
+
+    async def overlaps(
+        self,
+        db: Prisma,
+        parameter: Any,
+        position: Optional[list[Any]],
+        until: Optional[list[Any]] = None,
+    ) -> bool:
+        """Whether archived rows may belong to the page, see `page`"""
+        return bool(await self._page_blocks(db, parameter, position, until))
+
+    async def page(
+        self,
+        db: Prisma,
+        parameter: Any,
+        position: Optional[list[Any]],
+        limit: int,
+        until: Optional[list[Any]] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        The first `limit` archived rows after the keyset `position` in the
+        requested order, only those sorting before `until` when given.
+
+        Blocks are read in the order of their range on the leading sort
+        column (time span, source or severities), and reading stops once
+        no further block can make it into the page.
+        """
+
+        blocks = await self._page_blocks(db, parameter, position, until)
+        if not blocks:
+            return []
+
+        compiled = compile_log_filter(parameter)
+        ranges = self._ranges(parameter)
+        columns = keyset_columns(parameter.sort_by)
+        descending = parameter.sort_order == "desc"
+        low = _sort_key(columns, position) if position else None
+        high = _sort_key(columns, until) if until else None
+        if descending:
+            low, high = high, low
+            blocks.sort(key=lambda block: _leading_range(columns[0], block)[1])
+            blocks.reverse()
+        else:
+            blocks.sort(key=lambda block: _leading_range(columns[0], block)[0])
+
+        def in_page(key: tuple) -> bool:
+            return (low is None or key > low) and (high is None or key < high)
+
+        rows: list[dict[str, Any]] = []
+        index = 0
+        while index < len(blocks):
+            if len(rows) >= limit:
+                last = _row_key(columns, rows[limit - 1])[0]
+                first, final = _leading_range(columns[0], blocks[index])
+                if (descending and final < last) or (not descending and first > last):
+                    break
+
+            batch = blocks[index : index + _BLOCK_BATCH]
+            index += len(batch)
+            loaded = await self._load(db, batch)
+            rows.extend(
+                row
+                for block in batch
+                for row in loaded.get(block.id, [])
+                if _row_matches(compiled, row)
+                and _in_ranges(row["timestamp"], ranges)
+                and in_page(_row_key(columns, row))
+            )
+            rows = sort_log_rows(rows, parameter.sort_by, parameter.sort_order)
+            del rows[limit:]
+        return rows
+
+    async def purge_blocks(self, db: Prisma, parameter: Any) -> list[ArchiveBlock]:
+        """Blocks that may hold rows a purge with these filters removes"""
+        return await self._blocks(db, parameter, self._ranges(parameter))
+
+    async def purge(
+        self, db: Prisma, parameter: Any, blocks: list[ArchiveBlock]
+    ) -> list[dict[str, Any]]:
+        """
+        Remove the rows matching the filters from `blocks`, inside the
+        caller's transaction, and return the removed rows.
+
+        A block left empty is deleted, any other is replaced by a new block
+        of the remaining rows. Block ids are never reused for other rows,
+        so the decoded blocks cached by readers stay valid.
+        """
+
+        locked = await db.query_raw(
+            """
+            SELECT "id", encode("data", 'base64') AS "data"
+            FROM "log_archive_blocks" WHERE "id" = ANY($1::bigint[])
+            FOR UPDATE
+            """,
+            [block.id for block in blocks],
+        )
+        data = {int(row["id"]): row["data"] for row in locked}
+        # Dropped with their partition or replaced by an earlier purge
+        blocks = [block for block in blocks if block.id in data]
+        if not blocks:
+            return []
+
+        compiled = compile_log_filter(parameter)
+        ranges = self._ranges(parameter)
+        dictionaries = await self._dictionary(
+            db, {block.dictionary_id for block in blocks} - {None}
+        )
+
+        def split() -> list[tuple[ArchiveBlock, list[dict], Optional[tuple]]]:
+            changed = []
+            for block in blocks:
+                dictionary = dictionaries.get(block.dictionary_id)
+                rows = _decode_block(
+                    base64.b64decode(data[block.id]), dictionary, block.source_id
+                )
+                removed = [
+                    row
+                    for row in rows
+                    if _row_matches(compiled, row)
+                    and _in_ranges(row["timestamp"], ranges)
+                ]
+                if not removed:
+                    continue
+                ids = {row["id"] for row in removed}
+                kept = [
+                    (
+                        row["id"],
+                        to_utc_naive(row["timestamp"]),
+                        row["severity"],
+                        row["source_id"],
+                        row["message"],
+                        row["metadata"],
+                        row["pattern_id"],
+                    )
+                    for row in rows
+                    if row["id"] not in ids
+                ]
+                compressor = zstandard.ZstdCompressor(
+                    level=_ZSTD_LEVEL, dict_data=dictionary
+                )
+                values = (
+                    _block_values(compressor, block.dictionary_id, kept)
+                    if kept
+                    else None
+                )
+                changed.append((block, removed, values))
+            return changed
+
+        purged = []
+        for block, removed, values in await asyncio.to_thread(split):
+            await db.execute_raw(
+                'DELETE FROM "log_archive_blocks" WHERE "id" = $1', block.id
+            )
+            if values:
+                dictionary_id, source_id, start, end, *summary, compressed = values
+                await db.execute_raw(
+                    _BLOCK_INSERT + """
+                    VALUES ($1, $2, $3::timestamp, $4::timestamp, $5::uuid,
+                        $6::uuid, $7::"LogSeverity"[], $8, $9, decode($10, 'base64'))
+                    """,
+                    dictionary_id,
+                    source_id,
+                    start.isoformat(),
+                    end.isoformat(),
+                    *summary,
+                    base64.b64encode(compressed).decode(),
+                )
+            purged.extend(removed)
+        return purged
+
+    async def find(self, db: Prisma, log_id: str) -> Optional[dict[str, Any]]:
+        """
+        An archived log by id, looked up through the id ranges of the blocks.
+        Blocks whose time span is closest to the time in a uuid7 id are
+        decoded first, as ids are generated when the log is written.
+        """
+
+        try:
+            parsed = uuid.UUID(log_id)
+        except ValueError:
+            return None
+        log_id = str(parsed)
+
+        rows = await db.query_raw(
+            f"""
+            SELECT {_BLOCK_COLUMNS} FROM "log_archive_blocks"
+            WHERE uuidrange("min_id", "max_id", '[]') @> $1::uuid
+            ORDER BY "start_time" DESC
+            """,
+            log_id,
+        )
+        blocks = [_block(row) for row in rows]
+        if parsed.version == 7:
+            moment = datetime.fromtimestamp((parsed.int >> 80) / 1000, UTC)
+            blocks.sort(key=lambda block: _distance(block, moment))
+
+        for offset in range(0, len(blocks), _BLOCK_BATCH):
+            batch = blocks[offset : offset + _BLOCK_BATCH]
+            loaded = await self._load(db, batch)
+            for block in batch:
+                for row in loaded.get(block.id, []):
+                    if row["id"] == log_id:
+                        return row
+        return None
+
+
+log_archive = LogArchive()
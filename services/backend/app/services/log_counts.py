@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from app.utils.log_filters import compile_log_filter, log_filter_conditions
+from app.utils.sql import SqlParams, driver_value, range_condition
+from app.utils.time_buckets import (
+    TimeRangePlan,
+    ceil_bucket,
+    exclusive_end,
+    floor_bucket,
+    plan_time_range,
+)
+from prisma import Prisma
+
+
+def rounded_rollup_plan(
+    start: Optional[datetime], end: Optional[datetime]
+) -> TimeRangePlan:
+    """
+    Rollup-only plan for the range widened to whole minutes.
+
+    The partial minutes at the edges are counted in full instead of being
+    read from the raw logs, so the result is an estimate that is off by at
+    most two minutes worth of rows.
+    """
+
+    start = floor_bucket(start, "minute") if start is not None else None
+    end = ceil_bucket(end, "minute") if end is not None else None
+    return plan_time_range(start, end)
+
+
+async def _rollup_count(parameter: Any, db: Prisma) -> int:
+    plan = rounded_rollup_plan(parameter.start_date, exclusive_end(parameter.end_date))
+    if not plan.rollup:
+        return 0
+
+    params = SqlParams()
+    conditions = log_filter_conditions(
+        parameter, params, include_time_range=False, rollups=True
+    )
+    ranges = [
+        f'("granularity" = {params.add(granularity)} AND '
+        f'{range_condition("bucket", start, end, params)})'
+        for granularity, start, end in plan.rollup
+    ]
+    conditions.append("(" + " OR ".join(ranges) + ")")
+
+    row = await db.query_first(
+        f"""
+        SELECT COALESCE(SUM("count"), 0)::bigint AS "count"
+        FROM "log_rollups"
+        WHERE {" AND ".join(conditions)}
+        """,
+        *[driver_value(value) for value in params.values],
+    )
+    return int(row["count"]) if row else 0
+
+
+async def _planner_count(parameter: Any, db: Prisma) -> int:
+    params = SqlParams()
+    conditions = log_filter_conditions(parameter, params) or ["TRUE"]
+    row = await db.query_first(
+        f"""
+        EXPLAIN (FORMAT JSON)
+        SELECT 1 FROM "logs" WHERE {" AND ".join(conditions)}
+        """,
+        *[driver_value(value) for value in params.values],
+    )
+
+    plan = row["QUERY PLAN"] if row else None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    if not plan:
+        return 0
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def estimate_log_count(parameter: Any, db: Prisma) -> int:
+    """
+    Estimated number of logs matching the list filters.
+
+    Severity, source and time filters are answered from the rollups. A
+    message search or metadata filter can't be, so it falls back to the
+    planner's row estimate, which costs no scan but can be far off for
+    rare terms.
+    """
+
+    if compile_log_filter(parameter).needs_raw_rows:
+        return await _planner_count(parameter, db)
+    return await _rollup_count(parameter, db)
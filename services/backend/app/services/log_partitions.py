@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import UTC, datetime, timedelta
+from typing import NamedTuple, Optional
+
+import psycopg2
+from app.database import libpq_url
+from app.services.log_archive import archive_partition
+from app.services.response_cache import response_cache
+from app.utils.time_buckets import floor_bucket, to_utc_naive
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+# "day" or "week", applies to partitions created from now on
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "day")
+# How far ahead of the current time partitions are created
+LOG_PARTITION_PREMAKE_DAYS = int(os.getenv("LOG_PARTITION_PREMAKE_DAYS", "7"))
+# Partitions that end more than this many days ago are dropped, 0 keeps all
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0"))
+# Partitions that end more than this many days ago are moved into compressed
+# archive blocks, 0 keeps every row in the logs table
+LOG_ARCHIVE_AFTER_DAYS = int(os.getenv("LOG_ARCHIVE_AFTER_DAYS", "0"))
+LOG_PARTITION_MAINTENANCE = os.getenv("LOG_PARTITION_MAINTENANCE", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+LOG_PARTITION_MAINTENANCE_INTERVAL = timedelta(hours=1)
+
+DDL_TX_TIMEOUT = timedelta(minutes=5)
+
+# Serializes partition DDL between workers and the CLI
+_ADVISORY_LOCK_KEY = 7_311_204_915
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class LogPartition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+class PartitionMaintenanceResult(NamedTuple):
+    created: list[str]
+    dropped: list[str]
+    archived: list[str]
+
+
+def _partition_step() -> timedelta:
+    if LOG_PARTITION_INTERVAL == "week":
+        return timedelta(weeks=1)
+    return timedelta(days=1)
+
+
+def _partition_name(start: datetime) -> str:
+    return f"logs_p{start:%Y%m%d}"
+
+
+async def list_log_partitions(db: Prisma) -> list[LogPartition]:
+    """Range partitions of the logs table ordered by start, without default"""
+    rows = await db.query_raw("""
+        SELECT c.relname AS "name", pg_get_expr(c.relpartbound, c.oid) AS "bound"
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = '"logs"'::regclass
+        """)
+
+    partitions = []
+    for row in rows:
+        match = _BOUND_PATTERN.search(row["bound"])
+        if not match:
+            continue
+        partitions.append(
+            LogPartition(
+                name=row["name"],
+                start=datetime.fromisoformat(match.group(1)),
+                end=datetime.fromisoformat(match.group(2)),
+            )
+        )
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+async def _acquire_lock(transaction: Prisma) -> bool:
+    row = await transaction.query_first(
+        f'SELECT pg_try_advisory_xact_lock({_ADVISORY_LOCK_KEY}) AS "locked"'
+    )
+    return bool(row and row["locked"])
+
+
+async def _create_partition(transaction: Prisma, start: datetime, end: datetime) -> str:
+    """
+    Create and attach a partition for [start, end).
+
+    Rows of that range already sitting in the default partition are moved
+    into the new table first, otherwise attaching it would fail.
+    """
+
+    name = _partition_name(start)
+    # DDL can't take bind parameters, the bounds are formatted datetimes
+    low = f"'{start.isoformat(sep=' ')}'"
+    high = f"'{end.isoformat(sep=' ')}'"
+
+    await transaction.execute_raw(
+        f'CREATE TABLE "{name}" (LIKE "logs" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    await transaction.execute_raw(f"""
+        WITH moved AS (
+            DELETE FROM "logs_default"
+            WHERE "timestamp" >= {low} AND "timestamp" < {high}
+            RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+        """)
+    await transaction.execute_raw(
+        f'ALTER TABLE "logs" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ({low}) TO ({high})"
+    )
+    return name
+
+
+async def ensure_log_partitions_svc(
+    db: Prisma, now: Optional[datetime] = None, since: Optional[datetime] = None
+) -> list[str]:
+    """
+    Service to create the partitions needed for the coming days
+
+    New partitions continue from the end of the latest one so a change of
+    LOG_PARTITION_INTERVAL never leaves gaps or overlaps. Partitions are
+    also created back to `since`, e.g. before a backfill, and to the oldest
+    row of the default partition, so rows that arrived before the first
+    partition move out of it and are reached by retention and archiving.
+    """
+
+    now = (now or datetime.now(UTC)).replace(tzinfo=None)
+    horizon = now + timedelta(days=LOG_PARTITION_PREMAKE_DAYS)
+    step = _partition_step()
+
+    created = []
+    async with db.tx(timeout=DDL_TX_TIMEOUT) as transaction:
+        if not await _acquire_lock(transaction):
+            return created
+
+        partitions = await list_log_partitions(transaction)
+        first = partitions[0].start if partitions else floor_bucket(now, "day")
+        oldest = await transaction.query_first(
+            'SELECT min("timestamp") AS "timestamp" FROM "logs_default"'
+        )
+        if oldest and oldest["timestamp"] is not None:
+            oldest = to_utc_naive(datetime.fromisoformat(oldest["timestamp"]))
+            if oldest < first and (since is None or oldest < to_utc_naive(since)):
+                since = oldest
+        if since is not None:
+            start = floor_bucket(to_utc_naive(since), "day")
+            while start < first:
+                end = min(start + step, first)
+                created.append(await _create_partition(transaction, start, end))
+                start = end
+
+        start = partitions[-1].end if partitions else first
+        while start <= horizon:
+            created.append(await _create_partition(transaction, start, start + step))
+            start += step
+
+    return created
+
+
+def _detach_partitions(database_url: str, names: list[str]) -> list[str]:
+    """
+    Detach the given partitions from `logs` and drop them, returns the
+    dropped ones.
+
+    DETACH PARTITION CONCURRENTLY only takes a SHARE UPDATE EXCLUSIVE lock
+    on `logs`, so reads and writes go on, but it can't run in a transaction
+    block. The connection runs in autocommit mode and holds the advisory
+    lock for its session. A detach that was interrupted is finalized.
+    """
+
+    dsn, schema = libpq_url(database_url)
+    connection = psycopg2.connect(
+        dsn, options=f"-c search_path={schema}" if schema else None
+    )
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (_ADVISORY_LOCK_KEY,))
+            if not cursor.fetchone()[0]:
+                return []
+
+            dropped = []
+            for name in names:
+                cursor.execute(
+                    """
+                    SELECT i.inhdetachpending FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = '"logs"'::regclass AND c.relname = %s
+                    """,
+                    (name,),
+                )
+                row = cursor.fetchone()
+                if row is not None:
+                    mode = "FINALIZE" if row[0] else "CONCURRENTLY"
+                    cursor.execute(
+                        f'ALTER TABLE "logs" DETACH PARTITION "{name}" {mode}'
+                    )
+                # Only the detached table is locked now
+                cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+                dropped.append(name)
+            return dropped
+    finally:
+        # Also releases the session's advisory lock
+        connection.close()
+
+
+async def drop_expired_log_partitions_svc(
+    db: Prisma, retention_days: int, now: Optional[datetime] = None
+) -> list[str]:
+    """
+    Service to drop the partitions that fall entirely out of retention
+
+    Whole partitions are dropped instead of deleting rows. The rollup
+    buckets, analytics compactions and archive blocks of the expired range
+    are removed first, in one transaction, then each partition is detached
+    concurrently and dropped, see `_detach_partitions`. A run that fails
+    in between leaves the partition attached and the next run repeats it.
+    """
+
+    if retention_days <= 0:
+        return []
+
+    now = (now or datetime.now(UTC)).replace(tzinfo=None)
+    cutoff = now - timedelta(days=retention_days)
+
+    expired = []
+    async with db.tx(timeout=DDL_TX_TIMEOUT) as transaction:
+        if not await _acquire_lock(transaction):
+            return []
+
+        for partition in await list_log_partitions(transaction):
+            if partition.end > cutoff:
+                break
+            expired.append(partition)
+
+            for table in ("log_rollups", "log_pattern_rollups"):
+                await transaction.execute_raw(
+                    f"""
+                    DELETE FROM "{table}"
+                    WHERE "bucket" >= $1::timestamp AND "bucket" < $2::timestamp
+                    """,
+                    partition.start.isoformat(),
+                    partition.end.isoformat(),
+                )
+            await transaction.execute_raw(
+                """
+                DELETE FROM "log_compactions"
+                WHERE "day" >= $1::timestamp AND "day" < $2::timestamp
+                """,
+                partition.start.isoformat(),
+                partition.end.isoformat(),
+            )
+            await transaction.execute_raw(
+                """
+                DELETE FROM "log_archive_blocks"
+                WHERE "start_time" >= $1::timestamp AND "start_time" < $2::timestamp
+                """,
+                partition.start.isoformat(),
+                partition.end.isoformat(),
+            )
+
+        if expired:
+            await transaction.execute_raw("""
+                DELETE FROM "log_archive_dictionaries" d
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM "log_archive_blocks" b WHERE b."dictionary_id" = d."id"
+                )
+                """)
+
+    if not expired:
+        return []
+    dropped = await asyncio.to_thread(
+        _detach_partitions,
+        os.environ["DATABASE_URL"],
+        [partition.name for partition in expired],
+    )
+    await response_cache.invalidate(expired[0].start, cutoff)
+    return dropped
+
+
+async def archive_log_partitions_svc(
+    db: Prisma, archive_after_days: int, now: Optional[datetime] = None
+) -> list[str]:
+    """
+    Service to move the rows of the partitions that ended more than
+    `archive_after_days` ago into compressed archive blocks
+
+    Each partition is archived in its own transaction, see
+    `archive_partition`. Returns the partitions that had rows to move.
+    """
+
+    if archive_after_days <= 0:
+        return []
+
+    now = (now or datetime.now(UTC)).replace(tzinfo=None)
+    cutoff = now - timedelta(days=archive_after_days)
+    database_url = os.environ["DATABASE_URL"]
+
+    archived = []
+    for partition in await list_log_partitions(db):
+        if partition.end > cutoff:
+            break
+        if await asyncio.to_thread(archive_partition, database_url, partition.name):
+            archived.append(partition.name)
+    return archived
+
+
+async def maintain_log_partitions_svc(db: Prisma) -> PartitionMaintenanceResult:
+    """
+    Service to create upcoming partitions, apply the retention policy and
+    archive the old partitions
+    """
+
+    created = await ensure_log_partitions_svc(db)
+    dropped = await drop_expired_log_partitions_svc(db, LOG_RETENTION_DAYS)
+    archived = await archive_log_partitions_svc(db, LOG_ARCHIVE_AFTER_DAYS)
+    return PartitionMaintenanceResult(
+        created=created, dropped=dropped, archived=archived
+    )
+
+
+async def run_partition_maintenance(db: Prisma) -> None:
+    """Background loop running the partition maintenance periodically"""
+    while True:
+        try:
+            result = await maintain_log_partitions_svc(db)
+            if result.created or result.dropped or result.archived:
+                logger.info(
+                    "Log partitions created: %s, dropped: %s, archived: %s",
+                    result.created,
+                    result.dropped,
+                    result.archived,
+                )
+        except Exception:
+            logger.exception("Log partition maintenance failed")
+        await asyncio.sleep(LOG_PARTITION_MAINTENANCE_INTERVAL.total_seconds())
@@ -0,0 +1,106 @@
+import os
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from app.utils.patterns import message_pattern
+from prisma import Prisma
+
+PATTERN_BACKFILL_BATCH_SIZE = int(os.getenv("PATTERN_BACKFILL_BATCH_SIZE", "10000"))
+
+
+class LogPatternRegistry:
+    """
+    Templates of the message patterns, stored in `log_patterns`.
+
+    Logs only store the pattern id, its template is written once the first
+    time this process sees it. Like the source dictionary this runs before
+    the write transaction, so a rolled back write can't leave a pattern in
+    the cache that was never stored.
+    """
+
+    def __init__(self) -> None:
+        self._known: set[int] = set()
+
+    async def register(self, db: Prisma, messages: Iterable[str]) -> None:
+        """Store the templates of the messages that are new to this process"""
+        templates = {}
+        for message in messages:
+            pattern_id, template = message_pattern(message)
+            if pattern_id not in self._known:
+                templates[pattern_id] = template
+        if not templates:
+            return
+
+        await db.execute_raw(
+            """
+            INSERT INTO "log_patterns" ("pattern_id", "template")
+            SELECT * FROM UNNEST($1::bigint[], $2::text[])
+            ON CONFLICT ("pattern_id") DO NOTHING
+            """,
+            list(templates),
+            list(templates.values()),
+        )
+        self._known.update(templates)
+
+
+log_patterns = LogPatternRegistry()
+
+
+async def backfill_log_patterns_svc(
+    db: Prisma,
+    batch_size: int = PATTERN_BACKFILL_BATCH_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    all_rows: bool = False,
+) -> tuple[int, Optional[datetime], Optional[datetime]]:
+    """
+    Service to fingerprint the logs stored without a pattern, or with
+    `all_rows` every log, e.g. after the masks changed
+
+    Rows are walked in (timestamp, id) order one batch per statement, so
+    writes keep going meanwhile. Returns the number of rows walked and
+    their time range, whose rollups need to be rebuilt afterwards.
+    """
+
+    updated = 0
+    first: Optional[datetime] = None
+    last: Optional[datetime] = None
+    position: Optional[tuple[str, str]] = None
+    while True:
+        conditions = ["TRUE" if all_rows else '"pattern_id" IS NULL']
+        if position:
+            conditions.append('("timestamp", "id") > ($2::timestamp, $3::uuid)')
+        rows = await db.query_raw(
+            f"""
+            SELECT "id", "timestamp", "message" FROM "logs"
+            WHERE {" AND ".join(conditions)}
+            ORDER BY "timestamp", "id"
+            LIMIT $1
+            """,
+            batch_size,
+            *(position or ()),
+        )
+        if not rows:
+            break
+
+        await log_patterns.register(db, (row["message"] for row in rows))
+        await db.execute_raw(
+            """
+            UPDATE "logs" l SET "pattern_id" = u."pattern_id"
+            FROM UNNEST($1::uuid[], $2::timestamp[], $3::bigint[])
+                AS u("id", "timestamp", "pattern_id")
+            WHERE l."id" = u."id" AND l."timestamp" = u."timestamp"
+                AND l."pattern_id" IS DISTINCT FROM u."pattern_id"
+            """,
+            [row["id"] for row in rows],
+            [row["timestamp"] for row in rows],
+            [message_pattern(row["message"])[0] for row in rows],
+        )
+
+        position = (rows[-1]["timestamp"], rows[-1]["id"])
+        first = first or datetime.fromisoformat(rows[0]["timestamp"])
+        last = datetime.fromisoformat(rows[-1]["timestamp"])
+        updated += len(rows)
+        if progress is not None:
+            progress(updated)
+
+    return updated, first, last
@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any, Callable, Optional
+
+from app.models.log_models import SEVERITY_NAMES
+from app.services.log_archive import (
+    LOG_ARCHIVE_BLOCK_ROWS,
+    ArchiveBlock,
+    log_archive,
+)
+from app.services.log_rollups import apply_rollup_changes
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented, observe_rows
+from app.services.response_cache import response_cache
+from app.utils.log_filters import LogFilterParameter, log_filter_conditions
+from app.utils.sql import SqlParams, driver_value
+from prisma import Json, Prisma
+from pydantic import BaseModel, Field
+from uuid_utils import uuid7
+
+logger = logging.getLogger(__name__)
+
+# Rows deleted per transaction, and the pause between two batches
+LOG_PURGE_BATCH_SIZE = int(os.getenv("LOG_PURGE_BATCH_SIZE", "10000"))
+LOG_PURGE_BATCH_DELAY_MS = int(os.getenv("LOG_PURGE_BATCH_DELAY_MS", "100"))
+# Run queued purges inside the API process
+LOG_PURGE_WORKER = os.getenv("LOG_PURGE_WORKER", "true").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+LOG_PURGE_POLL_SECONDS = 5
+# Per-severity retention in days like "DEBUG=7,INFO=30", purged in batches
+LOG_RETENTION_BY_SEVERITY = os.getenv("LOG_RETENTION_BY_SEVERITY", "")
+LOG_RETENTION_INTERVAL = timedelta(hours=1)
+
+PURGE_TX_TIMEOUT = timedelta(minutes=1)
+# Running jobs not updated for this long belong to a dead worker
+PURGE_JOB_STALE_AFTER = timedelta(minutes=5)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Wakes the worker when a purge is queued by this process
+_wakeup = asyncio.Event()
+
+
+class EmptyPurgeFilterError(ValueError):
+    pass
+
+
+class LogPurgeParameter(LogFilterParameter):
+    meta: dict[str, str] = Field(default_factory=dict)
+
+
+class LogPurgeJobModel(BaseModel):
+    id: str
+    status: str
+    reason: str
+    filter: dict[str, Any]
+    batch_size: int
+    cursor: Optional[datetime] = None
+    deleted: int
+    batches: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+def parse_severity_retention(value: str) -> dict[str, int]:
+    """Parse `DEBUG=7,INFO=30` into retention days per severity"""
+    retention = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        severity, _, days = item.partition("=")
+        retention[severity.strip().upper()] = int(days)
+    return retention
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _job_model(job: Any) -> LogPurgeJobModel:
+    return LogPurgeJobModel.model_validate(job.model_dump())
+
+
+@instrumented()
+async def create_log_purge_svc(
+    parameter: LogPurgeParameter,
+    db: Prisma,
+    batch_size: int = LOG_PURGE_BATCH_SIZE,
+    reason: str = "api",
+) -> LogPurgeJobModel:
+    """
+    Service to queue the deletion of every log matching a filter
+
+    At least one filter is required so a purge never empties the table by
+    accident, whole ranges are cheaper to drop as partitions anyway.
+    """
+
+    filters = parameter.model_dump(mode="json", exclude_defaults=True)
+    if not filters:
+        raise EmptyPurgeFilterError("A purge needs at least one filter")
+
+    job = await db.logpurgejob.create(
+        data={
+            "id": str(uuid7()),
+            "status": PENDING,
+            "reason": reason,
+            "filter": Json(filters),
+            "batch_size": batch_size,
+        }
+    )
+    _wakeup.set()
+    return _job_model(job)
+
+
+@instrumented()
+async def get_log_purge_svc(job_id: str, db: Prisma) -> Optional[LogPurgeJobModel]:
+    """
+    Service to get a purge job with its progress
+    """
+
+    job = await db.logpurgejob.find_unique(where={"id": job_id})
+    return _job_model(job) if job else None
+
+
+@instrumented()
+async def cancel_log_purge_svc(job_id: str, db: Prisma) -> Optional[LogPurgeJobModel]:
+    """
+    Service to cancel a queued or running purge
+
+    Batches already committed stay deleted, the running batch finishes.
+    """
+
+    await db.logpurgejob.update_many(
+        where={"id": job_id, "status": {"in": [PENDING, RUNNING]}},
+        data={"status": CANCELLED, "updated_at": _now(), "finished_at": _now()},
+    )
+    return await get_log_purge_svc(job_id, db)
+
+
+async def claim_log_purge_job(db: Prisma) -> Optional[str]:
+    """Take the oldest queued job, or a running one whose worker died"""
+    row = await db.query_first(
+        """
+        UPDATE "log_purge_jobs" SET "status" = $1, "updated_at" = $2::timestamp
+        WHERE "id" = (
+            SELECT "id" FROM "log_purge_jobs"
+            WHERE "status" = $3 OR ("status" = $1 AND "updated_at" < $4::timestamp)
+            ORDER BY "created_at"
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING "id"
+        """,
+        RUNNING,
+        _now().isoformat(),
+        PENDING,
+        (_now() - PURGE_JOB_STALE_AFTER).isoformat(),
+    )
+    return row["id"] if row else None
+
+
+async def _purge_batch(
+    db: Prisma, job_id: str, parameter: LogPurgeParameter, batch_size: int
+) -> Optional[int]:
+    """
+    Delete one batch and record it in the rollups and the job together.
+
+    Returns the deleted rows, or None once the job was cancelled. Batches
+    walk the filter in timestamp order from the job's cursor, so deleted
+    rows are not scanned again and a restarted job continues where the
+    last committed batch ended.
+    """
+
+    async with db.tx(timeout=PURGE_TX_TIMEOUT) as transaction:
+        job = await transaction.query_first(
+            'SELECT "status", "cursor" FROM "log_purge_jobs" '
+            'WHERE "id" = $1::uuid FOR UPDATE',
+            job_id,
+        )
+        if not job or job["status"] != RUNNING:
+            return None
+
+        params = SqlParams()
+        conditions = log_filter_conditions(parameter, params)
+        if job["cursor"]:
+            cursor = params.add(job["cursor"], "timestamp")
+            conditions.append(f'"timestamp" >= {cursor}')
+        limit = params.add(batch_size)
+
+        # Deleted rows are folded per minute, which is all the rollups need
+        rows = await transaction.query_raw(
+            f"""
+            WITH "batch" AS (
+                SELECT "id", "timestamp" FROM "logs"
+                WHERE {" AND ".join(conditions)}
+                ORDER BY "timestamp"
+                LIMIT {limit}
+            ), "purged" AS (
+                DELETE FROM "logs" l USING "batch" b
+                WHERE l."id" = b."id" AND l."timestamp" = b."timestamp"
+                RETURNING l."severity", l."source_id", l."pattern_id", l."timestamp"
+            )
+            SELECT "severity", "source_id", "pattern_id",
+                date_trunc('minute', "timestamp") AS "minute",
+                count(*) AS "count", max("timestamp") AS "last"
+            FROM "purged"
+            GROUP BY 1, 2, 3, 4
+            """,
+            *[driver_value(value) for value in params.values],
+        )
+
+        deleted = sum(int(row["count"]) for row in rows)
+        names = await log_sources.names(db, (row["source_id"] for row in rows))
+        await apply_rollup_changes(
+            transaction,
+            (
+                (
+                    SEVERITY_NAMES[row["severity"]],
+                    names[row["source_id"]],
+                    int(row["pattern_id"]) if row["pattern_id"] is not None else None,
+                    datetime.fromisoformat(row["minute"]),
+                    -int(row["count"]),
+                )
+                for row in rows
+            ),
+        )
+        last = max((row["last"] for row in rows), default=job["cursor"])
+        await transaction.execute_raw(
+            """
+            UPDATE "log_purge_jobs"
+            SET "deleted" = "deleted" + $2, "batches" = "batches" + 1,
+                "cursor" = $3::timestamp, "updated_at" = $4::timestamp
+            WHERE "id" = $1::uuid
+            """,
+            job_id,
+            deleted,
+            last,
+            _now().isoformat(),
+        )
+
+    observe_rows("purge_log_batch", deleted)
+    return deleted
+
+
+async def _purge_archive_batch(
+    db: Prisma, job_id: str, parameter: LogPurgeParameter, blocks: list[ArchiveBlock]
+) -> Optional[int]:
+    """
+    Remove the matching rows from a batch of archive blocks, see
+    `LogArchive.purge`, and record them in the rollups and the job together.
+    Returns the removed rows, or None once the job was cancelled.
+    """
+
+    async with db.tx(timeout=PURGE_TX_TIMEOUT) as transaction:
+        job = await transaction.query_first(
+            'SELECT "status" FROM "log_purge_jobs" WHERE "id" = $1::uuid FOR UPDATE',
+            job_id,
+        )
+        if not job or job["status"] != RUNNING:
+            return None
+
+        rows = await log_archive.purge(transaction, parameter, blocks)
+        names = await log_sources.names(db, (row["source_id"] for row in rows))
+        await apply_rollup_changes(
+            transaction,
+            (
+                (
+                    row["severity"],
+                    names[row["source_id"]],
+                    row["pattern_id"],
+                    row["timestamp"],
+                    -1,
+                )
+                for row in rows
+            ),
+        )
+        await transaction.execute_raw(
+            """
+            UPDATE "log_purge_jobs"
+            SET "deleted" = "deleted" + $2, "batches" = "batches" + 1,
+                "updated_at" = $3::timestamp
+            WHERE "id" = $1::uuid
+            """,
+            job_id,
+            len(rows),
+            _now().isoformat(),
+        )
+
+    observe_rows("purge_log_batch", len(rows))
+    return len(rows)
+
+
+async def _finish_job(
+    db: Prisma, job_id: str, status: str, error: Optional[str] = None
+) -> None:
+    await db.logpurgejob.update_many(
+        where={"id": job_id, "status": RUNNING},
+        data={
+            "status": status,
+            "error": error,
+            "updated_at": _now(),
+            "finished_at": _now(),
+        },
+    )
+
+
+async def run_log_purge_job(
+    job_id: str, db: Prisma, progress: Optional[Callable[[int], None]] = None
+) -> None:
+    """
+    Run a claimed purge job batch by batch until no matching row is left,
+    first in the `logs` table and then in the archive blocks.
+
+    The response cache is invalidated after every batch, and `progress`
+    is called with the total deleted so far.
+    """
+
+    job = await db.logpurgejob.find_unique(where={"id": job_id})
+    if not job:
+        return
+    parameter = LogPurgeParameter.model_validate(job.filter)
+    total = job.deleted
+
+    def purged(deleted: int) -> None:
+        nonlocal total
+        total += deleted
+        if progress is not None:
+            progress(total)
+
+    try:
+        while True:
+            deleted = await _purge_batch(db, job_id, parameter, job.batch_size)
+            if deleted is None:
+                return
+            if deleted:
+                await response_cache.invalidate(
+                    parameter.start_date, parameter.end_date
+                )
+                purged(deleted)
+            if deleted < job.batch_size:
+                break
+            await asyncio.sleep(LOG_PURGE_BATCH_DELAY_MS / 1000)
+
+        # Rows archived before the purge reached them, listed once so the
+        # blocks written in their place are not visited again
+        blocks = await log_archive.purge_blocks(db, parameter)
+        step = max(1, job.batch_size // LOG_ARCHIVE_BLOCK_ROWS)
+        for offset in range(0, len(blocks), step):
+            batch = blocks[offset : offset + step]
+            deleted = await _purge_archive_batch(db, job_id, parameter, batch)
+            if deleted is None:
+                return
+            if deleted:
+                await response_cache.invalidate(
+                    parameter.start_date, parameter.end_date
+                )
+                purged(deleted)
+                await asyncio.sleep(LOG_PURGE_BATCH_DELAY_MS / 1000)
+    except Exception as e:
+        logger.exception("Log purge %s failed", job_id)
+        await _finish_job(db, job_id, FAILED, str(e))
+        return
+
+    await _finish_job(db, job_id, DONE)
+    logger.info("Log purge %s finished, %s rows deleted", job_id, total)
+
+
+async def enqueue_retention_purges_svc(
+    db: Prisma, retention: dict[str, int], now: Optional[datetime] = None
+) -> list[LogPurgeJobModel]:
+    """
+    Service to queue a purge for every severity past its retention
+
+    Severities that still have a queued or running retention purge are
+    skipped, the next run picks up whatever that one left behind.
+    """
+
+    now = now or _now()
+    queued = []
+    for severity, days in retention.items():
+        if days <= 0:
+            continue
+        reason = f"retention:{severity}"
+        active = await db.logpurgejob.find_first(
+            where={"reason": reason, "status": {"in": [PENDING, RUNNING]}}
+        )
+        if active:
+            continue
+
+        parameter = LogPurgeParameter(
+            severity=[severity], end_date=now - timedelta(days=days)
+        )
+        queued.append(
+            await create_log_purge_svc(parameter, db, LOG_PURGE_BATCH_SIZE, reason)
+        )
+    return queued
+
+
+async def run_log_purge_worker(db: Prisma) -> None:
+    """Background loop running queued purges and the severity retention"""
+    retention = parse_severity_retention(LOG_RETENTION_BY_SEVERITY)
+    next_retention = 0.0
+
+    while True:
+        _wakeup.clear()
+        try:
+            if retention and time.monotonic() >= next_retention:
+                await enqueue_retention_purges_svc(db, retention)
+                next_retention = (
+                    time.monotonic() + LOG_RETENTION_INTERVAL.total_seconds()
+                )
+
+            job_id = await claim_log_purge_job(db)
+            if job_id:
+                await run_log_purge_job(job_id, db)
+                continue
+        except Exception:
+            logger.exception("Log purge worker failed")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), LOG_PURGE_POLL_SECONDS)
+        except TimeoutError:
+            pass
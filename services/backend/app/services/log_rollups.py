@@ -0,0 +1,226 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+
+from app.services.log_analytics import touch_log_days
+from app.services.response_cache import response_cache
+from app.utils.patterns import message_pattern
+from app.utils.sql import severity_name_sql
+from app.utils.time_buckets import GRANULARITIES, floor_bucket, to_utc, to_utc_naive
+from prisma import Prisma
+
+# Each rebuild transaction covers this much raw data
+REBUILD_CHUNK = timedelta(days=1)
+
+REBUILD_TX_TIMEOUT = timedelta(minutes=5)
+
+# (severity, source, pattern_id, timestamp, delta), logs that were never
+# fingerprinted have no pattern and are left out of the pattern rollups
+RollupChange = tuple[str, str, Optional[int], datetime, int]
+
+
+async def apply_rollup_changes(db: Prisma, changes: Iterable[RollupChange]) -> None:
+    """
+    Add the given per-log deltas to every rollup granularity.
+
+    Changes are folded per bucket first, so a batch of logs only costs one
+    multi-row upsert per rollup table however many rows it contains. The
+    compacted analytics copy of the days touched is invalidated as well.
+    """
+
+    totals: Counter = Counter()
+    pattern_totals: Counter = Counter()
+    timestamps = []
+    for severity, source, pattern_id, timestamp, delta in changes:
+        timestamp = to_utc_naive(timestamp)
+        timestamps.append(timestamp)
+        for granularity in GRANULARITIES:
+            bucket = floor_bucket(timestamp, granularity)
+            totals[(granularity, bucket, severity, source)] += delta
+            if pattern_id is not None:
+                pattern_totals[
+                    (granularity, bucket, severity, source, pattern_id)
+                ] += delta
+
+    rows = [(key, count) for key, count in totals.items() if count]
+    if rows:
+        await _upsert_rollups(db, rows)
+    pattern_rows = [(key, count) for key, count in pattern_totals.items() if count]
+    if pattern_rows:
+        await _upsert_pattern_rollups(db, pattern_rows)
+    await touch_log_days(db, timestamps)
+
+
+async def _upsert_rollups(db: Prisma, rows: list[tuple[tuple, int]]) -> None:
+    await db.execute_raw(
+        """
+        INSERT INTO "log_rollups" ("granularity", "bucket", "severity", "source", "count")
+        SELECT * FROM UNNEST($1::text[], $2::timestamp[], $3::text[], $4::text[], $5::bigint[])
+        ON CONFLICT ("granularity", "bucket", "severity", "source")
+        DO UPDATE SET "count" = "log_rollups"."count" + EXCLUDED."count"
+        """,
+        [key[0] for key, _ in rows],
+        [key[1].isoformat() for key, _ in rows],
+        [key[2] for key, _ in rows],
+        [key[3] for key, _ in rows],
+        [count for _, count in rows],
+    )
+
+
+async def _upsert_pattern_rollups(db: Prisma, rows: list[tuple[tuple, int]]) -> None:
+    await db.execute_raw(
+        """
+        INSERT INTO "log_pattern_rollups"
+            ("granularity", "bucket", "severity", "source", "pattern_id", "count")
+        SELECT * FROM UNNEST(
+            $1::text[], $2::timestamp[], $3::text[], $4::text[], $5::bigint[], $6::bigint[]
+        )
+        ON CONFLICT ("granularity", "bucket", "severity", "source", "pattern_id")
+        DO UPDATE SET "count" = "log_pattern_rollups"."count" + EXCLUDED."count"
+        """,
+        [key[0] for key, _ in rows],
+        [key[1].isoformat() for key, _ in rows],
+        [key[2] for key, _ in rows],
+        [key[3] for key, _ in rows],
+        [key[4] for key, _ in rows],
+        [count for _, count in rows],
+    )
+
+
+def log_rollup_change(log: Any, delta: int) -> RollupChange:
+    """
+    Rollup change of a log row or model. The pattern is taken from the
+    message unless the row carries the stored `pattern_id`.
+    """
+
+    row = log if isinstance(log, dict) else log.__dict__
+    if "pattern_id" in row:
+        pattern_id = row["pattern_id"]
+    else:
+        pattern_id, _ = message_pattern(row["message"])
+    return (row["severity"], row["source"], pattern_id, row["timestamp"], delta)
+
+
+async def record_created_logs(db: Prisma, logs: Iterable[object]) -> None:
+    """Count newly inserted logs in the rollups"""
+    await apply_rollup_changes(db, (log_rollup_change(log, 1) for log in logs))
+
+
+async def record_deleted_logs(db: Prisma, logs: Iterable[object]) -> None:
+    """Remove deleted logs from the rollups"""
+    await apply_rollup_changes(db, (log_rollup_change(log, -1) for log in logs))
+
+
+async def _rebuild_range(db: Prisma, start: datetime, end: datetime) -> None:
+    bounds = (start.isoformat(), end.isoformat())
+    severity = severity_name_sql('g."severity"')
+
+    for table in ("log_rollups", "log_pattern_rollups"):
+        await db.execute_raw(
+            f"""
+            DELETE FROM "{table}"
+            WHERE "bucket" >= $1::timestamp AND "bucket" < $2::timestamp
+            """,
+            *bounds,
+        )
+    for granularity in GRANULARITIES:
+        await db.execute_raw(
+            f"""
+            INSERT INTO "log_rollups" ("granularity", "bucket", "severity", "source", "count")
+            SELECT $3, g."bucket", {severity}, s."name", g."count"
+            FROM (
+                SELECT date_trunc($3, "timestamp") AS "bucket", "severity", "source_id",
+                    count(*) AS "count"
+                FROM "logs"
+                WHERE "timestamp" >= $1::timestamp AND "timestamp" < $2::timestamp
+                GROUP BY 1, 2, 3
+            ) g
+            JOIN "log_sources" s ON s."id" = g."source_id"
+            """,
+            *bounds,
+            granularity,
+        )
+        await db.execute_raw(
+            f"""
+            INSERT INTO "log_pattern_rollups"
+                ("granularity", "bucket", "severity", "source", "pattern_id", "count")
+            SELECT $3, g."bucket", {severity}, s."name", g."pattern_id", g."count"
+            FROM (
+                SELECT date_trunc($3, "timestamp") AS "bucket", "severity", "source_id",
+                    "pattern_id", count(*) AS "count"
+                FROM "logs"
+                WHERE "timestamp" >= $1::timestamp AND "timestamp" < $2::timestamp
+                    AND "pattern_id" IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+            ) g
+            JOIN "log_sources" s ON s."id" = g."source_id"
+            """,
+            *bounds,
+            granularity,
+        )
+
+
+async def rebuild_log_rollups_svc(
+    db: Prisma,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> int:
+    """
+    Service to recompute the rollups from the raw logs
+
+    The range is widened to whole days and rebuilt one day per transaction,
+    defaulting to the full extent of the logs table. Archived days are
+    skipped, their rows are gone from the logs table and can no longer
+    change. Returns the number of days rebuilt.
+    """
+
+    if start_date is None or end_date is None:
+        extent = await db.query_first(
+            'SELECT min("timestamp") AS "first", max("timestamp") AS "last" FROM "logs"'
+        )
+        if not extent or extent["first"] is None:
+            return 0
+        start_date = start_date or datetime.fromisoformat(extent["first"])
+        end_date = end_date or datetime.fromisoformat(extent["last"])
+
+    day = floor_bucket(to_utc_naive(start_date), "day")
+    last_day = floor_bucket(to_utc_naive(end_date), "day")
+
+    rebuilt = 0
+    while day <= last_day:
+        archived = await db.query_first(
+            """
+            SELECT 1 AS "found" FROM "log_archive_blocks"
+            WHERE "start_time" >= $1::timestamp AND "start_time" < $2::timestamp
+            LIMIT 1
+            """,
+            day.isoformat(),
+            (day + REBUILD_CHUNK).isoformat(),
+        )
+        if not archived:
+            async with db.tx(timeout=REBUILD_TX_TIMEOUT) as transaction:
+                await _rebuild_range(transaction, day, day + REBUILD_CHUNK)
+            rebuilt += 1
+        day += REBUILD_CHUNK
+
+    await response_cache.invalidate(start_date, end_date)
+
+    return rebuilt
+
+
+def rollup_bucket_filter(
+    ranges: Iterable[tuple[str, Optional[datetime], Optional[datetime]]],
+) -> list[dict]:
+    """Prisma OR branches selecting the given whole-bucket ranges"""
+    branches = []
+    for granularity, start, end in ranges:
+        bucket = {}
+        if start is not None:
+            bucket["gte"] = to_utc(start)
+        if end is not None:
+            bucket["lt"] = to_utc(end)
+        branch = {"granularity": granularity}
+        if bucket:
+            branch["bucket"] = bucket
+        branches.append(branch)
+    return branches
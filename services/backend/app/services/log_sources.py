@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Any, Iterable
+
+from app.models.log_models import LogModel, severity_code, severity_name
+from app.utils.patterns import message_pattern
+from app.utils.time_buckets import to_utc
+from prisma import Json, Prisma
+
+
+class LogSourceDictionary:
+    """
+    In-process cache of the `log_sources` dictionary.
+
+    Logs store the id of their source. Names are interned here before a
+    write and looked up again when rows are read, so the API keeps working
+    with names. Entries are never renamed or deleted, a miss only means
+    another process added the source since it was loaded.
+    """
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._names: dict[int, str] = {}
+
+    def _remember(self, rows: Iterable[dict[str, Any]]) -> None:
+        for row in rows:
+            self._ids[row["name"]] = row["id"]
+            self._names[row["id"]] = row["name"]
+
+    async def ids(self, db: Prisma, names: Iterable[str]) -> dict[str, int]:
+        """
+        Ids of the given names, adding the unknown ones to the dictionary.
+
+        Must not run inside the transaction of the write, a rollback would
+        leave ids in the cache that don't exist.
+        """
+
+        names = set(names)
+        # A name added concurrently by another process is invisible to the
+        # statement that conflicted with it, the second round reads it
+        for _ in range(2):
+            missing = sorted(name for name in names if name not in self._ids)
+            if not missing:
+                break
+            self._remember(
+                await db.query_raw(
+                    """
+                    WITH "added" AS (
+                        INSERT INTO "log_sources" ("name")
+                        SELECT unnest($1::text[])
+                        ON CONFLICT ("name") DO NOTHING
+                        RETURNING "id", "name"
+                    )
+                    SELECT "id", "name" FROM "added"
+                    UNION ALL
+                    SELECT "id", "name" FROM "log_sources" WHERE "name" = ANY($1::text[])
+                    """,
+                    missing,
+                )
+            )
+        return {name: self._ids[name] for name in names}
+
+    async def names(self, db: Prisma, ids: Iterable[int]) -> dict[int, str]:
+        """Names of the given ids"""
+        ids = set(ids)
+        missing = [id for id in ids if id not in self._names]
+        if missing:
+            self._remember(
+                await db.query_raw(
+                    'SELECT "id", "name" FROM "log_sources" WHERE "id" = ANY($1::int[])',
+                    missing,
+                )
+            )
+        return {id: self._names[id] for id in ids}
+
+    async def log_models(self, db: Prisma, logs: list[Any]) -> list[LogModel]:
+        """Rows or Prisma models of the logs table as API models"""
+        rows = [log if isinstance(log, dict) else log.__dict__ for log in logs]
+        names = await self.names(db, (row["source_id"] for row in rows))
+
+        models = []
+        for row in rows:
+            timestamp = row["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            models.append(
+                LogModel(
+                    id=str(row["id"]),
+                    severity=severity_name(row["severity"]),
+                    message=row["message"],
+                    source=names[row["source_id"]],
+                    timestamp=to_utc(timestamp),
+                    metadata=row.get("metadata"),
+                )
+            )
+        return models
+
+    async def prisma_log_rows(
+        self, db: Prisma, rows: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        Log rows to insert, with interned sources, message pattern ids and
+        Prisma's Json metadata
+        """
+        ids = await self.ids(db, (row["source"] for row in rows))
+        return [
+            {
+                "id": row["id"],
+                "severity": severity_code(row["severity"]),
+                "message": row["message"],
+                "source_id": ids[row["source"]],
+                "timestamp": row["timestamp"],
+                "metadata": Json(row.get("metadata") or {}),
+                "pattern_id": message_pattern(row["message"])[0],
+            }
+            for row in rows
+        ]
+
+
+log_sources = LogSourceDictionary()
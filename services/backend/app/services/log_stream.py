@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from app.database import libpq_url
+from app.utils.log_filters import LogFilterParameter, compile_log_filter, log_matches
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+
+class LogStreamBackend(str, Enum):
+    # Logs written by this process are pushed to its own subscribers
+    LOCAL = "local"
+    # Logs are fanned out through LISTEN/NOTIFY to every API process
+    POSTGRES = "postgres"
+
+
+LOG_STREAM_BACKEND = LogStreamBackend(
+    os.getenv("LOG_STREAM_BACKEND", LogStreamBackend.LOCAL.value)
+)
+# Logs kept per subscriber before the oldest ones are dropped
+LOG_STREAM_BUFFER_SIZE = int(os.getenv("LOG_STREAM_BUFFER_SIZE", "1000"))
+# Logs arriving within this window are sent as one frame
+LOG_STREAM_BATCH_MS = int(os.getenv("LOG_STREAM_BATCH_MS", "250"))
+LOG_STREAM_MAX_BATCH = int(os.getenv("LOG_STREAM_MAX_BATCH", "500"))
+LOG_STREAM_HEARTBEAT_SECONDS = 15
+
+NOTIFY_CHANNEL = "log_stream"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_PAYLOAD = 7500
+
+
+class StreamLogsParameter(LogFilterParameter):
+    """The list filters, without the time range as only new logs stream"""
+
+
+def _serialize_log(log: Any) -> dict[str, Any]:
+    if not isinstance(log, dict):
+        log = log.__dict__
+    timestamp = log["timestamp"]
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    return {
+        "id": str(log["id"]),
+        "severity": str(getattr(log["severity"], "value", log["severity"])),
+        "message": log["message"],
+        "source": log["source"],
+        "timestamp": timestamp,
+        "metadata": log.get("metadata") or {},
+    }
+
+
+def _notify_log(log: dict[str, Any]) -> Optional[str]:
+    """
+    A log as JSON that fits in one NOTIFY. Larger logs lose their metadata
+    and as much of the message as needed, and are flagged `truncated` so
+    clients can read the whole log by id. None if even that doesn't fit.
+    """
+
+    encoded = json.dumps(log)
+    if len(encoded) + 2 <= NOTIFY_MAX_PAYLOAD:
+        return encoded
+
+    message = log["message"]
+    while True:
+        encoded = json.dumps(
+            {**log, "message": message, "metadata": {}, "truncated": True}
+        )
+        if len(encoded) + 2 <= NOTIFY_MAX_PAYLOAD:
+            return encoded
+        if not message:
+            return None
+        message = message[: len(message) // 2]
+
+
+def _notify_payloads(logs: list[dict[str, Any]]) -> list[str]:
+    """Split the logs into JSON arrays that each fit in one NOTIFY"""
+    payloads = []
+    chunk: list[str] = []
+    size = 2
+    for log in logs:
+        encoded = _notify_log(log)
+        if encoded is None:
+            logger.warning("Log %s is too large to stream, skipped", log["id"])
+            continue
+        if chunk and size + len(encoded) + 1 > NOTIFY_MAX_PAYLOAD:
+            payloads.append("[" + ",".join(chunk) + "]")
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        payloads.append("[" + ",".join(chunk) + "]")
+    return payloads
+
+
+class Subscription:
+    """
+    A single stream consumer.
+
+    Logs are buffered up to `buffer_size`; a consumer that falls further
+    behind loses the oldest logs and is told how many were dropped in its
+    next frame.
+    """
+
+    def __init__(self, parameter: StreamLogsParameter, buffer_size: int) -> None:
+        self.parameter = parameter
+        self.filter = compile_log_filter(parameter)
+        self.buffer: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def matches(self, log: dict[str, Any]) -> bool:
+        return log_matches(self.filter, log)
+
+    def push(self, logs: list[dict[str, Any]]) -> None:
+        for log in logs:
+            if not self.matches(log):
+                continue
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(log)
+        if self.buffer:
+            self.ready.set()
+
+    def drain(self, limit: int) -> tuple[list[dict[str, Any]], int]:
+        logs = [self.buffer.popleft() for _ in range(min(limit, len(self.buffer)))]
+        dropped, self.dropped = self.dropped, 0
+        if not self.buffer:
+            self.ready.clear()
+        return logs, dropped
+
+
+class LogStreamHub:
+    """
+    Fan-out of newly written logs to live tail subscribers.
+
+    In `local` mode the write paths deliver straight to the subscribers of
+    their own process. In `postgres` mode they publish with NOTIFY instead
+    and a listener thread delivers what any process wrote.
+    """
+
+    def __init__(self, backend: LogStreamBackend, buffer_size: int) -> None:
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.subscriptions: set[Subscription] = set()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def subscribe(self, parameter: StreamLogsParameter) -> Subscription:
+        subscription = Subscription(parameter, self.buffer_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+
+    def deliver(self, logs: list[dict[str, Any]]) -> None:
+        for subscription in self.subscriptions:
+            subscription.push(logs)
+
+    async def publish(self, db: Prisma, logs: Iterable[Any]) -> None:
+        """
+        Hand committed logs to the stream, called by the write paths
+
+        The logs are already stored, so a failure is logged instead of
+        failing the write and inviting a retry that duplicates them.
+        """
+
+        logs = list(logs)
+        try:
+            if self.backend == LogStreamBackend.LOCAL:
+                if self.subscriptions:
+                    self.deliver([_serialize_log(log) for log in logs])
+                return
+
+            payloads = _notify_payloads([_serialize_log(log) for log in logs])
+            if payloads:
+                await db.execute_raw(
+                    "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload",
+                    NOTIFY_CHANNEL,
+                    payloads,
+                )
+        except Exception:
+            logger.exception("Failed to publish %d logs to the stream", len(logs))
+
+    def start(self) -> None:
+        """Start listening for notifications in `postgres` mode"""
+        if self.backend != LogStreamBackend.POSTGRES or self._listener:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        self._listener = threading.Thread(
+            target=self._listen, name="log-stream-listener", daemon=True
+        )
+        self._listener.start()
+
+    async def stop(self) -> None:
+        if not self._listener:
+            return
+        self._stopping.set()
+        await asyncio.to_thread(self._listener.join)
+        self._listener = None
+
+    def _listen(self) -> None:
+        import psycopg2
+        import psycopg2.extensions
+
+        dsn, _ = libpq_url(os.environ["DATABASE_URL"])
+
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.set_isolation_level(
+                    psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        self._loop.call_soon_threadsafe(
+                            self.deliver, json.loads(notify.payload)
+                        )
+            except Exception:
+                logger.exception("Log stream listener failed, reconnecting")
+                self._stopping.wait(5)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+log_stream_hub = LogStreamHub(LOG_STREAM_BACKEND, LOG_STREAM_BUFFER_SIZE)
+
+
+async def stream_logs_svc(parameter: StreamLogsParameter) -> AsyncIterator[bytes]:
+    """
+    Service to stream newly written logs as server-sent events
+
+    Logs are sent in `logs` events holding a batch of entries and the
+    number of entries dropped because the client fell behind. Comment
+    lines keep idle connections open.
+    """
+
+    subscription = log_stream_hub.subscribe(parameter)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(
+                    subscription.ready.wait(), LOG_STREAM_HEARTBEAT_SECONDS
+                )
+            except TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+
+            # Give a burst a moment to accumulate into a single frame
+            if len(subscription.buffer) < LOG_STREAM_MAX_BATCH:
+                await asyncio.sleep(LOG_STREAM_BATCH_MS / 1000)
+
+            while subscription.buffer:
+                logs, dropped = subscription.drain(LOG_STREAM_MAX_BATCH)
+                frame = json.dumps({"logs": logs, "dropped": dropped})
+                yield f"event: logs\ndata: {frame}\n\n".encode()
+    finally:
+        log_stream_hub.unsubscribe(subscription)
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import time
+from enum import Enum
+from typing import Any, Optional
+
+from app.services.log_patterns import log_patterns
+from app.services.log_rollups import record_created_logs
+from app.services.log_sources import log_sources
+from app.services.log_stream import log_stream_hub
+from app.services.response_cache import response_cache
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+
+class WriteDurability(str, Enum):
+    # Acknowledge once the row is committed by a flush
+    FLUSH = "flush"
+    # Acknowledge as soon as the row is queued
+    ENQUEUE = "enqueue"
+
+
+LOG_WRITE_BUFFER_ENABLED = os.getenv("LOG_WRITE_BUFFER", "false").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+LOG_WRITE_BUFFER_MAX_BATCH = int(os.getenv("LOG_WRITE_BUFFER_MAX_BATCH", "1000"))
+LOG_WRITE_BUFFER_MAX_DELAY_MS = int(os.getenv("LOG_WRITE_BUFFER_MAX_DELAY_MS", "50"))
+LOG_WRITE_BUFFER_MAX_QUEUE = int(os.getenv("LOG_WRITE_BUFFER_MAX_QUEUE", "100000"))
+LOG_WRITE_BUFFER_DURABILITY = WriteDurability(
+    os.getenv("LOG_WRITE_BUFFER_DURABILITY", WriteDurability.FLUSH.value)
+)
+# Attempts after a failed flush in enqueue mode before the rows are dropped
+LOG_WRITE_BUFFER_FLUSH_RETRIES = int(os.getenv("LOG_WRITE_BUFFER_FLUSH_RETRIES", "3"))
+LOG_WRITE_BUFFER_RETRY_DELAY = 0.5
+
+
+class LogWriteBuffer:
+    """
+    Write-behind buffer for single log inserts.
+
+    Rows are queued and a background task coalesces them into multi-row
+    inserts, flushing when `max_batch` rows are waiting or `max_delay`
+    seconds after the first row of a batch arrived.
+
+    In enqueue mode nobody is waiting for the outcome, so a failed flush is
+    retried `flush_retries` times with a growing delay. Rows that still
+    can't be written are dropped and counted in `lost_rows`, as are rows
+    still queued when the process dies.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_batch: int,
+        max_delay: float,
+        max_queue: int,
+        durability: WriteDurability,
+        flush_retries: int = 0,
+    ) -> None:
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.durability = durability
+        self.flush_retries = flush_retries
+
+        self._db: Optional[Prisma] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.retried_flushes = 0
+        self.lost_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, db: Prisma) -> None:
+        """Start the background flusher"""
+        if self.running:
+            return
+        self._db = db
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Flush everything that is queued and stop the flusher. Rows whose
+        submit was already waiting for queue space are written as well,
+        later submits are refused.
+        """
+
+        if not self.running:
+            return
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+        # Waiting submits put their rows behind the sentinel
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                await self._flush(batch)
+
+    async def submit(self, row: dict[str, Any]) -> None:
+        """
+        Queue a row for insertion.
+
+        Waits for queue space when the buffer is full, and in `flush`
+        durability mode until the batch holding the row is committed.
+        """
+
+        if not self.running or self._stopping:
+            raise RuntimeError("Log write buffer is not running")
+
+        future = None
+        if self.durability == WriteDurability.FLUSH:
+            future = asyncio.get_running_loop().create_future()
+
+        await self._queue.put((row, future))
+        if future is not None:
+            await future
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth and flush latency metrics"""
+        return {
+            "enabled": self.enabled,
+            "durability": self.durability.value,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "retried_flushes": self.retried_flushes,
+            "lost_rows": self.lost_rows,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+            "avg_flush_ms": round(
+                self.total_flush_seconds * 1000 / self.flushes if self.flushes else 0,
+                3,
+            ),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _write(self, rows: list[dict[str, Any]]) -> None:
+        await log_patterns.register(self._db, (row["message"] for row in rows))
+        data = await log_sources.prisma_log_rows(self._db, rows)
+        async with self._db.tx() as transaction:
+            await transaction.log.create_many(data=data)
+            await record_created_logs(transaction, rows)
+
+    async def _flush(self, batch: list[tuple[dict[str, Any], Any]]) -> None:
+        rows = [row for row, _ in batch]
+        started = time.perf_counter()
+        # Callers waiting in flush mode get the error and can retry themselves
+        enqueued = all(future is None for _, future in batch)
+        retries = self.flush_retries if enqueued else 0
+
+        for attempt in range(retries + 1):
+            try:
+                await self._write(rows)
+                break
+            except Exception as e:
+                logger.exception("Failed to flush %d buffered logs", len(rows))
+                if attempt < retries:
+                    self.retried_flushes += 1
+                    await asyncio.sleep(LOG_WRITE_BUFFER_RETRY_DELAY * 2**attempt)
+                    continue
+                self.failed_rows += len(rows)
+                if enqueued:
+                    self.lost_rows += len(rows)
+                    logger.error("Dropped %d acknowledged logs", len(rows))
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                return
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+        self.last_flush_seconds = elapsed
+        self.total_flush_seconds += elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+        # The rows are committed, a failure here must not fail the writers
+        # or stop the flusher
+        try:
+            timestamps = [row["timestamp"] for row in rows]
+            await response_cache.invalidate(min(timestamps), max(timestamps))
+        except Exception:
+            logger.exception("Failed to invalidate the cache for %d logs", len(rows))
+        await log_stream_hub.publish(self._db, rows)
+
+
+log_write_buffer = LogWriteBuffer(
+    enabled=LOG_WRITE_BUFFER_ENABLED,
+    max_batch=LOG_WRITE_BUFFER_MAX_BATCH,
+    max_delay=LOG_WRITE_BUFFER_MAX_DELAY_MS / 1000,
+    max_queue=LOG_WRITE_BUFFER_MAX_QUEUE,
+    durability=LOG_WRITE_BUFFER_DURABILITY,
+    flush_retries=LOG_WRITE_BUFFER_FLUSH_RETRIES,
+)
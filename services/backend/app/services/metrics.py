@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional
+
+from app.database import database_stats
+from prisma import Prisma
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pydantic import BaseModel
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Log services slower than this with their filter and query plan, 0 disables
+SLOW_QUERY_LOG_MS = float(os.getenv("SLOW_QUERY_LOG_MS", "0"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in {"1", "true", "yes"}
+# Set when the API runs with several worker processes, see prometheus_client
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_DURATION = Histogram(
+    "logdash_http_request_duration_seconds",
+    "Time until the response is complete, per route template",
+    ["method", "route", "status"],
+)
+SERVICE_DURATION = Histogram(
+    "logdash_service_duration_seconds",
+    "Time spent in a service function, mostly waiting on the database",
+    ["function"],
+)
+SERVICE_ROWS = Histogram(
+    "logdash_service_rows",
+    "Rows returned by a service function",
+    ["function"],
+    buckets=(0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+SERVICE_ERRORS = Counter(
+    "logdash_service_errors_total",
+    "Service calls that raised",
+    ["function"],
+)
+SLOW_QUERIES = Counter(
+    "logdash_slow_queries_total",
+    "Service calls slower than SLOW_QUERY_LOG_MS",
+    ["function"],
+)
+POOL_CONNECTIONS = Gauge(
+    "logdash_db_pool_connections",
+    "Connections of the database pools by state",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+POOL_WAIT_AVG_MS = Gauge(
+    "logdash_db_pool_wait_avg_ms",
+    "Average time queries waited for a Prisma connection",
+    ["pool"],
+    multiprocess_mode="liveall",
+)
+
+# Server-Timing durations of the current request, in seconds
+_request_timings: ContextVar[Optional[dict[str, float]]] = ContextVar(
+    "request_timings", default=None
+)
+
+# Plan lookups running after a slow call, kept so they aren't collected
+_explain_tasks: set[asyncio.Task] = set()
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """Add to a Server-Timing metric of the current request"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def server_timing_header(timings: dict[str, float], total: float) -> str:
+    metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+def normalized_filter(parameter: Any) -> str:
+    """The parameters of a call without unset filters, for the slow-query log"""
+    if isinstance(parameter, BaseModel):
+        return parameter.model_dump_json(exclude_none=True)
+    if isinstance(parameter, list):
+        return f"[{len(parameter)} items]"
+    return json.dumps(parameter, default=str)
+
+
+async def _log_slow_query(
+    function: str,
+    milliseconds: float,
+    parameter: Any,
+    explain: Optional[Callable[[Any], tuple[str, list[Any]]]],
+    db: Optional[Prisma],
+) -> None:
+    plan = None
+    if explain is not None and db is not None:
+        try:
+            # Plain EXPLAIN, ANALYZE would run the slow query a second time
+            query, values = explain(parameter)
+            row = await db.query_first(f"EXPLAIN (FORMAT JSON) {query}", *values)
+            plan = row["QUERY PLAN"] if row else None
+            if not isinstance(plan, str):
+                plan = json.dumps(plan)
+        except Exception:
+            logger.exception("Failed to explain the slow query of %s", function)
+
+    logger.warning(
+        "Slow query in %s took %.1f ms, filter %s, plan %s",
+        function,
+        milliseconds,
+        normalized_filter(parameter),
+        plan,
+    )
+
+
+def instrumented(
+    rows: Optional[Callable[[Any], int]] = None,
+    explain: Optional[Callable[[Any], tuple[str, list[Any]]]] = None,
+):
+    """
+    Record the latency, errors and returned rows of a service function.
+
+    The time is reported as the `db` Server-Timing metric of the request,
+    less what the service itself spent serializing. With SLOW_QUERY_LOG_MS
+    set, calls over the threshold are logged with their filter and, when
+    `explain` builds the equivalent SQL from the parameter, its plan.
+    """
+
+    def decorator(service: Callable) -> Callable:
+        function = service.__name__
+
+        @wraps(service)
+        async def wrapper(parameter: Any, *args: Any, **kwargs: Any) -> Any:
+            timings = _request_timings.get()
+            serialized = timings.get("serialize", 0.0) if timings else 0.0
+            started = time.perf_counter()
+            try:
+                result = await service(parameter, *args, **kwargs)
+            except Exception:
+                SERVICE_ERRORS.labels(function).inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                SERVICE_DURATION.labels(function).observe(elapsed)
+                if timings is not None:
+                    serialized = timings.get("serialize", 0.0) - serialized
+                    record_timing("db", elapsed - serialized)
+
+            if rows is not None and result is not None:
+                SERVICE_ROWS.labels(function).observe(rows(result))
+
+            if SLOW_QUERY_LOG_MS and elapsed * 1000 >= SLOW_QUERY_LOG_MS:
+                SLOW_QUERIES.labels(function).inc()
+                db = next((arg for arg in args if isinstance(arg, Prisma)), None)
+                task = asyncio.create_task(
+                    _log_slow_query(function, elapsed * 1000, parameter, explain, db)
+                )
+                _explain_tasks.add(task)
+                task.add_done_callback(_explain_tasks.discard)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def observe_rows(function: str, count: int) -> None:
+    """Record returned rows for services whose result can't be counted"""
+    SERVICE_ROWS.labels(function).observe(count)
+
+
+def _route_template(scope: Scope) -> str:
+    # Templates like /api/v1/logs/{log_id} keep the label cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """Time every HTTP request and add the Server-Timing header"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    # Streamed bodies are timed up to their first chunk only
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        server_timing_header(timings, time.perf_counter() - started),
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            REQUEST_DURATION.labels(
+                scope["method"], _route_template(scope), str(status)
+            ).observe(time.perf_counter() - started)
+
+
+async def metrics_exposition() -> tuple[bytes, str]:
+    """Prometheus text exposition of the metrics and the current pool stats"""
+    try:
+        stats = await database_stats()
+    except Exception:
+        logger.exception("Failed to read database pool metrics")
+        stats = {}
+
+    for pool, pool_stats in stats.items():
+        for state in ("open", "busy", "idle", "size", "max"):
+            if state in pool_stats:
+                POOL_CONNECTIONS.labels(pool, state).set(pool_stats[state])
+        if "wait_ms" in pool_stats:
+            POOL_WAIT_AVG_MS.labels(pool).set(pool_stats["wait_ms"]["avg"])
+
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
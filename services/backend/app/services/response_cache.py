@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from app.services.metrics import timed
+from app.utils.time_buckets import to_utc
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Only needed for a shared cache
+    redis = None
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "true").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "5"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+# redis:// URL of a cache shared by all API processes, in-process when unset
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+_KEY_PREFIX = "logdashboard:response-cache"
+# Invalidations and reads spanning more days use the table wide versions
+_MAX_SCOPED_DAYS = 31
+# Bumped by every invalidation, read by requests without a bounded range
+_ALL_SCOPE = "all"
+# Bumped by invalidations without a bounded range, read by every request
+_GLOBAL_SCOPE = "global"
+
+
+def _serialize(result: BaseModel | bytes) -> bytes:
+    if isinstance(result, bytes):
+        return result
+    with timed("serialize"):
+        return result.model_dump_json().encode()
+
+
+def compute_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class MemoryCacheBackend:
+    """In-process LRU with a per-entry TTL"""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, body = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    async def set(self, key: str, body: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def versions(self, scopes: list[str]) -> list[int]:
+        return [self._versions.get(scope, 0) for scope in scopes]
+
+    async def bump_versions(self, scopes: list[str]) -> None:
+        # Older entries become unreachable and age out of the LRU
+        for scope in scopes:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache shared between API processes, writes of any process invalidate"""
+
+    def __init__(self, url: str) -> None:
+        if redis is None:
+            raise RuntimeError(
+                "RESPONSE_CACHE_URL requires the redis package, "
+                "install the backend with the 'cache' extra"
+            )
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(f"{_KEY_PREFIX}:{key}")
+
+    async def set(self, key: str, body: bytes, ttl: float) -> None:
+        await self._client.set(f"{_KEY_PREFIX}:{key}", body, px=int(ttl * 1000))
+
+    async def versions(self, scopes: list[str]) -> list[int]:
+        keys = [f"{_KEY_PREFIX}:version:{scope}" for scope in scopes]
+        return [int(value or 0) for value in await self._client.mget(keys)]
+
+    async def bump_versions(self, scopes: list[str]) -> None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for scope in scopes:
+                key = f"{_KEY_PREFIX}:version:{scope}"
+                pipeline.incr(key)
+                if scope.startswith("day:"):
+                    # Long after any entry keyed on the version expired
+                    pipeline.expire(key, 86400)
+            await pipeline.execute()
+
+
+def _day_scopes(
+    start: Optional[datetime], end: Optional[datetime]
+) -> Optional[list[str]]:
+    """Scopes of the UTC days from `start` to `end`, None when unbounded"""
+    if start is None or end is None:
+        return None
+    first, last = to_utc(start).date(), to_utc(end).date()
+    if (last - first).days >= _MAX_SCOPED_DAYS:
+        return None
+    return [
+        f"day:{first + timedelta(days=offset)}"
+        for offset in range((last - first).days + 1)
+    ]
+
+
+class ResponseCache:
+    """
+    Cache for serialized read responses.
+
+    Keys combine the endpoint, the normalized parameters and the data
+    versions of the days the request covers. Committed writes bump the
+    versions of the days they touched, so no entry outlives a change to its
+    logs while older ranges stay cached during ingestion. Concurrent misses
+    for the same key share a single computation.
+    """
+
+    def __init__(self, enabled: bool, backend, ttl: float) -> None:
+        self.enabled = enabled
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def invalidate(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> None:
+        """
+        Invalidate the cached responses covering logs from `start` to `end`,
+        or every response without a range. Called after writes commit.
+        """
+
+        if not self.enabled:
+            return
+        days = _day_scopes(start, end)
+        if days is None:
+            await self.backend.bump_versions([_ALL_SCOPE, _GLOBAL_SCOPE])
+        else:
+            await self.backend.bump_versions([_ALL_SCOPE, *days])
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        parameter: BaseModel,
+        compute: Callable[[], Awaitable],
+        refresh: bool = False,
+    ) -> bytes:
+        """
+        Serialized response for the parameters, computed at most once.
+
+        `compute` returns a response model or an already encoded body.
+        With `refresh` a cached entry is ignored and replaced.
+        """
+
+        if not self.enabled:
+            return _serialize(await compute())
+
+        # Read the versions first so a write racing with the computation
+        # leaves its result under the old, already invalidated key
+        days = _day_scopes(
+            getattr(parameter, "start_date", None),
+            getattr(parameter, "end_date", None),
+        )
+        scopes = [_ALL_SCOPE] if days is None else [_GLOBAL_SCOPE, *days]
+        versions = await self.backend.versions(scopes)
+        version = ".".join(str(value) for value in versions)
+        key = f"{namespace}:{version}:{parameter.model_dump_json()}"
+
+        body = None if refresh else await self.backend.get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        while not refresh and key in self._inflight:
+            future = self._inflight[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only our own cancellation is passed on. When the leader
+                # was cancelled the next waiter takes over the computation
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        if not refresh:
+            self._inflight[key] = future
+        try:
+            body = _serialize(await compute())
+            await self.backend.set(key, body, self.ttl)
+            future.set_result(body)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting, don't leave the error unretrieved
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        return body
+
+    def stats(self) -> dict:
+        stats = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+        if isinstance(self.backend, MemoryCacheBackend):
+            stats["entries"] = len(self.backend)
+        return stats
+
+
+def _create_backend():
+    if RESPONSE_CACHE_URL:
+        return RedisCacheBackend(RESPONSE_CACHE_URL)
+    return MemoryCacheBackend(RESPONSE_CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(
+    enabled=RESPONSE_CACHE_ENABLED,
+    backend=_create_backend() if RESPONSE_CACHE_ENABLED else None,
+    ttl=RESPONSE_CACHE_TTL_SECONDS,
+)
+
+
+async def cached_response(
+    request: Request,
+    namespace: str,
+    parameter: BaseModel,
+    compute: Callable[[], Awaitable],
+) -> Response:
+    """
+    JSON response served through the response cache, with an ETag so
+    clients polling with `If-None-Match` get an empty 304 when nothing
+    changed. A `Cache-Control: no-cache` request bypasses the cache.
+    """
+
+    refresh = "no-cache" in request.headers.get("cache-control", "").lower()
+    body = await response_cache.get_or_compute(
+        namespace, parameter, compute, refresh=refresh
+    )
+    etag = compute_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
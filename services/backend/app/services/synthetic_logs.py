@@ -0,0 +1,248 @@
+import io
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from itertools import accumulate
+from typing import Callable, Optional
+
+import psycopg2
+from app.database import libpq_url
+from app.models.log_models import SEVERITY_CODES
+from app.services.generate_logs import (
+    LOG_MESSAGES,
+    LOG_SEVERITIES,
+    LOG_SOURCES,
+    SAMPLE_METADATA,
+)
+from app.utils.patterns import message_pattern
+
+DEFAULT_SEVERITY_RATIOS = {
+    "DEBUG": 20.0,
+    "INFO": 60.0,
+    "WARN": 12.0,
+    "ERROR": 7.0,
+    "FATAL": 1.0,
+}
+
+COPY_SQL = (
+    'COPY "logs" ("id", "severity", "message", "source_id", "timestamp", "metadata", '
+    '"pattern_id") FROM STDIN'
+)
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+# Metadata documents encoded once, rows pick one of them
+_COPY_METADATA = [
+    json.dumps(metadata).translate(_COPY_ESCAPES) for metadata in SAMPLE_METADATA
+]
+
+# Escaped messages of every severity with their pattern id
+_COPY_MESSAGES = {
+    severity: [
+        (message.translate(_COPY_ESCAPES), message_pattern(message)[0])
+        for message in messages
+    ]
+    for severity, messages in LOG_MESSAGES.items()
+}
+
+
+@dataclass
+class SyntheticLogsConfig:
+    rows: int
+    start: datetime
+    end: datetime
+    seed: int = 42
+    severity_ratios: dict[str, float] = field(
+        default_factory=lambda: dict(DEFAULT_SEVERITY_RATIOS)
+    )
+    # Exponent of the Zipf distribution of sources, 0 spreads them evenly
+    zipf_exponent: float = 1.1
+    # Relative difference between the busiest and the quietest hour of a day
+    diurnal_amplitude: float = 0.6
+    # Average number of bursts per day, and their traffic multiplier
+    bursts_per_day: float = 2.0
+    burst_multiplier: float = 8.0
+    batch_size: int = 100_000
+    # Dictionary ids of LOG_SOURCES, interned before the workers start
+    source_ids: list[int] = field(default_factory=list)
+
+
+def parse_severity_ratios(value: str) -> dict[str, float]:
+    """Parse `DEBUG=20,INFO=60,...`, severities left out get no rows"""
+    ratios = {severity: 0.0 for severity in LOG_SEVERITIES}
+    for item in value.split(","):
+        severity, _, weight = item.partition("=")
+        severity = severity.strip().upper()
+        if severity not in ratios:
+            raise ValueError(f"Unknown severity {severity!r}")
+        ratios[severity] = float(weight)
+    if not any(ratios.values()):
+        raise ValueError("At least one severity needs a positive ratio")
+    return ratios
+
+
+def minute_weights(config: SyntheticLogsConfig) -> list[float]:
+    """
+    Relative traffic of every minute in the range.
+
+    A sine over the day peaking at 14:00 UTC models the diurnal cycle, and
+    randomly placed bursts of 5 to 30 minutes multiply the traffic on top.
+    """
+
+    rng = random.Random(config.seed)
+    start = config.start.replace(second=0, microsecond=0)
+    minutes = max(1, math.ceil((config.end - start).total_seconds() / 60))
+
+    weights = []
+    for minute in range(minutes):
+        moment = start + timedelta(minutes=minute)
+        hour = moment.hour + moment.minute / 60
+        phase = (hour - 8) / 24 * 2 * math.pi
+        weights.append(1 + config.diurnal_amplitude * math.sin(phase))
+
+    bursts = round(config.bursts_per_day * minutes / 1440)
+    for _ in range(bursts):
+        begin = rng.randrange(minutes)
+        for minute in range(begin, min(minutes, begin + rng.randint(5, 30))):
+            weights[minute] *= config.burst_multiplier
+
+    return weights
+
+
+def _uuid7(milliseconds: int, rng: random.Random) -> str:
+    """Time-ordered UUIDv7 whose random bits come from the seeded generator"""
+    value = (
+        (milliseconds << 80)
+        | (0x7 << 76)
+        | (rng.getrandbits(12) << 64)
+        | (0b10 << 62)
+        | rng.getrandbits(62)
+    )
+    hex_value = f"{value:032x}"
+    return (
+        f"{hex_value[:8]}-{hex_value[8:12]}-{hex_value[12:16]}-"
+        f"{hex_value[16:20]}-{hex_value[20:]}"
+    )
+
+
+def generate_copy_batch(
+    rows: int,
+    rng: random.Random,
+    start: datetime,
+    cumulative_minutes: list[float],
+    severities: list[str],
+    cumulative_severities: list[float],
+    source_ids: list[int],
+    cumulative_sources: list[float],
+) -> bytes:
+    """
+    A batch of random logs encoded in the COPY text format.
+
+    Every column is drawn for the whole batch at once with `choices`, so
+    the per-row Python work is limited to formatting.
+    """
+
+    minute_indexes = rng.choices(
+        range(len(cumulative_minutes)), cum_weights=cumulative_minutes, k=rows
+    )
+    row_severities = rng.choices(severities, cum_weights=cumulative_severities, k=rows)
+    row_sources = rng.choices(source_ids, cum_weights=cumulative_sources, k=rows)
+    offsets = [rng.randrange(60_000) for _ in range(rows)]
+    metadata = rng.choices(_COPY_METADATA, k=rows)
+
+    base = int(start.replace(second=0, microsecond=0).timestamp() * 1000)
+    buffer = io.StringIO()
+    for minute, severity, source, offset, document in zip(
+        minute_indexes, row_severities, row_sources, offsets, metadata
+    ):
+        milliseconds = base + minute * 60_000 + offset
+        timestamp = datetime.fromtimestamp(milliseconds / 1000, UTC)
+        message, pattern_id = rng.choice(_COPY_MESSAGES[severity])
+        buffer.write(
+            f"{_uuid7(milliseconds, rng)}\t{SEVERITY_CODES[severity]}\t"
+            f"{message}\t{source}\t"
+            f"{timestamp:%Y-%m-%d %H:%M:%S.%f}\t{document}\t{pattern_id}\n"
+        )
+    return buffer.getvalue().encode()
+
+
+def _copy_worker(
+    database_url: str, config: SyntheticLogsConfig, worker: int, rows: int
+) -> int:
+    """Generate and COPY `rows` logs on a connection of this process"""
+    # Each worker draws from its own stream so runs are reproducible
+    rng = random.Random(f"{config.seed}:{worker}")
+
+    severities = list(config.severity_ratios)
+    cumulative_severities = list(accumulate(config.severity_ratios.values()))
+    cumulative_sources = list(
+        accumulate(
+            1 / (rank**config.zipf_exponent) for rank in range(1, len(LOG_SOURCES) + 1)
+        )
+    )
+    cumulative_minutes = list(accumulate(minute_weights(config)))
+
+    dsn, schema = libpq_url(database_url)
+    connection = psycopg2.connect(
+        dsn, options=f"-c search_path={schema}" if schema else None
+    )
+    try:
+        with connection, connection.cursor() as cursor:
+            # Losing a generated batch on a crash is fine, skip the WAL flush
+            cursor.execute("SET synchronous_commit TO off")
+            written = 0
+            while written < rows:
+                count = min(config.batch_size, rows - written)
+                batch = generate_copy_batch(
+                    count,
+                    rng,
+                    config.start,
+                    cumulative_minutes,
+                    severities,
+                    cumulative_severities,
+                    config.source_ids,
+                    cumulative_sources,
+                )
+                cursor.copy_expert(COPY_SQL, io.BytesIO(batch))
+                connection.commit()
+                written += count
+    finally:
+        connection.close()
+    return rows
+
+
+def generate_synthetic_logs(
+    config: SyntheticLogsConfig,
+    workers: int,
+    progress: Optional[Callable[[int, float], None]] = None,
+) -> int:
+    """
+    Load `config.rows` synthetic logs with COPY from parallel processes.
+
+    Rollups are not maintained while loading, rebuild them for the range
+    afterwards. Returns the number of rows written.
+    """
+
+    database_url = os.environ["DATABASE_URL"]
+    shares = [config.rows // workers] * workers
+    for index in range(config.rows % workers):
+        shares[index] += 1
+
+    started = time.perf_counter()
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_copy_worker, database_url, config, worker, share)
+            for worker, share in enumerate(shares)
+            if share
+        ]
+        for future in as_completed(futures):
+            written += future.result()
+            if progress:
+                progress(written, time.perf_counter() - started)
+    return written
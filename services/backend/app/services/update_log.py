@@ -1,5 +1,15 @@
-from app.models.log_models import LogModel, SeverityLevel
-from prisma import Prisma
+from typing import Any, Optional
+
+from app.models.log_models import LogModel, SeverityLevel, severity_code
+from app.services.log_analytics import touch_log_days
+from app.services.log_archive import ArchivedLogError, log_archive
+from app.services.log_patterns import log_patterns
+from app.services.log_rollups import record_created_logs, record_deleted_logs
+from app.services.log_sources import log_sources
+from app.services.metrics import instrumented
+from app.services.response_cache import response_cache
+from app.utils.patterns import message_pattern
+from prisma import Json, Prisma
 from pydantic import BaseModel, Field
 
 
@@ -7,33 +17,65 @@ class UpdateLogPayload(BaseModel):
     severity: SeverityLevel
     message: str = Field(..., max_length=1024)
     source: str = Field(..., max_length=256)
+    metadata: dict[str, Any] = Field(default_factory=dict)
 
 
 class UpdateLogResponse(LogModel):
     status_code: int
 
 
+@instrumented()
 async def update_log_svc(
     log_id: str, log: UpdateLogPayload, db: Prisma
-) -> UpdateLogResponse:
+) -> Optional[UpdateLogResponse]:
     """
     Service to update an existing log entry by ID
+
+    Archived logs are read-only, updating one raises `ArchivedLogError`.
     """
 
-    updated_log = await db.log.update(
-        where={"id": log_id},
-        data={
-            "severity": log.severity,
-            "message": log.message,
-            "source": log.source,
-        },
-    )
-
-    return UpdateLogResponse(
-        id=updated_log.id,
-        severity=updated_log.severity,
-        message=updated_log.message,
-        source=updated_log.source,
-        timestamp=updated_log.timestamp,
-        status_code=200,
-    )
+    source_ids = await log_sources.ids(db, [log.source])
+    await log_patterns.register(db, [log.message])
+
+    async with db.tx() as transaction:
+        previous_log = await transaction.log.find_first(where={"id": log_id})
+        if not previous_log:
+            if await log_archive.find(db, log_id):
+                raise ArchivedLogError("Log is archived")
+            return None
+
+        updated_log = await transaction.log.update(
+            where={
+                "id_timestamp": {
+                    "id": previous_log.id,
+                    "timestamp": previous_log.timestamp,
+                }
+            },
+            data={
+                "severity": severity_code(log.severity),
+                "message": log.message,
+                "source_id": source_ids[log.source],
+                "metadata": Json(log.metadata),
+                "pattern_id": message_pattern(log.message)[0],
+            },
+        )
+
+        previous, updated = await log_sources.log_models(
+            db, [previous_log, updated_log]
+        )
+        if (
+            previous_log.severity != updated_log.severity
+            or previous_log.source_id != updated_log.source_id
+            or previous_log.pattern_id != updated_log.pattern_id
+        ):
+            await record_deleted_logs(
+                transaction,
+                [{**previous.model_dump(), "pattern_id": previous_log.pattern_id}],
+            )
+            await record_created_logs(transaction, [updated])
+        else:
+            # The message may still have changed in a compacted day
+            await touch_log_days(transaction, [previous_log.timestamp])
+    await response_cache.invalidate(previous_log.timestamp, previous_log.timestamp)
+
+    return UpdateLogResponse(**updated.model_dump(), status_code=200)
@@ -0,0 +1,73 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any
+
+from app.models.log_models import SeverityLevel
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def keyset_columns(sort_by: str) -> list[str]:
+    """Columns that define a total order for the given sort field"""
+    if sort_by == "timestamp":
+        return ["timestamp", "id"]
+    return [sort_by, "timestamp", "id"]
+
+
+def keyset_values(sort_by: str, log: Any) -> list[Any]:
+    """Keyset position of a log row"""
+    return [getattr(log, column) for column in keyset_columns(sort_by)]
+
+
+def encode_cursor(sort_by: str, sort_order: str, log: Any) -> str:
+    """Build an opaque cursor pointing right after the given log row"""
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in keyset_values(sort_by, log)
+    ]
+
+    payload = json.dumps(
+        {"s": sort_by, "o": sort_order, "k": values}, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> list[Any]:
+    """Decode a cursor and return the keyset values it points at"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = list(payload["k"])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursorError("Malformed cursor")
+
+    if payload.get("s") != sort_by or payload.get("o") != sort_order:
+        raise InvalidCursorError("Cursor does not match the requested sort")
+
+    columns = keyset_columns(sort_by)
+    if len(values) != len(columns):
+        raise InvalidCursorError("Malformed cursor")
+
+    # Cursors come from clients, every value is checked before it reaches SQL
+    try:
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (TypeError, ValueError, AttributeError):
+        raise InvalidCursorError("Malformed cursor")
+
+
+def _cursor_value(column: str, value: Any) -> Any:
+    if column == "timestamp":
+        return datetime.fromisoformat(value)
+    if column == "id":
+        return str(uuid.UUID(value))
+    if column == "source":
+        if type(value) is not str:
+            raise TypeError(column)
+        return value
+    if column == "severity":
+        return SeverityLevel(value).value
+    raise ValueError(column)
@@ -0,0 +1,293 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+from app.models.log_models import SeverityLevel, severity_code
+from app.utils.sql import SqlParams, escape_like, metadata_condition
+from pydantic import BaseModel, Field, field_validator
+
+SEVERITY_ORDER = list(SeverityLevel)
+
+
+def split_values(value: Any) -> Any:
+    """Accept `a,b` strings and repeated query parameters alike"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if isinstance(value, (list, tuple)):
+        return [
+            part.strip()
+            for item in value
+            for part in str(item).split(",")
+            if part.strip()
+        ]
+    return value
+
+
+class LogFilterParameter(BaseModel):
+    """Filters shared by the log endpoints, see `compile_log_filter`"""
+
+    severity: list[SeverityLevel] = Field(default_factory=list)
+    exclude_severity: list[SeverityLevel] = Field(default_factory=list)
+    min_severity: Optional[SeverityLevel] = None
+    source: list[str] = Field(default_factory=list)
+    exclude_source: list[str] = Field(default_factory=list)
+    source_prefix: Optional[str] = None
+    q: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+    @field_validator(
+        "severity", "exclude_severity", "source", "exclude_source", mode="before"
+    )
+    @classmethod
+    def _split_values(cls, value: Any) -> Any:
+        return split_values(value)
+
+    @field_validator("severity", "exclude_severity", "min_severity", mode="before")
+    @classmethod
+    def _upper_severities(cls, value: Any) -> Any:
+        if isinstance(value, list):
+            return [item.upper() if isinstance(item, str) else item for item in value]
+        return value.upper() if isinstance(value, str) else value
+
+
+@dataclass(frozen=True)
+class CompiledLogFilter:
+    # None allows every value, an empty tuple matches nothing
+    severities: Optional[tuple[str, ...]] = None
+    sources: Optional[tuple[str, ...]] = None
+    exclude_sources: tuple[str, ...] = ()
+    source_prefix: Optional[str] = None
+    q: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    meta: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        """True when no log can match"""
+        return self.severities == () or self.sources == ()
+
+    @property
+    def needs_raw_rows(self) -> bool:
+        """Rollups only know severity and source, other filters read raw rows"""
+        return bool(self.q or self.meta)
+
+
+def _resolve_severities(parameter: Any) -> Optional[tuple[str, ...]]:
+    allowed = [severity.value for severity in SEVERITY_ORDER]
+    if parameter.severity:
+        selected = {SeverityLevel(severity).value for severity in parameter.severity}
+        allowed = [severity for severity in allowed if severity in selected]
+    if parameter.min_severity:
+        threshold = SEVERITY_ORDER.index(SeverityLevel(parameter.min_severity))
+        allowed = [
+            severity
+            for severity in allowed
+            if SEVERITY_ORDER.index(SeverityLevel(severity)) >= threshold
+        ]
+    excluded = {
+        SeverityLevel(severity).value for severity in parameter.exclude_severity
+    }
+    allowed = [severity for severity in allowed if severity not in excluded]
+
+    if len(allowed) == len(SEVERITY_ORDER):
+        return None
+    return tuple(allowed)
+
+
+def compile_log_filter(parameter: Any) -> CompiledLogFilter:
+    """
+    Normalize the filters of a parameter model.
+
+    Severity filters are resolved to the allowed severities up front, so
+    `min_severity=WARN&exclude_severity=ERROR` becomes `severity IN (WARN,
+    FATAL)`, and listed sources absorb the source exclusions and prefix.
+    Both end up as equality or `= ANY` predicates on the leading columns
+    of the `(severity, source_id, timestamp)` index.
+    """
+    exclude_sources = tuple(dict.fromkeys(parameter.exclude_source))
+    source_prefix = parameter.source_prefix or None
+
+    sources = None
+    if parameter.source:
+        sources = tuple(
+            source
+            for source in dict.fromkeys(parameter.source)
+            if source not in exclude_sources
+            and (source_prefix is None or source.startswith(source_prefix))
+        )
+        exclude_sources, source_prefix = (), None
+
+    return CompiledLogFilter(
+        severities=_resolve_severities(parameter),
+        sources=sources,
+        exclude_sources=exclude_sources,
+        source_prefix=source_prefix,
+        q=parameter.q,
+        start_date=parameter.start_date,
+        end_date=parameter.end_date,
+        meta=getattr(parameter, "meta", None) or {},
+    )
+
+
+def _in_condition(
+    column: str, values: tuple[Any, ...], params: SqlParams, cast: str
+) -> str:
+    if len(values) == 1:
+        return f'"{column}" = {params.add(values[0], cast)}'
+    return f'"{column}" = ANY({params.add(list(values), f"{cast}[]")})'
+
+
+def _source_ids(condition: str) -> str:
+    # ARRAY() runs once before the scan, so the ids can be index conditions
+    return f'ARRAY(SELECT "id" FROM "log_sources" WHERE {condition})'
+
+
+def _source_conditions(compiled: CompiledLogFilter, params: SqlParams) -> list[str]:
+    """Source filters on the logs table, which stores dictionary ids"""
+    conditions = []
+    if compiled.sources is not None and len(compiled.sources) == 1:
+        name = params.add(compiled.sources[0])
+        lookup = f'SELECT "id" FROM "log_sources" WHERE "name" = {name}'
+        conditions.append(f'"source_id" = ({lookup})')
+    elif compiled.sources is not None:
+        names = params.add(list(compiled.sources), "text[]")
+        lookup = _source_ids(f'"name" = ANY({names})')
+        conditions.append(f'"source_id" = ANY({lookup})')
+    if compiled.source_prefix:
+        pattern = params.add(f"{escape_like(compiled.source_prefix)}%")
+        lookup = _source_ids(f'"name" LIKE {pattern}')
+        conditions.append(f'"source_id" = ANY({lookup})')
+    if compiled.exclude_sources:
+        names = params.add(list(compiled.exclude_sources), "text[]")
+        lookup = _source_ids(f'"name" = ANY({names})')
+        conditions.append(f'"source_id" <> ALL({lookup})')
+    return conditions
+
+
+def _rollup_source_conditions(
+    compiled: CompiledLogFilter, params: SqlParams
+) -> list[str]:
+    conditions = []
+    if compiled.sources is not None:
+        conditions.append(_in_condition("source", compiled.sources, params, "text"))
+    if compiled.source_prefix:
+        pattern = params.add(f"{escape_like(compiled.source_prefix)}%")
+        conditions.append(f'"source" LIKE {pattern}')
+    if compiled.exclude_sources:
+        excluded = params.add(list(compiled.exclude_sources), "text[]")
+        conditions.append(f'"source" <> ALL({excluded})')
+    return conditions
+
+
+def log_filter_conditions(
+    parameter: Any,
+    params: SqlParams,
+    include_time_range: bool = True,
+    rollups: bool = False,
+) -> list[str]:
+    """
+    SQL conditions for the filters of a log parameter model, on the logs
+    table or, with `rollups` and without the time range and raw-row
+    filters, on `log_rollups`.
+
+    The logs table stores severities as smallint codes and sources as ids of
+    the `log_sources` dictionary, source names are resolved in a subquery.
+    """
+
+    compiled = compile_log_filter(parameter)
+    if compiled.empty:
+        return ["FALSE"]
+
+    conditions = []
+    if compiled.severities is not None:
+        if rollups:
+            severities, cast = compiled.severities, "text"
+        else:
+            severities = tuple(map(severity_code, compiled.severities))
+            cast = "smallint"
+        conditions.append(_in_condition("severity", severities, params, cast))
+    if rollups:
+        conditions.extend(_rollup_source_conditions(compiled, params))
+        return conditions
+
+    conditions.extend(_source_conditions(compiled, params))
+    if compiled.q:
+        pattern = params.add(f"%{escape_like(compiled.q)}%")
+        conditions.append(f'"message" ILIKE {pattern}')
+    for key, value in compiled.meta.items():
+        conditions.append(metadata_condition(key, value, params))
+    if include_time_range and compiled.start_date:
+        start = params.add(compiled.start_date, "timestamp")
+        conditions.append(f'"timestamp" >= {start}')
+    if include_time_range and compiled.end_date:
+        end = params.add(compiled.end_date, "timestamp")
+        conditions.append(f'"timestamp" <= {end}')
+    return conditions
+
+
+def log_block_conditions(parameter: Any, params: SqlParams) -> list[str]:
+    """
+    SQL conditions on `log_archive_blocks` skipping the blocks whose summary
+    can't match the severity and source filters. A block holds the logs of
+    a single source and lists the severities it contains.
+    """
+
+    compiled = compile_log_filter(parameter)
+    if compiled.empty:
+        return ["FALSE"]
+
+    conditions = []
+    if compiled.severities is not None:
+        severities = params.add(list(compiled.severities), '"LogSeverity"[]')
+        conditions.append(f'"severities" && {severities}')
+    conditions.extend(_source_conditions(compiled, params))
+    return conditions
+
+
+def prisma_rollup_where(parameter: Any) -> dict[str, Any]:
+    """
+    Prisma where clause for the severity and source filters on the rollups.
+
+    Logs are filtered in raw SQL only, Prisma can't resolve source names
+    through the dictionary.
+    """
+
+    compiled = compile_log_filter(parameter)
+    where: dict[str, Any] = {}
+
+    if compiled.severities is not None:
+        where["severity"] = {"in": list(compiled.severities)}
+
+    source: dict[str, Any] = {}
+    if compiled.sources is not None:
+        source["in"] = list(compiled.sources)
+    if compiled.source_prefix:
+        source["startswith"] = compiled.source_prefix
+    if compiled.exclude_sources:
+        source["not_in"] = list(compiled.exclude_sources)
+    if source:
+        where["source"] = source
+
+    return where
+
+
+def log_matches(compiled: CompiledLogFilter, log: dict[str, Any]) -> bool:
+    """In-memory counterpart of the SQL conditions, for the live tail"""
+    if compiled.empty:
+        return False
+    if compiled.severities is not None and log["severity"] not in compiled.severities:
+        return False
+    source = log["source"]
+    if compiled.sources is not None and source not in compiled.sources:
+        return False
+    if compiled.source_prefix and not source.startswith(compiled.source_prefix):
+        return False
+    if source in compiled.exclude_sources:
+        return False
+    if compiled.q and compiled.q.lower() not in log["message"].lower():
+        return False
+    return True
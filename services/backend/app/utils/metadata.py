@@ -0,0 +1,92 @@
+import json
+import re
+from typing import Any, Mapping
+
+# Metadata keys with their own B-tree expression index (see migrations).
+# Equality on them is served by that index instead of the GIN index.
+PROMOTED_METADATA_KEYS = ("request_id", "user_id", "transaction_id")
+
+METADATA_FILTER_PREFIX = "meta."
+MAX_METADATA_FILTERS = 10
+
+# Dots nest into objects, `meta.http.status=500` matches {"http": {"status": 500}}
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}(\.[A-Za-z0-9_-]{1,64}){0,4}$")
+
+
+class InvalidMetadataFilterError(ValueError):
+    pass
+
+
+def parse_metadata_filters(query: Mapping[str, str]) -> dict[str, str]:
+    """Collect the `meta.<key>=<value>` query parameters"""
+    filters = {}
+    for name, value in query.items():
+        if not name.startswith(METADATA_FILTER_PREFIX):
+            continue
+        key = name[len(METADATA_FILTER_PREFIX) :]
+        if not _KEY_PATTERN.match(key):
+            raise InvalidMetadataFilterError(f"Invalid metadata key {key!r}")
+        filters[key] = value
+
+    if len(filters) > MAX_METADATA_FILTERS:
+        raise InvalidMetadataFilterError(
+            f"At most {MAX_METADATA_FILTERS} metadata filters are supported"
+        )
+    # Sorted so equal filters share one response cache entry
+    return dict(sorted(filters.items()))
+
+
+def metadata_values(value: str) -> list[Any]:
+    """
+    JSON values a filter value matches. Query strings carry no types, so
+    `42`, `true` or `null` also match the number, boolean or null.
+    """
+
+    values: list[Any] = [value]
+    try:
+        typed = json.loads(value)
+    except ValueError:
+        return values
+    if typed is None or isinstance(typed, (bool, int, float)):
+        values.append(typed)
+    return values
+
+
+def nest_metadata(key: str, value: Any) -> dict[str, Any]:
+    """The containment document for a dotted key"""
+    document = value
+    for part in reversed(key.split(".")):
+        document = {part: document}
+    return document
+
+
+def _contains(document: Any, fragment: Any) -> bool:
+    """jsonb `@>` containment of two parsed documents"""
+    if isinstance(fragment, dict):
+        return isinstance(document, dict) and all(
+            key in document and _contains(document[key], value)
+            for key, value in fragment.items()
+        )
+    if isinstance(fragment, list):
+        return isinstance(document, list) and all(
+            any(_contains(item, part) for item in document) for part in fragment
+        )
+    if isinstance(document, (dict, list)):
+        return False
+    # Python compares True equal to 1, jsonb doesn't
+    if isinstance(document, bool) or isinstance(fragment, bool):
+        return document is fragment
+    return document == fragment
+
+
+def metadata_matches(document: Any, key: str, value: str) -> bool:
+    """In-memory counterpart of `metadata_condition`, for rows read outside SQL"""
+    if key in PROMOTED_METADATA_KEYS:
+        found = document.get(key) if isinstance(document, dict) else None
+        if found is None:
+            return False
+        return (found if isinstance(found, str) else json.dumps(found)) == value
+    return any(
+        _contains(document, nest_metadata(key, candidate))
+        for candidate in metadata_values(value)
+    )
@@ -0,0 +1,63 @@
+import hashlib
+import re
+from functools import lru_cache
+
+# Variable parts of a message and their placeholder, applied in order so
+# the specific shapes are masked before the generic number rules
+_MASKS = [
+    (
+        re.compile(
+            r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I
+        ),
+        "<uuid>",
+    ),
+    # ISO 8601 dates and times, before the number rules split them apart
+    (
+        re.compile(
+            r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?"
+            r"(?:Z|[+-]\d{2}:?\d{2})?)?(?![\w.:-])"
+        ),
+        "<ts>",
+    ),
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d{1,5})?\b"), "<ip>"),
+    (re.compile(r"\b0x[0-9a-f]+\b|\b(?=[0-9a-f]*\d)[0-9a-f]{8,}\b", re.I), "<hex>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "<str>"),
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])"), "<num>"),
+    # Identifiers with digits in them, like `user_123` or `150ms`
+    (re.compile(r"\b\w*\d\w*\b"), "<*>"),
+]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def message_template(message: str) -> str:
+    """The message with its variable tokens masked"""
+    for pattern, placeholder in _MASKS:
+        message = pattern.sub(placeholder, message)
+    return _WHITESPACE.sub(" ", message).strip()
+
+
+def template_pattern_id(template: str) -> int:
+    """Stable signed 64-bit id of a template, to fit a BIGINT column"""
+    digest = hashlib.blake2b(template.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@lru_cache(maxsize=65536)
+def message_pattern(message: str) -> tuple[int, str]:
+    """
+    Pattern id and template of a message.
+
+    Cached because most traffic repeats a small set of messages. Changing
+    the masks changes the ids, stored logs then need `manage.py
+    backfill-patterns --all` to be fingerprinted again.
+    """
+
+    template = message_template(message)
+    return template_pattern_id(template), template
+
+
+def pattern_key(pattern_id: int) -> str:
+    """Pattern id as 16 hex digits, JSON numbers can't hold 64 bits"""
+    return f"{pattern_id & 0xFFFFFFFFFFFFFFFF:016x}"
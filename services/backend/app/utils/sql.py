@@ -0,0 +1,106 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Optional
+
+from app.models.log_models import SEVERITY_NAMES, severity_code
+from app.utils.metadata import (
+    PROMOTED_METADATA_KEYS,
+    metadata_values,
+    nest_metadata,
+)
+from app.utils.time_buckets import to_utc_naive
+
+
+class SqlParams:
+    """Collects positional parameters for a raw Postgres query"""
+
+    def __init__(self) -> None:
+        self.values: list[Any] = []
+
+    def add(self, value: Any, cast: Optional[str] = None) -> str:
+        """Register a value and return its placeholder"""
+        self.values.append(value)
+        placeholder = f"${len(self.values)}"
+        if cast:
+            placeholder = f"{placeholder}::{cast}"
+        return placeholder
+
+
+def driver_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return to_utc_naive(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def severity_name_sql(column: str = '"severity"') -> str:
+    """SQL expression turning a stored severity code back into its name"""
+    names = ", ".join(f"'{name}'" for name in SEVERITY_NAMES)
+    return f"(ARRAY[{names}])[{column} + 1]"
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so the value is matched literally"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def range_condition(column: str, start: Any, end: Any, params: SqlParams) -> str:
+    """Half-open `start <= column < end` condition, `None` bounds are open"""
+    bounds = []
+    if start is not None:
+        bounds.append(f'"{column}" >= {params.add(start, "timestamp")}')
+    if end is not None:
+        bounds.append(f'"{column}" < {params.add(end, "timestamp")}')
+    return " AND ".join(bounds) if bounds else "TRUE"
+
+
+def metadata_condition(key: str, value: str, params: SqlParams) -> str:
+    """
+    Condition matching logs whose metadata has `value` under `key`.
+
+    Promoted keys compare their indexed text expression, every other key
+    is a containment test served by the GIN index on the whole column.
+    """
+
+    if key in PROMOTED_METADATA_KEYS:
+        return f"(\"metadata\" ->> '{key}') = {params.add(value)}"
+    documents = [
+        params.add(json.dumps(nest_metadata(key, candidate)), "jsonb")
+        for candidate in metadata_values(value)
+    ]
+    return "(" + " OR ".join(f'"metadata" @> {doc}' for doc in documents) + ")"
+
+
+def keyset_condition(
+    columns: list[str], sort_order: str, values: list[Any], params: SqlParams
+) -> str:
+    """
+    SQL condition selecting the rows after a keyset position.
+
+    A row comparison expresses the tie-breaking in one expression, and the
+    leading column is bounded on its own so it can serve as index condition.
+    """
+
+    casts = {
+        "timestamp": "timestamp",
+        "id": "uuid",
+        "severity": "smallint",
+        "source_id": "integer",
+    }
+    # Cursors carry severity names, the column stores codes
+    values = [
+        severity_code(value) if column == "severity" else value
+        for column, value in zip(columns, values)
+    ]
+    placeholders = [
+        params.add(value, casts.get(column)) for column, value in zip(columns, values)
+    ]
+    strict = "<" if sort_order == "desc" else ">"
+    inclusive = "<=" if sort_order == "desc" else ">="
+    row = ", ".join(f'"{column}"' for column in columns)
+    return (
+        f'"{columns[0]}" {inclusive} {placeholders[0]} AND '
+        f"({row}) {strict} ({', '.join(placeholders)})"
+    )
@@ -0,0 +1,107 @@
+from datetime import UTC, datetime, timedelta
+from typing import NamedTuple, Optional
+
+# Rollup granularities, coarsest first
+GRANULARITIES: dict[str, timedelta] = {
+    "day": timedelta(days=1),
+    "hour": timedelta(hours=1),
+    "minute": timedelta(minutes=1),
+}
+
+# Smallest step between two stored timestamps, used to turn an inclusive
+# upper bound into an exclusive one
+TIMESTAMP_RESOLUTION = timedelta(microseconds=1)
+
+
+class TimeRangePlan(NamedTuple):
+    # (granularity, start, end) ranges of whole rollup buckets
+    rollup: list[tuple[str, Optional[datetime], Optional[datetime]]]
+    # (start, end) ranges that must be read from raw rows
+    raw: list[tuple[Optional[datetime], Optional[datetime]]]
+
+
+def to_utc(value: datetime) -> datetime:
+    """Normalize a datetime to an aware UTC datetime, naive values are UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """UTC datetime without tzinfo, matching the `timestamp` column type"""
+    return to_utc(value).replace(tzinfo=None)
+
+
+def truncate_ms(value: datetime) -> datetime:
+    """Drop the microseconds the `timestamp(3)` column would not keep"""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def floor_bucket(value: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing the given time"""
+    value = value.replace(second=0, microsecond=0)
+    if granularity in {"hour", "day"}:
+        value = value.replace(minute=0)
+    if granularity == "day":
+        value = value.replace(hour=0)
+    return value
+
+
+def ceil_bucket(value: datetime, granularity: str) -> datetime:
+    """Start of the first bucket that begins at or after the given time"""
+    floored = floor_bucket(value, granularity)
+    if floored == value:
+        return floored
+    return floored + GRANULARITIES[granularity]
+
+
+def exclusive_end(end: Optional[datetime]) -> Optional[datetime]:
+    """Turn an inclusive `end_date` filter into an exclusive bound"""
+    if end is None:
+        return None
+    return to_utc(end) + TIMESTAMP_RESOLUTION
+
+
+def plan_time_range(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    granularities: tuple[str, ...] = tuple(GRANULARITIES),
+) -> TimeRangePlan:
+    """
+    Split the half-open range [start, end) into whole rollup buckets and
+    the partial edges that are left for the raw table.
+
+    Each level covers as much of the range as it can with whole buckets and
+    hands the left-over edges to the next, finer granularity. Edges smaller
+    than the finest granularity are returned as raw ranges. `None` bounds
+    are open-ended.
+    """
+
+    plan = TimeRangePlan(rollup=[], raw=[])
+    start = to_utc(start) if start is not None else None
+    end = to_utc(end) if end is not None else None
+
+    if start is not None and end is not None and start >= end:
+        return plan
+
+    def cover(low: Optional[datetime], high: Optional[datetime], level: int) -> None:
+        if level == len(granularities):
+            plan.raw.append((low, high))
+            return
+
+        granularity = granularities[level]
+        inner_low = ceil_bucket(low, granularity) if low is not None else None
+        inner_high = floor_bucket(high, granularity) if high is not None else None
+
+        if inner_low is not None and inner_high is not None and inner_low >= inner_high:
+            cover(low, high, level + 1)
+            return
+
+        plan.rollup.append((granularity, inner_low, inner_high))
+        if low is not None and low < inner_low:
+            cover(low, inner_low, level + 1)
+        if high is not None and inner_high < high:
+            cover(inner_high, high, level + 1)
+
+    cover(start, end, 0)
+    return plan
@@ -0,0 +1,86 @@
+"""
+Compare two benchmark result files and fail on regressions.
+
+    uv run python -m benchmarks.compare benchmarks/results/<base>.json \\
+        benchmarks/results/<head>.json --threshold 10
+
+A scenario regresses when its p50 or p99 latency grows, or its throughput
+drops, by more than `--threshold` percent. The exit status is 1 if any
+scenario regressed.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+# (label, getter, True when higher values are better)
+METRICS = [
+    ("p50 ms", lambda result: result["latency_ms"]["p50"], False),
+    ("p99 ms", lambda result: result["latency_ms"]["p99"], False),
+    ("req/s", lambda result: result["throughput_rps"], True),
+]
+
+
+def change_percent(base: float, head: float) -> float:
+    if base == 0:
+        return 0.0
+    return (head - base) / base * 100
+
+
+def compare(base: dict[str, Any], head: dict[str, Any], threshold: float) -> list[str]:
+    """Print a comparison table and return the regressed scenario metrics"""
+    regressions = []
+    print(f"base {base['commit']} ({base['total_rows']:,} rows)")
+    print(f"head {head['commit']} ({head['total_rows']:,} rows)\n")
+
+    for name, head_result in head["scenarios"].items():
+        base_result = base["scenarios"].get(name)
+        if base_result is None:
+            print(f"{name:<24} new scenario")
+            continue
+
+        cells = []
+        for label, getter, higher_is_better in METRICS:
+            before, after = getter(base_result), getter(head_result)
+            change = change_percent(before, after)
+            worse = -change if higher_is_better else change
+            marker = ""
+            if worse > threshold:
+                marker = " !"
+                regressions.append(f"{name} {label}")
+            cells.append(
+                f"{label} {before:>9.2f} -> {after:>9.2f} ({change:+6.1f}%){marker}"
+            )
+        print(f"{name:<24} " + "  ".join(cells))
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Allowed slowdown in percent before a metric counts as regressed",
+    )
+    args = parser.parse_args()
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    if base["total_rows"] != head["total_rows"]:
+        print("warning: the runs were made against different row counts\n")
+
+    regressions = compare(base, head, args.threshold)
+    if regressions:
+        print(f"\nRegressed beyond {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regression beyond {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
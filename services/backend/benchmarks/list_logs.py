@@ -0,0 +1,168 @@
+"""
+Compare the Prisma/Pydantic list path with the asyncpg/orjson fast path.
+
+Against the database configured in DATABASE_URL:
+
+    uv run python -m benchmarks.list_logs --limit 10000 --iterations 20
+
+Without a database, only the per-row object and serialization work:
+
+    uv run python -m benchmarks.list_logs --encode-only --limit 100000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import orjson
+from app.database import create_read_pool, disconnect_database, init_database
+from app.models.log_models import CountMode, LogModel, severity_name
+from app.services.get_logs import GetLogsParameter, GetLogsResponse, get_logs_svc
+from app.services.get_logs_fast import _JSON_OPTIONS, get_logs_fast_svc, log_entries
+from asyncpg.pgproto.pgproto import UUID
+from pydantic import BaseModel
+
+
+class _PrismaLog(BaseModel):
+    # Stand-in for the generated Prisma model, which is a Pydantic model too
+    id: str
+    severity: int
+    message: str
+    source: str
+    timestamp: datetime
+    metadata: dict
+
+
+def _report(name: str, rows: int, seconds: list[float]) -> None:
+    best = min(seconds)
+    print(
+        f"{name:<8} best {best * 1000:9.2f} ms  "
+        f"{rows / best:>12,.0f} rows/s  "
+        f"median {sorted(seconds)[len(seconds) // 2] * 1000:9.2f} ms"
+    )
+
+
+def encode_only(limit: int, iterations: int) -> None:
+    now = datetime.now(UTC)
+    # The cached source dictionary both paths map ids through
+    names = {index: f"service-{index}" for index in range(16)}
+    rows = [
+        {
+            # The UUID type asyncpg returns, not the stdlib one
+            "id": UUID(str(uuid.uuid4())),
+            "severity": 1,
+            "message": f"request {index} handled in {index % 250} ms",
+            "source_id": index % 16,
+            "timestamp": (now - timedelta(seconds=index)).replace(tzinfo=None),
+            # jsonb as asyncpg returns it
+            "metadata": f'{{"request_id": "req_{index}", "user_id": "user_{index % 97}"}}',
+        }
+        for index in range(limit)
+    ]
+
+    def prisma_path() -> bytes:
+        logs = [
+            _PrismaLog(
+                **{
+                    **row,
+                    "id": str(row["id"]),
+                    "source": names[row["source_id"]],
+                    "metadata": json.loads(row["metadata"]),
+                }
+            )
+            for row in rows
+        ]
+        response = GetLogsResponse(
+            status_code=200,
+            logs=[
+                LogModel(
+                    id=log.id,
+                    severity=severity_name(log.severity),
+                    message=log.message,
+                    source=log.source,
+                    timestamp=log.timestamp,
+                    metadata=log.metadata,
+                )
+                for log in logs
+            ],
+            count_mode=CountMode.NONE,
+            total=None,
+            total_pages=None,
+            has_more=False,
+        )
+        return response.model_dump_json().encode()
+
+    def fast_path() -> bytes:
+        return orjson.dumps(
+            {
+                "status_code": 200,
+                "logs": log_entries(rows, names),
+                "count_mode": CountMode.NONE.value,
+                "total": None,
+                "total_pages": None,
+                "has_more": False,
+                "next_cursor": None,
+            },
+            option=_JSON_OPTIONS,
+        )
+
+    for name, path in (("prisma", prisma_path), ("fast", fast_path)):
+        seconds = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            path()
+            seconds.append(time.perf_counter() - started)
+        _report(name, limit, seconds)
+
+
+async def against_database(limit: int, iterations: int) -> None:
+    db = await init_database()
+    pool = await create_read_pool()
+    try:
+        parameter = GetLogsParameter(limit=limit, count_mode=CountMode.NONE)
+
+        async def prisma_path() -> int:
+            response = await get_logs_svc(parameter, db)
+            response.model_dump_json()
+            return len(response.logs)
+
+        async def fast_path() -> int:
+            body = await get_logs_fast_svc(parameter, db, pool)
+            return len(orjson.loads(body)["logs"])
+
+        for name, path in (("prisma", prisma_path), ("fast", fast_path)):
+            # Warm up connections and the engine before measuring
+            rows = await path()
+            seconds = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await path()
+                seconds.append(time.perf_counter() - started)
+            _report(name, rows, seconds)
+    finally:
+        await pool.close()
+        await disconnect_database()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument(
+        "--encode-only",
+        action="store_true",
+        help="Skip the database and time the per-row work on synthetic rows",
+    )
+    args = parser.parse_args()
+
+    if args.encode_only:
+        encode_only(args.limit, args.iterations)
+    else:
+        asyncio.run(against_database(args.limit, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Measure latency percentiles and throughput of the API.
+
+Start the API against a seeded database, then:
+
+    uv run python -m benchmarks.run --base-url http://localhost:8000
+
+Each scenario sends `--requests` requests from `--concurrency` clients
+after a short warm-up. Results are written as JSON to
+`benchmarks/results/<commit>.json` for `benchmarks.compare`.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+WARMUP_REQUESTS = 5
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    params: dict[str, Any] = field(default_factory=dict)
+    json: Optional[Any] = None
+    # Requests per scenario are scaled down for the expensive ones
+    weight: float = 1.0
+
+
+def scenarios(total_rows: int) -> list[Scenario]:
+    deep_offset = max(0, min(total_rows - 100, 100_000))
+    return [
+        Scenario("list_shallow", "GET", "/api/v1/logs", {"limit": 100}),
+        Scenario(
+            "list_shallow_filtered",
+            "GET",
+            "/api/v1/logs",
+            {"limit": 100, "severity": "ERROR"},
+        ),
+        Scenario(
+            "list_deep_offset",
+            "GET",
+            "/api/v1/logs",
+            {"limit": 100, "offset": deep_offset},
+            weight=0.2,
+        ),
+        Scenario(
+            "list_no_count",
+            "GET",
+            "/api/v1/logs",
+            {"limit": 100, "count_mode": "none"},
+        ),
+        Scenario("aggregated", "GET", "/api/v1/logs/aggregated"),
+        Scenario(
+            "download_100k",
+            "GET",
+            "/api/v1/logs/download",
+            {"limit": 100_000},
+            weight=0.05,
+        ),
+        Scenario(
+            "create",
+            "POST",
+            "/api/v1/logs",
+            json={"severity": "INFO", "message": "benchmark", "source": "bench"},
+        ),
+        Scenario(
+            "generate_1000",
+            "POST",
+            "/api/v1/logs/generate",
+            json={"count": 1000, "days_back": 1},
+            weight=0.1,
+        ),
+    ]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int
+) -> dict[str, Any]:
+    async def send() -> tuple[float, int, int]:
+        started = time.perf_counter()
+        response = await client.request(
+            scenario.method, scenario.path, params=scenario.params, json=scenario.json
+        )
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code, len(response.content)
+
+    # Bypass the response cache, otherwise every request after the first
+    # measures a cache hit
+    client.headers["Cache-Control"] = "no-cache"
+    for _ in range(WARMUP_REQUESTS):
+        await send()
+
+    total = max(1, int(requests * scenario.weight))
+    pending = iter(range(total))
+    latencies: list[float] = []
+    errors = 0
+    transferred = 0
+
+    async def worker() -> None:
+        nonlocal errors, transferred
+        for _ in pending:
+            elapsed, status, size = await send()
+            if status >= 400:
+                errors += 1
+            latencies.append(elapsed)
+            transferred += size
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / wall, 2),
+        "bytes_per_second": round(transferred / wall),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        timeout=httpx.Timeout(300),
+        limits=httpx.Limits(max_connections=args.concurrency),
+    ) as client:
+        response = await client.get("/api/v1/logs/aggregated")
+        response.raise_for_status()
+        total_rows = response.json()["total_logs"]
+
+        results = {}
+        for scenario in scenarios(total_rows):
+            if args.only and scenario.name not in args.only:
+                continue
+            result = await run_scenario(
+                client, scenario, args.requests, args.concurrency
+            )
+            results[scenario.name] = result
+            latency = result["latency_ms"]
+            print(
+                f"{scenario.name:<24} {result['throughput_rps']:>9.1f} req/s  "
+                f"p50 {latency['p50']:>9.2f} ms  p99 {latency['p99']:>9.2f} ms  "
+                f"errors {result['errors']}"
+            )
+
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "total_rows": total_rows,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the backend API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="*", help="Scenario names to run")
+    parser.add_argument("--output", type=Path, help="Result file to write")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    output = args.output or RESULTS_DIR / f"{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Seed the benchmark database with random logs.
+
+    uv run python -m benchmarks.seed --rows 1000000 --days-back 30
+
+Rows are generated like `POST /api/v1/logs/generate` does, in concurrent
+batches that also maintain the rollups. `--seed` makes the generated
+severities, sources, messages and timestamps repeatable.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import UTC, datetime, timedelta
+
+from app.database import disconnect_database, init_database
+from app.services.generate_logs import GenerateLogsPayload, generate_logs_svc
+from app.services.log_partitions import ensure_log_partitions_svc
+
+# Largest batch accepted by the generate service
+BATCH_SIZE = 1000
+
+
+async def seed(rows: int, days_back: int, workers: int) -> None:
+    db = await init_database()
+    try:
+        await ensure_log_partitions_svc(
+            db, since=datetime.now(UTC) - timedelta(days=days_back)
+        )
+
+        batches = asyncio.Queue()
+        for offset in range(0, rows, BATCH_SIZE):
+            batches.put_nowait(min(BATCH_SIZE, rows - offset))
+
+        written = 0
+        started = time.perf_counter()
+
+        async def worker() -> None:
+            nonlocal written
+            while not batches.empty():
+                count = batches.get_nowait()
+                await generate_logs_svc(
+                    GenerateLogsPayload(count=count, days_back=days_back), db
+                )
+                written += count
+                if written % (BATCH_SIZE * 100) == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"{written:,} rows, {written / elapsed:,.0f} rows/s")
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        elapsed = time.perf_counter() - started
+        print(f"Seeded {written:,} rows in {elapsed:.1f}s")
+    finally:
+        await disconnect_database()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the benchmark database")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days-back", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asyncio.run(seed(args.rows, args.days_back, args.workers))
+
+
+if __name__ == "__main__":
+    main()
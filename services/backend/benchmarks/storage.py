@@ -0,0 +1,68 @@
+"""
+Report the on-disk size of the logs and rollup tables.
+
+    uv run python -m benchmarks.storage
+
+Heap, TOAST and index sizes are summed over every partition of the logs
+table. Run it before and after a storage migration on the same seeded
+database to compare, together with `benchmarks.run` for the query latency.
+"""
+
+import argparse
+import asyncio
+import json
+
+from app.database import disconnect_database, init_database
+
+TABLES = ["logs", "log_sources", "log_rollups"]
+
+
+async def measure() -> list[dict]:
+    db = await init_database()
+    try:
+        sizes = []
+        for table in TABLES:
+            row = await db.query_first(
+                """
+                SELECT
+                    count(*) AS "relations",
+                    COALESCE(SUM(GREATEST(c."reltuples", 0)), 0)::bigint AS "rows",
+                    COALESCE(SUM(pg_table_size(t."relid")), 0)::bigint AS "table_bytes",
+                    COALESCE(SUM(pg_indexes_size(t."relid")), 0)::bigint AS "index_bytes"
+                FROM pg_partition_tree($1::regclass) t
+                JOIN pg_class c ON c."oid" = t."relid"
+                WHERE t."isleaf"
+                """,
+                table,
+            )
+            sizes.append({"table": table, **row})
+        return sizes
+    finally:
+        await disconnect_database()
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / 1024 / 1024:,.1f} MB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report table and index sizes")
+    parser.add_argument("--json", action="store_true", help="Print JSON")
+    args = parser.parse_args()
+
+    sizes = asyncio.run(measure())
+    if args.json:
+        print(json.dumps(sizes, indent=2))
+        return
+
+    print(f"{'table':<14} {'rows':>14} {'table':>12} {'indexes':>12} {'total':>12}")
+    for size in sizes:
+        table, indexes = int(size["table_bytes"]), int(size["index_bytes"])
+        print(
+            f"{size['table']:<14} {int(size['rows']):>14,} {_megabytes(table):>12} "
+            f"{_megabytes(indexes):>12} {_megabytes(table + indexes):>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
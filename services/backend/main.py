@@ -1,14 +1,69 @@
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 
-from app.api import logs
-from app.database import get_database
-from fastapi import FastAPI
+from app.api import jobs, logs
+from app.database import (
+    connect_database,
+    database_stats,
+    db,
+    disconnect_database,
+)
+from app.services.jobs import JOB_WORKER, run_job_worker
+from app.services.log_analytics import ANALYTICS_COMPACTION, run_log_compaction
+from app.services.log_partitions import (
+    LOG_PARTITION_MAINTENANCE,
+    run_partition_maintenance,
+)
+from app.services.log_purge import LOG_PURGE_WORKER, run_log_purge_worker
+from app.services.log_stream import log_stream_hub
+from app.services.log_write_buffer import log_write_buffer
+from app.services.metrics import MetricsMiddleware, metrics_exposition
+from app.services.response_cache import response_cache
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+logger = logging.getLogger(__name__)
+
+# Background tasks started with the application
+background_tasks: list[asyncio.Task] = []
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect the database and start background work for the app's lifetime"""
+    await connect_database()
+    if log_write_buffer.enabled:
+        await log_write_buffer.start(db)
+    log_stream_hub.start()
+    if LOG_PARTITION_MAINTENANCE:
+        background_tasks.append(asyncio.create_task(run_partition_maintenance(db)))
+    if LOG_PURGE_WORKER:
+        background_tasks.append(asyncio.create_task(run_log_purge_worker(db)))
+    if ANALYTICS_COMPACTION:
+        background_tasks.append(asyncio.create_task(run_log_compaction(db)))
+    if JOB_WORKER:
+        background_tasks.append(asyncio.create_task(run_job_worker(db)))
+
+    try:
+        yield
+    finally:
+        # Stop background tasks, flush buffered writes and close the database
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        background_tasks.clear()
+        await log_write_buffer.stop()
+        await log_stream_hub.stop()
+        await disconnect_database()
+
+
 app = FastAPI(
     title="Log Dashboard API",
     description="An API for managing logs",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -18,10 +73,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the frontend read the DB and serialization times
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(logs.router, prefix="/api/v1/logs", tags=["logs"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
 
 
 @app.get("/")
@@ -31,13 +90,22 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "API is operational"}
+    health = {"status": "healthy", "message": "API is operational"}
+    if log_write_buffer.enabled:
+        health["write_buffer"] = log_write_buffer.stats()
+    if response_cache.enabled:
+        health["response_cache"] = response_cache.stats()
+    try:
+        health["database"] = await database_stats()
+    except Exception:
+        logger.exception("Failed to read database pool metrics")
+    return health
 
 
-@app.on_event("startup")
-async def startup():
-    """Initialize database connection on startup"""
-    await get_database()
+@app.get("/metrics")
+async def metrics():
+    body, content_type = await metrics_exposition()
+    return Response(content=body, media_type=content_type)
 
 
 if __name__ == "__main__":
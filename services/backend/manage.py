@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from app.database import disconnect_database, init_database
+from app.services.generate_logs import LOG_MESSAGES, LOG_SOURCES
+from app.services.log_analytics import compact_logs_svc, touch_log_day_range
+from app.services.log_partitions import (
+    LOG_ARCHIVE_AFTER_DAYS,
+    LOG_RETENTION_DAYS,
+    archive_log_partitions_svc,
+    drop_expired_log_partitions_svc,
+    ensure_log_partitions_svc,
+)
+from app.services.log_patterns import (
+    PATTERN_BACKFILL_BATCH_SIZE,
+    backfill_log_patterns_svc,
+    log_patterns,
+)
+from app.services.log_purge import (
+    LOG_PURGE_BATCH_SIZE,
+    PENDING,
+    RUNNING,
+    LogPurgeParameter,
+    create_log_purge_svc,
+    run_log_purge_job,
+)
+from app.services.log_rollups import rebuild_log_rollups_svc
+from app.services.log_sources import log_sources
+from app.services.synthetic_logs import (
+    DEFAULT_SEVERITY_RATIOS,
+    SyntheticLogsConfig,
+    generate_synthetic_logs,
+    parse_severity_ratios,
+)
+
+
+async def rebuild_rollups(args: argparse.Namespace) -> None:
+    """Recompute the log rollups from the raw logs"""
+    db = await init_database()
+    try:
+        days = await rebuild_log_rollups_svc(db, args.start_date, args.end_date)
+        print(f"Rebuilt rollups for {days} day(s)")
+    finally:
+        await disconnect_database()
+
+
+async def maintain_partitions(args: argparse.Namespace) -> None:
+    """Create upcoming log partitions, drop the expired ones and archive old ones"""
+    db = await init_database()
+    try:
+        created = await ensure_log_partitions_svc(db, since=args.since)
+        dropped = await drop_expired_log_partitions_svc(db, args.retention_days)
+        archived = await archive_log_partitions_svc(db, args.archive_after_days)
+        print(f"Created {len(created)} partition(s): {', '.join(created) or '-'}")
+        print(f"Dropped {len(dropped)} partition(s): {', '.join(dropped) or '-'}")
+        print(f"Archived {len(archived)} partition(s): {', '.join(archived) or '-'}")
+    finally:
+        await disconnect_database()
+
+
+async def purge_logs(args: argparse.Namespace) -> None:
+    """Delete the logs matching a filter in batches, or resume a purge"""
+    db = await init_database()
+    try:
+        job_id = args.resume
+        if job_id is None:
+            parameter = LogPurgeParameter(
+                severity=args.severity,
+                min_severity=args.min_severity,
+                source=args.source,
+                source_prefix=args.source_prefix,
+                start_date=args.start_date,
+                end_date=args.end_date,
+            )
+            job = await create_log_purge_svc(parameter, db, args.batch_size, "cli")
+            job_id = job.id
+            print(f"Purge {job_id} queued")
+
+        # Claim the job for this process, a job left running by a dead
+        # worker can be resumed the same way
+        await db.logpurgejob.update_many(
+            where={"id": job_id, "status": {"in": [PENDING, RUNNING]}},
+            data={"status": RUNNING},
+        )
+        await run_log_purge_job(job_id, db, lambda total: print(f"{total:,} rows"))
+        job = await db.logpurgejob.find_unique(where={"id": job_id})
+        print(f"Purge {job_id} {job.status}, {job.deleted:,} rows deleted")
+    finally:
+        await disconnect_database()
+
+
+async def backfill_patterns(args: argparse.Namespace) -> None:
+    """Fingerprint the logs stored without a pattern and rebuild their rollups"""
+    db = await init_database()
+    try:
+        updated, first, last = await backfill_log_patterns_svc(
+            db,
+            args.batch_size,
+            lambda total: print(f"{total:,} rows"),
+            all_rows=args.all,
+        )
+        print(f"Fingerprinted {updated:,} log(s)")
+        if updated and not args.skip_rollups:
+            days = await rebuild_log_rollups_svc(db, first, last)
+            print(f"Rebuilt rollups for {days} day(s)")
+    finally:
+        await disconnect_database()
+
+
+async def compact_logs(args: argparse.Namespace) -> None:
+    """Compact the closed days that changed into Parquet files for analytics"""
+    db = await init_database()
+    try:
+        days = await compact_logs_svc(
+            db, lambda day, rows: print(f"{day.isoformat()}: {rows:,} rows")
+        )
+        print(f"Compacted {days} day(s)")
+    finally:
+        await disconnect_database()
+
+
+async def generate_logs(args: argparse.Namespace) -> None:
+    """Load synthetic logs with COPY and rebuild the rollups of their range"""
+    end = datetime.now(UTC)
+    config = SyntheticLogsConfig(
+        rows=args.rows,
+        start=end - timedelta(days=args.days_back),
+        end=end,
+        seed=args.seed,
+        severity_ratios=args.severity_ratios,
+        zipf_exponent=args.zipf_exponent,
+        diurnal_amplitude=args.diurnal_amplitude,
+        bursts_per_day=args.bursts_per_day,
+        burst_multiplier=args.burst_multiplier,
+        batch_size=args.batch_size,
+    )
+
+    db = await init_database()
+    try:
+        await ensure_log_partitions_svc(db, since=config.start)
+        source_ids = await log_sources.ids(db, LOG_SOURCES)
+        config.source_ids = [source_ids[source] for source in LOG_SOURCES]
+        await log_patterns.register(
+            db, (message for messages in LOG_MESSAGES.values() for message in messages)
+        )
+
+        def progress(written: int, elapsed: float) -> None:
+            print(
+                f"{written:,} rows in {elapsed:.1f}s, {written / elapsed * 60:,.0f}/min"
+            )
+
+        await asyncio.to_thread(generate_synthetic_logs, config, args.workers, progress)
+        # COPY bypasses the services, so nothing else invalidates compactions
+        await touch_log_day_range(db, config.start, config.end)
+
+        if not args.skip_rollups:
+            days = await rebuild_log_rollups_svc(db, config.start, config.end)
+            print(f"Rebuilt rollups for {days} day(s)")
+    finally:
+        await disconnect_database()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Log Dashboard management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-rollups", help="Recompute the log rollups from the raw logs"
+    )
+    rebuild.add_argument("--start-date", type=datetime.fromisoformat)
+    rebuild.add_argument("--end-date", type=datetime.fromisoformat)
+    rebuild.set_defaults(handler=rebuild_rollups)
+
+    partitions = commands.add_parser(
+        "maintain-partitions",
+        help="Create upcoming log partitions, drop expired ones and archive old ones",
+    )
+    partitions.add_argument(
+        "--retention-days",
+        type=int,
+        default=LOG_RETENTION_DAYS,
+        help="Drop partitions older than this many days, 0 keeps everything",
+    )
+    partitions.add_argument(
+        "--archive-after-days",
+        type=int,
+        default=LOG_ARCHIVE_AFTER_DAYS,
+        help="Archive partitions older than this many days, 0 keeps them hot",
+    )
+    partitions.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Also create partitions back to this date, e.g. before a backfill",
+    )
+    partitions.set_defaults(handler=maintain_partitions)
+
+    purge = commands.add_parser(
+        "purge-logs", help="Delete the logs matching a filter in batches"
+    )
+    purge.add_argument("--severity")
+    purge.add_argument("--min-severity")
+    purge.add_argument("--source")
+    purge.add_argument("--source-prefix")
+    purge.add_argument("--start-date", type=datetime.fromisoformat)
+    purge.add_argument("--end-date", type=datetime.fromisoformat)
+    purge.add_argument("--batch-size", type=int, default=LOG_PURGE_BATCH_SIZE)
+    purge.add_argument(
+        "--resume", metavar="JOB_ID", help="Continue an interrupted purge instead"
+    )
+    purge.set_defaults(handler=purge_logs)
+
+    backfill = commands.add_parser(
+        "backfill-patterns",
+        help="Fingerprint the messages of logs stored without a pattern",
+    )
+    backfill.add_argument("--batch-size", type=int, default=PATTERN_BACKFILL_BATCH_SIZE)
+    backfill.add_argument(
+        "--all",
+        action="store_true",
+        help="Fingerprint every log again, after the masks changed",
+    )
+    backfill.add_argument(
+        "--skip-rollups",
+        action="store_true",
+        help="Don't rebuild the rollups of the fingerprinted range afterwards",
+    )
+    backfill.set_defaults(handler=backfill_patterns)
+
+    compact = commands.add_parser(
+        "compact-logs",
+        help="Write the closed days that changed to the analytics Parquet files",
+    )
+    compact.set_defaults(handler=compact_logs)
+
+    generate = commands.add_parser(
+        "generate-logs",
+        help="Load synthetic logs with realistic distributions through COPY",
+    )
+    generate.add_argument("--rows", type=int, required=True)
+    generate.add_argument("--days-back", type=int, default=30)
+    generate.add_argument("--workers", type=int, default=4)
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--batch-size", type=int, default=100_000)
+    generate.add_argument(
+        "--severity-ratios",
+        type=parse_severity_ratios,
+        default=dict(DEFAULT_SEVERITY_RATIOS),
+        help="Relative weights like DEBUG=20,INFO=60,WARN=12,ERROR=7,FATAL=1",
+    )
+    generate.add_argument(
+        "--zipf-exponent",
+        type=float,
+        default=1.1,
+        help="Skew of the source distribution, 0 spreads sources evenly",
+    )
+    generate.add_argument("--diurnal-amplitude", type=float, default=0.6)
+    generate.add_argument("--bursts-per-day", type=float, default=2.0)
+    generate.add_argument("--burst-multiplier", type=float, default=8.0)
+    generate.add_argument(
+        "--skip-rollups",
+        action="store_true",
+        help="Don't rebuild the rollups of the generated range afterwards",
+    )
+    generate.set_defaults(handler=generate_logs)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
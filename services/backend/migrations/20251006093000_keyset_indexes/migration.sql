@@ -0,0 +1,17 @@
+-- DropIndex
+DROP INDEX "logs_severity_idx";
+
+-- DropIndex
+DROP INDEX "logs_timestamp_idx";
+
+-- DropIndex
+DROP INDEX "logs_source_idx";
+
+-- CreateIndex
+CREATE INDEX "logs_timestamp_id_idx" ON "logs"("timestamp", "id");
+
+-- CreateIndex
+CREATE INDEX "logs_severity_timestamp_id_idx" ON "logs"("severity", "timestamp", "id");
+
+-- CreateIndex
+CREATE INDEX "logs_source_timestamp_id_idx" ON "logs"("source", "timestamp", "id");
@@ -0,0 +1,17 @@
+-- CreateTable
+CREATE TABLE "log_rollups" (
+    "granularity" TEXT NOT NULL,
+    "bucket" TIMESTAMP(3) NOT NULL,
+    "severity" TEXT NOT NULL,
+    "source" TEXT NOT NULL,
+    "count" BIGINT NOT NULL,
+
+    CONSTRAINT "log_rollups_pkey" PRIMARY KEY ("granularity","bucket","severity","source")
+);
+
+-- Backfill rollups from existing logs
+INSERT INTO "log_rollups" ("granularity", "bucket", "severity", "source", "count")
+SELECT g."granularity", date_trunc(g."granularity", l."timestamp"), l."severity", l."source", count(*)
+FROM "logs" l
+CROSS JOIN (VALUES ('day'), ('hour'), ('minute')) AS g("granularity")
+GROUP BY 1, 2, 3, 4;
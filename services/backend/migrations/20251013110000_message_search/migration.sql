@@ -0,0 +1,5 @@
+-- CreateExtension
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+-- CreateIndex
+CREATE INDEX "logs_message_idx" ON "logs" USING GIN ("message" gin_trgm_ops);
@@ -0,0 +1,62 @@
+-- Move the existing table out of the way
+ALTER TABLE "logs" RENAME TO "logs_unpartitioned";
+ALTER TABLE "logs_unpartitioned" RENAME CONSTRAINT "logs_pkey" TO "logs_unpartitioned_pkey";
+DROP INDEX "logs_timestamp_id_idx";
+DROP INDEX "logs_severity_timestamp_id_idx";
+DROP INDEX "logs_source_timestamp_id_idx";
+DROP INDEX "logs_message_idx";
+
+-- CreateTable
+CREATE TABLE "logs" (
+    "id" UUID NOT NULL,
+    "severity" TEXT NOT NULL,
+    "message" TEXT NOT NULL,
+    "source" TEXT NOT NULL,
+    "timestamp" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "logs_pkey" PRIMARY KEY ("id","timestamp")
+) PARTITION BY RANGE ("timestamp");
+
+-- Rows outside every daily partition land here until a partition is created for them
+CREATE TABLE "logs_default" PARTITION OF "logs" DEFAULT;
+
+-- Daily partitions covering the existing data and the coming week
+DO $$
+DECLARE
+    day DATE;
+    last_day DATE;
+BEGIN
+    SELECT
+        COALESCE(min("timestamp")::date, current_date),
+        GREATEST(COALESCE(max("timestamp")::date, current_date), current_date) + 7
+    INTO day, last_day
+    FROM "logs_unpartitioned";
+
+    WHILE day <= last_day LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF "logs" FOR VALUES FROM (%L) TO (%L)',
+            'logs_p' || to_char(day, 'YYYYMMDD'),
+            day::timestamp,
+            (day + 1)::timestamp
+        );
+        day := day + 1;
+    END LOOP;
+END $$;
+
+-- Copy the data over
+INSERT INTO "logs" SELECT * FROM "logs_unpartitioned";
+
+-- DropTable
+DROP TABLE "logs_unpartitioned";
+
+-- CreateIndex
+CREATE INDEX "logs_timestamp_id_idx" ON "logs"("timestamp", "id");
+
+-- CreateIndex
+CREATE INDEX "logs_severity_timestamp_id_idx" ON "logs"("severity", "timestamp", "id");
+
+-- CreateIndex
+CREATE INDEX "logs_source_timestamp_id_idx" ON "logs"("source", "timestamp", "id");
+
+-- CreateIndex
+CREATE INDEX "logs_message_idx" ON "logs" USING GIN ("message" gin_trgm_ops);
@@ -0,0 +1,12 @@
+-- AlterTable
+-- A constant default is stored in the catalog, existing partitions are not rewritten
+ALTER TABLE "logs" ADD COLUMN "metadata" JSONB NOT NULL DEFAULT '{}';
+
+-- CreateIndex
+-- jsonb_path_ops only supports containment (@>), which keeps the index small
+CREATE INDEX "logs_metadata_idx" ON "logs" USING GIN ("metadata" jsonb_path_ops);
+
+-- Promoted keys, matched with ("metadata" ->> 'key') = value
+CREATE INDEX "logs_metadata_request_id_idx" ON "logs" (("metadata" ->> 'request_id'), "timestamp");
+CREATE INDEX "logs_metadata_user_id_idx" ON "logs" (("metadata" ->> 'user_id'), "timestamp");
+CREATE INDEX "logs_metadata_transaction_id_idx" ON "logs" (("metadata" ->> 'transaction_id'), "timestamp");
@@ -0,0 +1,3 @@
+-- CreateIndex
+-- Serves `severity IN (...) AND source IN (...)` filters within a time range
+CREATE INDEX "logs_severity_source_timestamp_idx" ON "logs"("severity", "source", "timestamp");
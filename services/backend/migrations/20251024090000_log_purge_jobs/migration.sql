@@ -0,0 +1,20 @@
+-- CreateTable
+CREATE TABLE "log_purge_jobs" (
+    "id" UUID NOT NULL,
+    "status" TEXT NOT NULL,
+    "reason" TEXT NOT NULL,
+    "filter" JSONB NOT NULL,
+    "batch_size" INTEGER NOT NULL,
+    "cursor" TIMESTAMP(3),
+    "deleted" BIGINT NOT NULL DEFAULT 0,
+    "batches" INTEGER NOT NULL DEFAULT 0,
+    "error" TEXT,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "finished_at" TIMESTAMP(3),
+
+    CONSTRAINT "log_purge_jobs_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "log_purge_jobs_status_created_at_idx" ON "log_purge_jobs"("status", "created_at");
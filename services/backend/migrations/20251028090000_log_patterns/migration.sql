@@ -0,0 +1,29 @@
+-- AlterTable
+-- Nullable so adding it doesn't rewrite the partitions, existing rows are
+-- fingerprinted by `manage.py backfill-patterns`
+ALTER TABLE "logs" ADD COLUMN "pattern_id" BIGINT;
+
+-- CreateTable
+CREATE TABLE "log_patterns" (
+    "pattern_id" BIGINT NOT NULL,
+    "template" TEXT NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "log_patterns_pkey" PRIMARY KEY ("pattern_id")
+);
+
+-- CreateTable
+CREATE TABLE "log_pattern_rollups" (
+    "granularity" TEXT NOT NULL,
+    "bucket" TIMESTAMP(3) NOT NULL,
+    "severity" TEXT NOT NULL,
+    "source" TEXT NOT NULL,
+    "pattern_id" BIGINT NOT NULL,
+    "count" BIGINT NOT NULL,
+
+    CONSTRAINT "log_pattern_rollups_pkey" PRIMARY KEY ("granularity","bucket","severity","source","pattern_id")
+);
+
+-- CreateIndex
+-- Serves the first/last seen lookups of a single pattern
+CREATE INDEX "log_pattern_rollups_pattern_id_granularity_bucket_idx" ON "log_pattern_rollups"("pattern_id", "granularity", "bucket");
@@ -0,0 +1,20 @@
+-- CreateTable
+-- Bumped in the transaction of every write to a closed day, a compaction
+-- is only read while its version still matches
+CREATE TABLE "log_day_versions" (
+    "day" DATE NOT NULL,
+    "version" BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT "log_day_versions_pkey" PRIMARY KEY ("day")
+);
+
+-- CreateTable
+CREATE TABLE "log_compactions" (
+    "day" DATE NOT NULL,
+    "version" BIGINT NOT NULL,
+    "rows" BIGINT NOT NULL,
+    "bytes" BIGINT NOT NULL,
+    "compacted_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "log_compactions_pkey" PRIMARY KEY ("day")
+);
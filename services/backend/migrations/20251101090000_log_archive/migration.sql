@@ -0,0 +1,39 @@
+-- CreateTable
+-- zstd dictionaries trained on the rows of an archived partition
+CREATE TABLE "log_archive_dictionaries" (
+    "id" SERIAL NOT NULL,
+    "data" BYTEA NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "log_archive_dictionaries_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateTable
+-- Archived logs of one source within one hour, as a zstd compressed JSON
+-- array. The other columns summarize the block so readers can skip it.
+CREATE TABLE "log_archive_blocks" (
+    "id" BIGSERIAL NOT NULL,
+    "dictionary_id" INTEGER,
+    "source_id" INTEGER NOT NULL,
+    "start_time" TIMESTAMP(3) NOT NULL,
+    "end_time" TIMESTAMP(3) NOT NULL,
+    "min_id" UUID NOT NULL,
+    "max_id" UUID NOT NULL,
+    "severities" "LogSeverity"[] NOT NULL,
+    "rows" INTEGER NOT NULL,
+    "raw_bytes" INTEGER NOT NULL,
+    "data" BYTEA NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "log_archive_blocks_pkey" PRIMARY KEY ("id")
+);
+
+-- The blocks are compressed already, keep TOAST from trying again
+ALTER TABLE "log_archive_blocks" ALTER COLUMN "data" SET STORAGE EXTERNAL;
+
+-- CreateIndex
+CREATE INDEX "log_archive_blocks_start_time_idx" ON "log_archive_blocks"("start_time");
+
+-- CreateIndex
+-- Serves the lookups by id, uuid7 ids keep the ranges narrow
+CREATE INDEX "log_archive_blocks_min_id_max_id_idx" ON "log_archive_blocks"("min_id", "max_id");
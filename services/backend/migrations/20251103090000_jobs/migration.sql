@@ -0,0 +1,20 @@
+-- CreateTable
+CREATE TABLE "jobs" (
+    "id" UUID NOT NULL,
+    "kind" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "parameters" JSONB NOT NULL,
+    "checkpoint" TEXT,
+    "rows" BIGINT NOT NULL DEFAULT 0,
+    "total" BIGINT,
+    "bytes" BIGINT NOT NULL DEFAULT 0,
+    "error" TEXT,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "finished_at" TIMESTAMP(3),
+
+    CONSTRAINT "jobs_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "jobs_status_created_at_idx" ON "jobs"("status", "created_at");
@@ -0,0 +1,14 @@
+-- AlterTable
+-- Severity as a 2 byte code instead of the 4 byte enum, in the same level
+-- order so sorting and min_severity ranges are unchanged. The codes match
+-- SEVERITY_CODES in app/models/log_models.py. Rewrites every partition
+-- and rebuilds the indexes on the column.
+ALTER TABLE "logs" ALTER COLUMN "severity" TYPE SMALLINT USING (
+    CASE "severity"
+        WHEN 'DEBUG' THEN 0
+        WHEN 'INFO' THEN 1
+        WHEN 'WARN' THEN 2
+        WHEN 'ERROR' THEN 3
+        WHEN 'FATAL' THEN 4
+    END
+);
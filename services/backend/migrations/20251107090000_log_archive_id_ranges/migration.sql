@@ -0,0 +1,13 @@
+-- CreateType
+-- Closed uuid ranges, a block's id range is one of them
+CREATE TYPE "uuidrange" AS RANGE (subtype = uuid);
+
+-- DropIndex
+-- A B-tree on (min_id, max_id) can only bound "min_id" <= id, so a lookup
+-- scanned every block with a lower min_id
+DROP INDEX "log_archive_blocks_min_id_max_id_idx";
+
+-- CreateIndex
+-- Serves `uuidrange("min_id", "max_id", '[]') @> id` lookups by id
+CREATE INDEX "log_archive_blocks_id_range_idx" ON "log_archive_blocks"
+    USING GIST (uuidrange("min_id", "max_id", '[]'));
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import UTC, datetime
+from types import SimpleNamespace
+
+import pytest
+from app.utils.cursor import InvalidCursorError, decode_cursor, encode_cursor
+
+LOG = SimpleNamespace(
+    id="0192f5d4-3c1e-7a5b-8c2d-4e6f8a0b1c2d",
+    timestamp=datetime(2025, 1, 2, 3, 4, 5, 678000, tzinfo=UTC),
+    severity="ERROR",
+    source="billing",
+)
+
+
+def _cursor(payload: dict) -> str:
+    data = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "sort_by, expected",
+    [
+        ("timestamp", [LOG.timestamp, LOG.id]),
+        ("severity", ["ERROR", LOG.timestamp, LOG.id]),
+        ("source", ["billing", LOG.timestamp, LOG.id]),
+    ],
+)
+def test_cursor_round_trip(sort_by, expected):
+    cursor = encode_cursor(sort_by, "desc", LOG)
+
+    assert decode_cursor(cursor, sort_by, "desc") == expected
+
+
+def test_cursor_must_match_the_sort():
+    cursor = encode_cursor("timestamp", "desc", LOG)
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "timestamp", "asc")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "severity", "desc")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        "e30",  # {}
+        _cursor({"s": "timestamp", "o": "desc", "k": ["2025-01-02T03:04:05"]}),
+        _cursor({"s": "timestamp", "o": "desc", "k": [12, LOG.id]}),
+        _cursor({"s": "timestamp", "o": "desc", "k": ["yesterday", LOG.id]}),
+        _cursor({"s": "timestamp", "o": "desc", "k": ["2025-01-02", "1 OR 1=1"]}),
+        _cursor({"s": "timestamp", "o": "desc", "k": ["2025-01-02", {"a": 1}]}),
+        _cursor({"s": "source", "o": "desc", "k": [7, "2025-01-02", LOG.id]}),
+        _cursor({"s": "source", "o": "desc", "k": [True, "2025-01-02", LOG.id]}),
+        _cursor({"s": "severity", "o": "desc", "k": ["LOUD", "2025-01-02", LOG.id]}),
+        _cursor({"s": "severity", "o": "desc", "k": [3, "2025-01-02", LOG.id]}),
+    ],
+)
+def test_tampered_cursor_is_rejected(cursor):
+    sort_by = "timestamp"
+    if cursor not in {"not a cursor", "e30"}:
+        sort_by = json.loads(base64.urlsafe_b64decode(cursor + "==="))["s"]
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, sort_by, "desc")
@@ -0,0 +1,154 @@
+import asyncio
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import zstandard
+from app.services import export_logs
+from app.services.export_logs import (
+    EXPORT_COLUMNS,
+    ExportLogsParameter,
+    UnsupportedExportError,
+    export_logs_svc,
+    export_next_cursor,
+)
+from app.services.log_sources import log_sources
+from app.utils.cursor import decode_cursor
+
+START = datetime(2025, 1, 2, 3, 0)
+
+
+def _rows(count):
+    return [
+        {
+            "id": str(uuid.UUID(int=index + 1)),
+            "severity": 1,
+            "message": f"message {index}",
+            "source_id": 1,
+            "timestamp": START - timedelta(seconds=index),
+            "metadata": {},
+        }
+        for index in range(count)
+    ]
+
+
+def _fake_logs(monkeypatch, rows):
+    calls = []
+
+    async def find_logs(parameter, position, skip, take, db):
+        calls.append((position, skip, take))
+        if position is None:
+            offset = skip
+        else:
+            offset = next(
+                index + 1
+                for index, row in enumerate(rows)
+                if [row["timestamp"], row["id"]] == position
+            )
+        return rows[offset : offset + take]
+
+    async def names(db, ids):
+        return {1: "api"}
+
+    monkeypatch.setattr(export_logs, "find_logs", find_logs)
+    monkeypatch.setattr(log_sources, "names", names)
+    return calls
+
+
+def test_first_chunk_streams_before_the_tail_is_read(monkeypatch):
+    calls = _fake_logs(monkeypatch, _rows(5))
+    parameter = ExportLogsParameter(limit=5, format="ndjson")
+
+    async def first_chunk():
+        chunks = export_logs_svc(parameter, None, batch_size=2)
+        chunk = await anext(chunks)
+        fetched = list(calls)
+        rest = [chunk async for chunk in chunks]
+        return chunk, fetched, rest
+
+    chunk, fetched, rest = asyncio.run(first_chunk())
+
+    assert chunk.count(b"\n") == 2
+    # Only the first batch was queried, no probe at the end of the export
+    assert fetched == [(None, 0, 2)]
+    assert sum(part.count(b"\n") for part in rest) == 3
+    assert [take for _, _, take in calls] == [2, 2, 1]
+    assert all(skip == 0 for _, skip, _ in calls)
+
+
+def test_next_cursor_seeks_one_row_past_the_export(monkeypatch):
+    rows = _rows(3)
+    calls = _fake_logs(monkeypatch, rows)
+    parameter = ExportLogsParameter(limit=2)
+
+    async def last_cursor(parameter):
+        cursor = None
+        async for _, cursor in export_logs.iter_log_pages(parameter, None):
+            pass
+        return cursor
+
+    cursor = asyncio.run(last_cursor(parameter))
+    calls.clear()
+
+    assert asyncio.run(export_next_cursor(parameter, None, cursor)) == cursor
+    assert decode_cursor(cursor, "timestamp", "desc") == [
+        rows[1]["timestamp"],
+        rows[1]["id"],
+    ]
+    assert calls == [([rows[1]["timestamp"], rows[1]["id"]], 0, 1)]
+
+    parameter = ExportLogsParameter(limit=3)
+    cursor = asyncio.run(last_cursor(parameter))
+    assert asyncio.run(export_next_cursor(parameter, None, cursor)) is None
+
+
+def _export(monkeypatch, **parameters) -> bytes:
+    _fake_logs(monkeypatch, _rows(5))
+    parameter = ExportLogsParameter(**parameters)
+
+    async def collect():
+        return b"".join([chunk async for chunk in export_logs_svc(parameter, None, 2)])
+
+    return asyncio.run(collect())
+
+
+def test_csv_export(monkeypatch):
+    lines = _export(monkeypatch).decode().splitlines()
+
+    assert lines[0] == ",".join(EXPORT_COLUMNS)
+    assert len(lines) == 6
+    assert lines[1].split(",")[1:4] == ["INFO", "message 0", "api"]
+
+
+def test_compressed_ndjson_export(monkeypatch):
+    data = _export(monkeypatch, format="ndjson", compression="gzip")
+
+    records = [json.loads(line) for line in gzip.decompress(data).splitlines()]
+    assert [record["message"] for record in records][:2] == ["message 0", "message 1"]
+    assert records[0]["timestamp"] == "2025-01-02T03:00:00+00:00"
+
+    data = _export(monkeypatch, format="ndjson", compression="zstd")
+    text = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    assert len(text.splitlines()) == 5
+
+
+def test_columnar_exports(monkeypatch):
+    data = _export(monkeypatch, format="arrow", compression="zstd")
+    table = pa.ipc.open_stream(data).read_all()
+    assert table.num_rows == 5
+    assert pa.types.is_dictionary(table.schema.field("source").type)
+    assert table.column("source").to_pylist() == ["api"] * 5
+
+    data = _export(monkeypatch, format="parquet", compression="zstd")
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column("message").to_pylist()[-1] == "message 4"
+
+
+def test_arrow_exports_refuse_gzip():
+    with pytest.raises(UnsupportedExportError):
+        export_logs_svc(ExportLogsParameter(format="arrow", compression="gzip"), None)
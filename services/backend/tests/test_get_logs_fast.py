@@ -0,0 +1,38 @@
+import json
+import uuid
+from datetime import datetime
+
+import orjson
+from app.services.get_logs_fast import _JSON_OPTIONS, log_entries
+from asyncpg.pgproto.pgproto import UUID
+
+
+def test_log_entries_serialize_asyncpg_rows():
+    log_id = str(uuid.uuid4())
+    # Shaped like an asyncpg record: its own UUID type, naive UTC timestamp
+    # severity code and jsonb as text
+    rows = [
+        {
+            "id": UUID(log_id),
+            "severity": 3,
+            "message": "Database connection failed",
+            "source_id": 3,
+            "timestamp": datetime(2025, 1, 2, 3, 4, 5, 678000),
+            "metadata": '{"request_id": "req_1"}',
+        }
+    ]
+
+    body = json.loads(
+        orjson.dumps(log_entries(rows, {3: "database"}), option=_JSON_OPTIONS)
+    )
+
+    assert body == [
+        {
+            "id": log_id,
+            "severity": "ERROR",
+            "message": "Database connection failed",
+            "source": "database",
+            "timestamp": "2025-01-02T03:04:05.678000Z",
+            "metadata": {"request_id": "req_1"},
+        }
+    ]
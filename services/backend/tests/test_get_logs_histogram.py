@@ -0,0 +1,73 @@
+import asyncio
+from datetime import UTC, datetime
+
+import pytest
+from app.services import get_logs_histogram
+from app.services.get_logs_histogram import (
+    GetLogsHistogramParameter,
+    HistogramRangeError,
+    get_logs_histogram_svc,
+)
+
+
+def test_histogram_fills_empty_buckets(monkeypatch):
+    async def rollups(parameter, plan, step, db):
+        return [{"bucket": "2025-01-02T01:00:00", "key": "ERROR", "count": 4}]
+
+    async def raw_logs(parameter, plan, step, db):
+        return [{"bucket": "2025-01-02T03:00:00", "key": "INFO", "count": 2}]
+
+    monkeypatch.setattr(get_logs_histogram, "_query_rollups", rollups)
+    monkeypatch.setattr(get_logs_histogram, "_query_raw_logs", raw_logs)
+    parameter = GetLogsHistogramParameter(
+        start_date="2025-01-02T00:00:00Z",
+        end_date="2025-01-02T03:30:00Z",
+        interval="1h",
+        split_by="severity",
+    )
+
+    response = asyncio.run(get_logs_histogram_svc(parameter, None))
+
+    assert response.buckets == [
+        datetime(2025, 1, 2, hour, tzinfo=UTC) for hour in range(4)
+    ]
+    assert response.counts == [0, 4, 0, 2]
+    assert response.series["ERROR"] == [0, 4, 0, 0]
+    assert response.series["INFO"] == [0, 0, 0, 2]
+    assert response.series["FATAL"] == [0, 0, 0, 0]
+
+
+def test_searches_read_raw_rows_only(monkeypatch):
+    plans = []
+
+    async def rollups(parameter, plan, step, db):
+        raise AssertionError("rollups don't know messages")
+
+    async def raw_logs(parameter, plan, step, db):
+        plans.append(plan)
+        return []
+
+    monkeypatch.setattr(get_logs_histogram, "_query_rollups", rollups)
+    monkeypatch.setattr(get_logs_histogram, "_query_raw_logs", raw_logs)
+    parameter = GetLogsHistogramParameter(
+        start_date="2025-01-01T00:00:00Z",
+        end_date="2025-01-03T00:00:00Z",
+        interval="1h",
+        q="timeout",
+    )
+
+    response = asyncio.run(get_logs_histogram_svc(parameter, None))
+
+    assert len(response.buckets) == 49
+    assert plans[0].rollup == []
+
+
+def test_too_many_buckets_are_refused():
+    parameter = GetLogsHistogramParameter(
+        start_date="2024-01-01T00:00:00Z",
+        end_date="2025-01-01T00:00:00Z",
+        interval="1m",
+    )
+
+    with pytest.raises(HistogramRangeError):
+        asyncio.run(get_logs_histogram_svc(parameter, None))
@@ -0,0 +1,82 @@
+import asyncio
+import gzip
+
+import pytest
+from app.services import ingest_logs
+from app.services.ingest_logs import (
+    IngestPayloadError,
+    IngestPayloadTooLargeError,
+    ingest_logs_svc,
+    read_ingest_body,
+)
+
+VALID = {"severity": "INFO", "message": "hi", "source": "api"}
+
+
+async def _stream(data: bytes, size: int = 1000):
+    for offset in range(0, len(data), size):
+        yield data[offset : offset + size]
+
+
+def _read(data: bytes, encoding=None, max_bytes=1 << 20) -> bytes:
+    return asyncio.run(read_ingest_body(_stream(data), encoding, max_bytes))
+
+
+def test_read_plain_body():
+    assert _read(b'[{"message": "hi"}]') == b'[{"message": "hi"}]'
+
+
+def test_read_multi_member_gzip():
+    body = gzip.compress(b'{"a": 1}\n') + gzip.compress(b'{"b": 2}\n')
+
+    assert _read(body, "gzip") == b'{"a": 1}\n{"b": 2}\n'
+
+
+def test_gzip_bomb_is_cut_off():
+    bomb = gzip.compress(b"\0" * (50 << 20))
+
+    with pytest.raises(IngestPayloadTooLargeError):
+        _read(bomb, "gzip", max_bytes=1 << 20)
+
+
+def test_plain_body_over_limit():
+    with pytest.raises(IngestPayloadTooLargeError):
+        _read(b"x" * 5000, max_bytes=4096)
+
+
+@pytest.mark.parametrize(
+    "body", [b"not gzip at all", gzip.compress(b'{"a": 1}\n' * 100)[:-10]]
+)
+def test_invalid_gzip(body):
+    with pytest.raises(IngestPayloadError):
+        _read(body, "gzip")
+
+
+def test_all_invalid_items_are_unprocessable():
+    items = [{"severity": "LOUD", "message": "hi", "source": "api"}, "not a log"]
+
+    result = asyncio.run(ingest_logs_svc(items, [], None))
+
+    assert result.status_code == 422
+    assert result.accepted == 0
+    assert [error.index for error in result.errors] == [0, 1]
+
+
+def test_partially_invalid_batch(monkeypatch):
+    written = []
+
+    async def write_chunk(rows, db):
+        written.extend(rows)
+
+    async def noop(*args):
+        pass
+
+    monkeypatch.setattr(ingest_logs, "_write_chunk", write_chunk)
+    monkeypatch.setattr(ingest_logs.response_cache, "invalidate", noop)
+    monkeypatch.setattr(ingest_logs.log_stream_hub, "publish", noop)
+
+    result = asyncio.run(ingest_logs_svc([VALID, {"message": 1}, VALID], [], None))
+
+    assert result.status_code == 207
+    assert (result.accepted, result.rejected) == (2, 1)
+    assert len(written) == 2
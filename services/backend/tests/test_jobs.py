@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from types import SimpleNamespace
+
+from app.services import export_logs, jobs
+from app.services.jobs import DONE, RUNNING, _job_model, run_job
+from app.services.log_sources import log_sources
+
+START = datetime(2025, 1, 2, 3, 0)
+
+ROWS = [
+    {
+        "id": str(uuid.UUID(int=index + 1)),
+        "severity": 1,
+        "message": f"message {index}",
+        "source_id": 1,
+        "timestamp": START - timedelta(seconds=index),
+        "metadata": {},
+    }
+    for index in range(5)
+]
+
+
+class FakeJobs:
+    def __init__(self, job, cancel_after=None) -> None:
+        self.job = job
+        self.cancel_after = cancel_after
+        self.updates: list[dict] = []
+
+    async def find_unique(self, where):
+        return self.job
+
+    async def update_many(self, where, data):
+        if self.cancel_after is not None and len(self.updates) >= self.cancel_after:
+            return 0
+        self.updates.append(data)
+        for key, value in data.items():
+            setattr(self.job, key, value)
+        return 1
+
+
+def _job(parameters, **progress):
+    job = SimpleNamespace(
+        id=str(uuid.uuid4()),
+        kind="export",
+        status=RUNNING,
+        parameters=parameters,
+        checkpoint=None,
+        rows=0,
+        total=None,
+        bytes=0,
+        error=None,
+        created_at=START,
+        updated_at=START,
+        finished_at=None,
+        **progress,
+    )
+    job.model_dump = lambda: dict(vars(job))
+    return job
+
+
+def _run(job, monkeypatch, tmp_path, cancel_after=None) -> FakeJobs:
+    async def find_logs(parameter, position, skip, take, db):
+        offset = skip
+        if position is not None:
+            offset = next(
+                index + 1
+                for index, row in enumerate(ROWS)
+                if [row["timestamp"], row["id"]] == position
+            )
+        return ROWS[offset : offset + take]
+
+    async def names(db, ids):
+        return {1: "api"}
+
+    monkeypatch.setattr(jobs, "JOB_DIR", tmp_path)
+    monkeypatch.setattr(export_logs, "find_logs", find_logs)
+    monkeypatch.setattr(log_sources, "names", names)
+    monkeypatch.setattr(
+        jobs, "iter_log_pages", partial(export_logs.iter_log_pages, batch_size=2)
+    )
+    fake = FakeJobs(job, cancel_after)
+    asyncio.run(run_job(job.id, SimpleNamespace(job=fake)))
+    return fake
+
+
+def test_limited_export_reports_the_next_cursor(monkeypatch, tmp_path):
+    job = _job({"limit": 3})
+
+    fake = _run(job, monkeypatch, tmp_path)
+
+    lines = (tmp_path / job.id).read_text().splitlines()
+    assert len(lines) == 4
+    assert job.status == DONE and job.rows == 3
+    model = _job_model(job)
+    assert model.next_cursor == job.checkpoint is not None
+    assert [update.get("rows") for update in fake.updates[:3]] == [2, 3, 3]
+
+
+def test_export_without_more_rows_has_no_cursor(monkeypatch, tmp_path):
+    job = _job({"limit": 5})
+
+    _run(job, monkeypatch, tmp_path)
+
+    assert job.status == DONE and job.rows == 5
+    assert _job_model(job).next_cursor is None
+
+
+def test_export_resumes_from_its_checkpoint(monkeypatch, tmp_path):
+    full = _job({})
+    fake = _run(full, monkeypatch, tmp_path)
+    expected = (tmp_path / full.id).read_bytes()
+    checkpoint = fake.updates[0]
+
+    # A worker died after the first checkpoint and a partial second batch
+    resumed = _job({})
+    resumed.checkpoint = checkpoint["checkpoint"]
+    resumed.rows = checkpoint["rows"]
+    resumed.bytes = checkpoint["bytes"]
+    path = tmp_path / resumed.id
+    path.write_bytes(expected[: checkpoint["bytes"]] + b"partial row")
+
+    _run(resumed, monkeypatch, tmp_path)
+
+    assert checkpoint["rows"] == 2
+    assert path.read_bytes() == expected
+    assert resumed.rows == 5
+
+
+def test_cancelled_export_removes_its_file(monkeypatch, tmp_path):
+    job = _job({})
+
+    _run(job, monkeypatch, tmp_path, cancel_after=0)
+
+    assert not (tmp_path / job.id).exists()
+    assert job.status == RUNNING
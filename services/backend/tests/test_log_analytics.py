@@ -0,0 +1,136 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from app.services import log_analytics as module
+from app.services.get_logs_histogram import GetLogsHistogramParameter
+from app.services.log_analytics import AnalyticsScan, LogAnalytics, touch_log_days
+
+DAY = date(2025, 1, 2)
+MIDNIGHT = datetime(2025, 1, 2)
+
+
+class FakeDb:
+    def __init__(self, compacted=()) -> None:
+        self.compacted = compacted
+        self.executed: list[tuple] = []
+
+    async def query_raw(self, query: str, *args):
+        return [{"day": day.isoformat(), "version": 1} for day in self.compacted]
+
+    async def execute_raw(self, query: str, *args):
+        self.executed.append(args)
+
+
+def _write_day(directory, rows) -> str:
+    path = directory / f"day={DAY.isoformat()}" / "version=1" / "part-0.parquet"
+    path.parent.mkdir(parents=True)
+    pq.write_table(pa.Table.from_pylist(rows, schema=module._SCHEMA), path)
+    return str(path)
+
+
+def _row(minute: int, severity: str, source: str, message: str = "ok"):
+    return {
+        "timestamp": MIDNIGHT + timedelta(minutes=minute),
+        "severity": severity,
+        "source": source,
+        "message": message,
+    }
+
+
+def test_only_whole_compacted_days_are_read_from_the_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(module, "ANALYTICS_DIR", str(tmp_path))
+    path = _write_day(tmp_path, [_row(0, "INFO", "api")])
+    ranges = [(MIDNIGHT - timedelta(hours=6), MIDNIGHT + timedelta(days=1, hours=6))]
+
+    postgres, scan = asyncio.run(
+        LogAnalytics(str(tmp_path)).route(
+            FakeDb([DAY]), GetLogsHistogramParameter(), ranges
+        )
+    )
+
+    assert postgres == [
+        (ranges[0][0], MIDNIGHT),
+        (MIDNIGHT + timedelta(days=1), ranges[0][1]),
+    ]
+    assert scan.ranges == [(MIDNIGHT, MIDNIGHT + timedelta(days=1))]
+    assert scan.files == [path]
+
+
+def test_partial_days_stay_in_postgres(monkeypatch, tmp_path):
+    monkeypatch.setattr(module, "ANALYTICS_DIR", str(tmp_path))
+    _write_day(tmp_path, [_row(0, "INFO", "api")])
+    ranges = [(MIDNIGHT + timedelta(hours=1), MIDNIGHT + timedelta(days=2))]
+
+    postgres, scan = asyncio.run(
+        LogAnalytics(str(tmp_path)).route(
+            FakeDb([DAY]), GetLogsHistogramParameter(), ranges
+        )
+    )
+
+    assert postgres == ranges
+    assert scan is None
+
+
+def test_writes_to_closed_days_bump_their_version(monkeypatch):
+    db = FakeDb()
+    recent = datetime.now() - timedelta(minutes=5)
+
+    asyncio.run(touch_log_days(db, [MIDNIGHT, MIDNIGHT, recent]))
+
+    assert db.executed == [(["2025-01-02"],)]
+
+
+def test_histogram_reads_the_parquet_files(tmp_path):
+    pytest.importorskip("duckdb")
+    path = _write_day(
+        tmp_path,
+        [
+            _row(0, "INFO", "api"),
+            _row(3, "ERROR", "api", "disk full"),
+            _row(7, "ERROR", "worker", "Disk full"),
+            _row(70, "ERROR", "api", "disk full"),
+        ],
+    )
+    scan = AnalyticsScan(
+        ranges=[(MIDNIGHT, MIDNIGHT + timedelta(hours=1))], files=[path]
+    )
+    parameter = GetLogsHistogramParameter(q="disk")
+
+    rows = asyncio.run(
+        LogAnalytics(str(tmp_path)).histogram(
+            parameter, scan, timedelta(minutes=5), "source"
+        )
+    )
+
+    assert sorted((row["bucket"], row["key"], row["count"]) for row in rows) == [
+        ("2025-01-02T00:00:00", "api", 1),
+        ("2025-01-02T00:05:00", "worker", 1),
+    ]
+
+
+def test_counts_apply_the_severity_and_source_filters(tmp_path):
+    pytest.importorskip("duckdb")
+    path = _write_day(
+        tmp_path,
+        [
+            _row(0, "INFO", "api"),
+            _row(1, "ERROR", "api"),
+            _row(2, "ERROR", "api"),
+            _row(3, "ERROR", "billing"),
+            _row(4, "WARN", "worker"),
+        ],
+    )
+    scan = AnalyticsScan(ranges=[(None, None)], files=[path])
+    parameter = GetLogsHistogramParameter(
+        min_severity="WARN", exclude_source=["billing"]
+    )
+
+    rows = asyncio.run(LogAnalytics(str(tmp_path)).counts(parameter, scan))
+
+    assert sorted((row["severity"], row["source"], row["_count"]) for row in rows) == [
+        ("ERROR", "api", 2),
+        ("WARN", "worker", 1),
+    ]
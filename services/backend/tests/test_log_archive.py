@@ -0,0 +1,127 @@
+import asyncio
+import base64
+import uuid
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import zstandard
+from app.services import log_archive
+from app.services.get_logs import GetLogsParameter, logs_query
+from app.services.log_archive import LogArchive, _block_values
+from app.utils.cursor import keyset_values
+
+HOUR = datetime(2025, 1, 2, 3)
+
+# Sources created out of alphabetical order, ids don't follow the names
+SOURCES = {1: "zeta", 2: "alpha", 3: "mid"}
+
+
+def _uuid7(moment: datetime, counter: int) -> str:
+    milliseconds = int(moment.replace(tzinfo=UTC).timestamp() * 1000)
+    return str(uuid.UUID(int=milliseconds << 80 | 7 << 76 | 2 << 62 | counter))
+
+
+def _block(block_id: int, source_id: int) -> tuple[dict, str]:
+    # Block n holds two logs of hour n, written a second after them
+    start = HOUR + timedelta(hours=block_id)
+    rows = [
+        (
+            _uuid7(start + timedelta(minutes=index, seconds=1), block_id),
+            start + timedelta(minutes=index),
+            "INFO",
+            source_id,
+            f"message {index}",
+            {},
+            None,
+        )
+        for index in range(2)
+    ]
+    _, _, start, end, low, high, severities, count, _, data = _block_values(
+        zstandard.ZstdCompressor(), None, rows
+    )
+    summary = {
+        "id": block_id,
+        "source_id": source_id,
+        "source": SOURCES[source_id],
+        "start_time": start,
+        "end_time": end,
+        "severities": severities,
+        "rows": count,
+        "dictionary_id": None,
+    }
+    return summary, base64.b64encode(data).decode()
+
+
+class FakeDb:
+    def __init__(self) -> None:
+        blocks = [_block(block_id, block_id) for block_id in SOURCES]
+        self.summaries = [summary for summary, _ in blocks]
+        self.data = {summary["id"]: data for summary, data in blocks}
+        self.loaded: list[int] = []
+
+    async def query_raw(self, query: str, *args):
+        if 'encode("data"' in query:
+            self.loaded.extend(args[0])
+            return [{"id": id, "data": self.data[id]} for id in args[0]]
+        return self.summaries
+
+
+def test_source_sort_follows_names():
+    archive = LogArchive()
+    db = FakeDb()
+    parameter = GetLogsParameter(sort_by="source", sort_order="asc")
+
+    first = asyncio.run(archive.page(db, parameter, None, 3))
+    position = keyset_values("source", SimpleNamespace(**first[-1]))
+    rest = asyncio.run(archive.page(db, parameter, position, 10))
+
+    sources = [row["source"] for row in first + rest]
+    assert sources == ["alpha", "alpha", "mid", "mid", "zeta", "zeta"]
+    assert [row["timestamp"].minute for row in first + rest] == [0, 1, 0, 1, 0, 1]
+
+
+def test_source_sort_query_orders_by_name():
+    parameter = GetLogsParameter(sort_by="source", sort_order="desc")
+    position = ["mid", HOUR, "00000000-0000-7000-8000-000000000000"]
+
+    query, values = logs_query(parameter, position, 0, 10)
+
+    assert 'ORDER BY s."name" COLLATE "C" DESC' in query
+    assert 's."name" COLLATE "C" <= $1::text' in query
+    assert values[0] == "mid"
+
+
+def test_source_sort_stops_after_the_page(monkeypatch):
+    monkeypatch.setattr(log_archive, "_BLOCK_BATCH", 1)
+    db = FakeDb()
+    parameter = GetLogsParameter(sort_by="source", sort_order="desc")
+
+    rows = asyncio.run(LogArchive().page(db, parameter, None, 2))
+
+    assert [row["source"] for row in rows] == ["zeta", "zeta"]
+    assert db.loaded == [1]
+
+
+def test_large_counts_are_estimated_from_a_sample(monkeypatch):
+    db = FakeDb()
+    parameter = GetLogsParameter(q="message 1")
+
+    assert asyncio.run(LogArchive().count(db, parameter)) == (3, True)
+
+    # Six rows to decode, a third of the blocks is sampled
+    monkeypatch.setattr(log_archive, "LOG_ARCHIVE_EXACT_COUNT_ROWS", 2)
+    db.loaded.clear()
+
+    assert asyncio.run(LogArchive().count(db, parameter)) == (3, False)
+    assert db.loaded == [1]
+
+
+def test_find_decodes_the_block_of_the_id_time_first(monkeypatch):
+    monkeypatch.setattr(log_archive, "_BLOCK_BATCH", 1)
+    db = FakeDb()
+    log_id = _uuid7(HOUR + timedelta(hours=2, minutes=1, seconds=1), 2)
+
+    row = asyncio.run(LogArchive().find(db, log_id))
+
+    assert row["id"] == log_id and row["source"] == "alpha"
+    assert db.loaded == [2]
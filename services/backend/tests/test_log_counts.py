@@ -0,0 +1,27 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.services.log_counts import _planner_count
+from app.utils.log_filters import LogFilterParameter
+
+
+class FakeDb:
+    def __init__(self) -> None:
+        self.args: tuple = ()
+
+    async def query_first(self, query: str, *args):
+        self.args = args
+        return {"QUERY PLAN": [{"Plan": {"Plan Rows": 42}}]}
+
+
+def test_planner_count_passes_driver_values():
+    db = FakeDb()
+    parameter = LogFilterParameter(
+        q="timeout",
+        start_date=datetime(2025, 1, 1, 2, tzinfo=timezone(timedelta(hours=2))),
+    )
+
+    assert asyncio.run(_planner_count(parameter, db)) == 42
+    assert "%timeout%" in db.args
+    assert datetime(2025, 1, 1, 0) in db.args
+    assert all(value.tzinfo is None for value in db.args if isinstance(value, datetime))
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from app.utils.log_filters import (
+    LogFilterParameter,
+    compile_log_filter,
+    log_filter_conditions,
+    log_matches,
+)
+from app.utils.sql import SqlParams
+
+
+def _conditions(rollups: bool = False, **filters) -> tuple[list[str], list]:
+    params = SqlParams()
+    conditions = log_filter_conditions(
+        LogFilterParameter(**filters), params, rollups=rollups
+    )
+    return conditions, params.values
+
+
+def test_severities_are_resolved_up_front():
+    compiled = compile_log_filter(
+        LogFilterParameter(min_severity="warn", exclude_severity="error")
+    )
+
+    assert compiled.severities == ("WARN", "FATAL")
+
+
+def test_logs_conditions_bind_severity_codes_and_source_ids():
+    conditions, values = _conditions(severity="error,fatal", source="api")
+
+    assert conditions == [
+        '"severity" = ANY($1::smallint[])',
+        '"source_id" = (SELECT "id" FROM "log_sources" WHERE "name" = $2)',
+    ]
+    assert values == [[3, 4], "api"]
+
+
+def test_rollup_conditions_use_names():
+    conditions, values = _conditions(rollups=True, severity="error", source="api")
+
+    assert conditions == ['"severity" = $1::text', '"source" = $2::text']
+    assert values == ["ERROR", "api"]
+
+
+def test_contradicting_filters_match_nothing():
+    conditions, values = _conditions(severity="info", exclude_severity="info")
+
+    assert conditions == ["FALSE"]
+    assert values == []
+
+
+def test_like_wildcards_are_escaped():
+    conditions, values = _conditions(q="50%_off", source_prefix="web_")
+
+    assert '"message" ILIKE $2' in conditions
+    assert values == ["web\\_%", "%50\\%\\_off%"]
+
+
+def test_time_range():
+    conditions, values = _conditions(
+        start_date="2025-01-01T00:00:00Z", end_date="2025-01-02"
+    )
+
+    assert conditions == [
+        '"timestamp" >= $1::timestamp',
+        '"timestamp" <= $2::timestamp',
+    ]
+    assert values[1] == datetime(2025, 1, 2)
+
+
+def test_log_matches():
+    compiled = compile_log_filter(
+        LogFilterParameter(min_severity="warn", source_prefix="api")
+    )
+
+    assert log_matches(compiled, {"severity": "ERROR", "source": "api-gateway"})
+    assert not log_matches(compiled, {"severity": "INFO", "source": "api-gateway"})
+    assert not log_matches(compiled, {"severity": "ERROR", "source": "database"})
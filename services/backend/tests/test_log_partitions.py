@@ -0,0 +1,135 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from app.services import log_partitions
+from app.services.log_partitions import ensure_log_partitions_svc
+
+
+class FakeDb:
+    def __init__(self, oldest_default) -> None:
+        self.oldest_default = oldest_default
+        self.statements: list[str] = []
+
+    @asynccontextmanager
+    async def tx(self, timeout=None):
+        yield self
+
+    async def query_first(self, query: str, *args):
+        if "pg_try_advisory_xact_lock" in query:
+            return {"locked": True}
+        return {"timestamp": self.oldest_default}
+
+    async def query_raw(self, query: str, *args):
+        return [
+            {
+                "name": "logs_p20250110",
+                "bound": "FOR VALUES FROM ('2025-01-10 00:00:00') "
+                "TO ('2025-01-11 00:00:00')",
+            }
+        ]
+
+    async def execute_raw(self, query: str, *args):
+        self.statements.append(query)
+
+
+def _created(oldest_default, monkeypatch) -> list[str]:
+    monkeypatch.setattr(log_partitions, "LOG_PARTITION_PREMAKE_DAYS", 0)
+    db = FakeDb(oldest_default)
+    return asyncio.run(ensure_log_partitions_svc(db, now=datetime(2025, 1, 10, 12)))
+
+
+def test_partitions_cover_the_default_partition(monkeypatch):
+    created = _created("2025-01-07T05:00:00+00:00", monkeypatch)
+
+    assert created == ["logs_p20250107", "logs_p20250108", "logs_p20250109"]
+
+
+def test_empty_default_partition(monkeypatch):
+    assert _created(None, monkeypatch) == []
+
+
+class FakeCursor:
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query: str, args=()):
+        self.connection.statements.append(" ".join(query.split()))
+        if "pg_try_advisory_lock" in query:
+            self.row = (True,)
+        elif "inhdetachpending" in query:
+            pending = self.connection.partitions.get(args[0])
+            self.row = None if pending is None else (pending,)
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, partitions) -> None:
+        self.partitions = partitions
+        self.statements: list[str] = []
+        self.autocommit = False
+
+    def cursor(self):
+        assert self.autocommit, "DETACH CONCURRENTLY can't run in a transaction"
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def test_partitions_are_detached_concurrently(monkeypatch):
+    # An attached partition, one left pending by an interrupted detach and
+    # one already detached but not dropped
+    connection = FakeConnection({"logs_p20250101": False, "logs_p20250102": True})
+    monkeypatch.setattr(
+        log_partitions.psycopg2, "connect", lambda *args, **kwargs: connection
+    )
+
+    dropped = log_partitions._detach_partitions(
+        "postgresql://localhost/logs",
+        ["logs_p20250101", "logs_p20250102", "logs_p20250103"],
+    )
+
+    assert dropped == ["logs_p20250101", "logs_p20250102", "logs_p20250103"]
+    ddl = [s for s in connection.statements if s.startswith(("ALTER", "DROP"))]
+    assert ddl == [
+        'ALTER TABLE "logs" DETACH PARTITION "logs_p20250101" CONCURRENTLY',
+        'DROP TABLE IF EXISTS "logs_p20250101"',
+        'ALTER TABLE "logs" DETACH PARTITION "logs_p20250102" FINALIZE',
+        'DROP TABLE IF EXISTS "logs_p20250102"',
+        'DROP TABLE IF EXISTS "logs_p20250103"',
+    ]
+
+
+def test_expired_partitions_are_cleaned_up_before_the_drop(monkeypatch):
+    db = FakeDb(None)
+    detached = []
+
+    def detach(database_url, names):
+        # The rollups of the range are gone before the table is
+        assert any("log_rollups" in statement for statement in db.statements)
+        detached.extend(names)
+        return names
+
+    async def invalidate(*args):
+        pass
+
+    monkeypatch.setenv("DATABASE_URL", "postgresql://localhost/logs")
+    monkeypatch.setattr(log_partitions, "_detach_partitions", detach)
+    monkeypatch.setattr(log_partitions.response_cache, "invalidate", invalidate)
+
+    dropped = asyncio.run(
+        log_partitions.drop_expired_log_partitions_svc(db, 30, now=datetime(2025, 3, 1))
+    )
+
+    assert dropped == detached == ["logs_p20250110"]
+    assert not any("DROP TABLE" in statement for statement in db.statements)
@@ -0,0 +1,192 @@
+import asyncio
+import base64
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import zstandard
+from app.services import log_purge
+from app.services.log_archive import ArchiveBlock, _block_values, _decode_block
+from app.services.log_purge import (
+    EmptyPurgeFilterError,
+    LogPurgeParameter,
+    _purge_archive_batch,
+    create_log_purge_svc,
+    enqueue_retention_purges_svc,
+    parse_severity_retention,
+    run_log_purge_job,
+)
+from app.services.log_sources import log_sources
+
+HOUR = datetime(2025, 1, 2, 3)
+NOW = datetime(2025, 3, 1)
+
+ROWS = [
+    (
+        f"00000000-0000-7000-8000-00000000000{index}",
+        HOUR.replace(minute=index),
+        severity,
+        1,
+        f"message {index}",
+        {},
+        None,
+    )
+    for index, severity in enumerate(["ERROR", "INFO", "ERROR"], start=1)
+]
+
+
+class FakeDb:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.statements: list[tuple] = []
+
+    @asynccontextmanager
+    async def tx(self, timeout=None):
+        yield self
+
+    async def query_first(self, query: str, *args):
+        return {"status": log_purge.RUNNING}
+
+    async def query_raw(self, query: str, *args):
+        return [{"id": 7, "data": base64.b64encode(self.data).decode()}]
+
+    async def execute_raw(self, query: str, *args):
+        self.statements.append((" ".join(query.split()), args))
+
+
+def test_purge_rewrites_archive_blocks_and_rollups(monkeypatch):
+    *_, data = _block_values(zstandard.ZstdCompressor(), None, ROWS)
+    block = ArchiveBlock(7, 1, "api", HOUR, HOUR, ("INFO", "ERROR"), 3, None)
+    changes = []
+
+    async def names(db, ids):
+        return {1: "api"}
+
+    async def apply_rollup_changes(db, rollup_changes):
+        changes.extend(rollup_changes)
+
+    monkeypatch.setattr(log_sources, "names", names)
+    monkeypatch.setattr(log_purge, "apply_rollup_changes", apply_rollup_changes)
+    db = FakeDb(data)
+
+    deleted = asyncio.run(
+        _purge_archive_batch(db, "job", LogPurgeParameter(severity=["ERROR"]), [block])
+    )
+
+    assert deleted == 2
+    assert [change[:3] for change in changes] == [("ERROR", "api", None)] * 2
+    assert all(change[4] == -1 for change in changes)
+    delete, insert, job = db.statements
+    assert delete == ('DELETE FROM "log_archive_blocks" WHERE "id" = $1', (7,))
+    # The remaining row is written as a new block with its own summary
+    values = insert[1]
+    assert values[4:8] == (ROWS[1][0], ROWS[1][0], ["INFO"], 1)
+    rows = _decode_block(base64.b64decode(values[-1]), None, 1)
+    assert [row["message"] for row in rows] == ["message 2"]
+    assert rows[0]["timestamp"] == ROWS[1][1].replace(tzinfo=UTC)
+    assert job[1][1] == 2
+
+
+def test_purge_leaves_blocks_without_matching_rows(monkeypatch):
+    *_, data = _block_values(zstandard.ZstdCompressor(), None, ROWS)
+    block = ArchiveBlock(7, 1, "api", HOUR, HOUR, ("INFO", "ERROR"), 3, None)
+
+    async def names(db, ids):
+        return {}
+
+    monkeypatch.setattr(log_sources, "names", names)
+    db = FakeDb(data)
+
+    deleted = asyncio.run(
+        _purge_archive_batch(db, "job", LogPurgeParameter(q="missing"), [block])
+    )
+
+    assert deleted == 0
+    assert len(db.statements) == 1
+
+
+def test_parse_severity_retention():
+    assert parse_severity_retention(" debug=7, INFO=30 ,") == {"DEBUG": 7, "INFO": 30}
+    assert parse_severity_retention("") == {}
+
+
+def test_purge_needs_a_filter():
+    with pytest.raises(EmptyPurgeFilterError):
+        asyncio.run(create_log_purge_svc(LogPurgeParameter(), None))
+
+
+class FakeJobs:
+    def __init__(self, active=()) -> None:
+        self.active = set(active)
+        self.created = []
+
+    async def find_first(self, where):
+        return object() if where["reason"] in self.active else None
+
+    async def create(self, data):
+        self.created.append(data)
+        return SimpleNamespace(
+            model_dump=lambda: {
+                **data,
+                "filter": data["filter"].data,
+                "deleted": 0,
+                "batches": 0,
+                "created_at": NOW,
+                "updated_at": NOW,
+            }
+        )
+
+
+def test_retention_queues_one_purge_per_severity():
+    jobs = FakeJobs(active={"retention:INFO"})
+    db = SimpleNamespace(logpurgejob=jobs)
+
+    queued = asyncio.run(
+        enqueue_retention_purges_svc(db, {"DEBUG": 7, "INFO": 30, "WARN": 0}, now=NOW)
+    )
+
+    assert [job.reason for job in queued] == ["retention:DEBUG"]
+    assert queued[0].filter == {
+        "severity": ["DEBUG"],
+        "end_date": (NOW - timedelta(days=7)).isoformat(),
+    }
+
+
+def test_purge_runs_batches_then_the_archive(monkeypatch):
+    batches = [3, 3, 1]
+    finished = []
+
+    async def purge_batch(db, job_id, parameter, batch_size):
+        return batches.pop(0)
+
+    async def purge_blocks(db, parameter):
+        return ["block"] * 3
+
+    async def purge_archive_batch(db, job_id, parameter, blocks):
+        return len(blocks)
+
+    async def finish_job(db, job_id, status, error=None):
+        finished.append(status)
+
+    async def noop(*args):
+        pass
+
+    async def find_unique(where):
+        return SimpleNamespace(filter={"source": ["api"]}, deleted=0, batch_size=3)
+
+    monkeypatch.setattr(log_purge, "_purge_batch", purge_batch)
+    monkeypatch.setattr(log_purge.log_archive, "purge_blocks", purge_blocks)
+    monkeypatch.setattr(log_purge, "_purge_archive_batch", purge_archive_batch)
+    monkeypatch.setattr(log_purge, "_finish_job", finish_job)
+    monkeypatch.setattr(log_purge.response_cache, "invalidate", noop)
+    monkeypatch.setattr(log_purge, "LOG_PURGE_BATCH_DELAY_MS", 0)
+    monkeypatch.setattr(log_purge, "LOG_ARCHIVE_BLOCK_ROWS", 2)
+    progress = []
+    db = SimpleNamespace(logpurgejob=SimpleNamespace(find_unique=find_unique))
+
+    asyncio.run(run_log_purge_job("job", db, progress.append))
+
+    # Three table batches, then the blocks one at a time
+    assert progress == [3, 6, 7, 8, 9, 10]
+    assert finished == [log_purge.DONE]
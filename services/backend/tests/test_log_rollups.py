@@ -0,0 +1,94 @@
+import asyncio
+from datetime import UTC, datetime
+
+from app.services import log_rollups
+from app.services.log_rollups import apply_rollup_changes, log_rollup_change
+
+MOMENT = datetime(2025, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+
+class FakeDb:
+    def __init__(self) -> None:
+        self.upserts: dict[str, list[tuple]] = {}
+
+    async def execute_raw(self, query: str, *columns):
+        table = (
+            "log_pattern_rollups" if "log_pattern_rollups" in query else "log_rollups"
+        )
+        self.upserts[table] = list(zip(*columns))
+
+
+def _apply(changes, monkeypatch) -> FakeDb:
+    touched = []
+
+    async def touch_log_days(db, timestamps):
+        touched.extend(timestamps)
+
+    monkeypatch.setattr(log_rollups, "touch_log_days", touch_log_days)
+    db = FakeDb()
+    asyncio.run(apply_rollup_changes(db, changes))
+    db.touched = touched
+    return db
+
+
+def test_changes_are_folded_per_bucket(monkeypatch):
+    db = _apply(
+        [
+            ("ERROR", "api", 11, MOMENT, 1),
+            ("ERROR", "api", 11, MOMENT.replace(second=59), 1),
+            ("ERROR", "api", None, MOMENT.replace(minute=30), 1),
+        ],
+        monkeypatch,
+    )
+
+    rollups = {(row[0], row[1]): row[4] for row in db.upserts["log_rollups"]}
+    assert rollups[("minute", "2025-01-02T03:04:00")] == 2
+    assert rollups[("minute", "2025-01-02T03:30:00")] == 1
+    assert rollups[("hour", "2025-01-02T03:00:00")] == 3
+    assert rollups[("day", "2025-01-02T00:00:00")] == 3
+    # Logs without a pattern only count in the plain rollups
+    patterns = {(row[0], row[1]): row[5] for row in db.upserts["log_pattern_rollups"]}
+    assert patterns[("hour", "2025-01-02T03:00:00")] == 2
+    assert len(db.touched) == 3
+
+
+def test_changes_that_cancel_out_write_nothing(monkeypatch):
+    log = {
+        "severity": "INFO",
+        "source": "api",
+        "message": "User 42 logged in",
+        "timestamp": MOMENT,
+    }
+
+    db = _apply([log_rollup_change(log, 1), log_rollup_change(log, -1)], monkeypatch)
+
+    assert db.upserts == {}
+
+
+def test_rollup_change_fingerprints_the_message():
+    first = log_rollup_change(
+        {
+            "severity": "INFO",
+            "source": "api",
+            "message": "User 42",
+            "timestamp": MOMENT,
+        },
+        1,
+    )
+    second = log_rollup_change(
+        {"severity": "INFO", "source": "api", "message": "User 7", "timestamp": MOMENT},
+        1,
+    )
+    stored = log_rollup_change(
+        {
+            "severity": "INFO",
+            "source": "api",
+            "message": "User 7",
+            "timestamp": MOMENT,
+            "pattern_id": None,
+        },
+        1,
+    )
+
+    assert first[2] == second[2] is not None
+    assert stored[2] is None
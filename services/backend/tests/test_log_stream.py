@@ -0,0 +1,39 @@
+import json
+
+from app.services.log_stream import NOTIFY_MAX_PAYLOAD, _notify_payloads
+
+
+def _log(index: int, message: str = "request handled", metadata=None) -> dict:
+    return {
+        "id": f"log-{index}",
+        "severity": "INFO",
+        "message": message,
+        "source": "api-gateway",
+        "timestamp": "2025-01-01T00:00:00+00:00",
+        "metadata": metadata or {},
+    }
+
+
+def test_notify_payloads_split_to_fit():
+    logs = [_log(index, "x" * 500) for index in range(50)]
+
+    payloads = _notify_payloads(logs)
+
+    assert len(payloads) > 1
+    assert all(len(payload) <= NOTIFY_MAX_PAYLOAD for payload in payloads)
+    decoded = [log for payload in payloads for log in json.loads(payload)]
+    assert decoded == logs
+
+
+def test_notify_payloads_truncate_oversized_log():
+    large = _log(1, "é" * 5000, {"body": "y" * 20_000})
+
+    payloads = _notify_payloads([_log(0), large])
+
+    assert all(len(payload) <= NOTIFY_MAX_PAYLOAD for payload in payloads)
+    decoded = [log for payload in payloads for log in json.loads(payload)]
+    assert decoded[0] == _log(0)
+    assert decoded[1]["id"] == "log-1"
+    assert decoded[1]["truncated"] is True
+    assert decoded[1]["metadata"] == {}
+    assert large["message"].startswith(decoded[1]["message"])
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import UTC, datetime
+
+from app.services import log_write_buffer as module
+from app.services.log_write_buffer import LogWriteBuffer, WriteDurability
+
+
+def _buffer(durability: WriteDurability, failures: int, monkeypatch):
+    monkeypatch.setattr(module, "LOG_WRITE_BUFFER_RETRY_DELAY", 0)
+    buffer = LogWriteBuffer(
+        enabled=True,
+        max_batch=10,
+        max_delay=0,
+        max_queue=10,
+        durability=durability,
+        flush_retries=2,
+    )
+    attempts = []
+
+    async def write(rows):
+        attempts.append(len(rows))
+        if len(attempts) <= failures:
+            raise RuntimeError("database unavailable")
+
+    async def noop(*args):
+        pass
+
+    buffer._write = write
+    monkeypatch.setattr(module.response_cache, "invalidate", noop)
+    monkeypatch.setattr(module.log_stream_hub, "publish", noop)
+    return buffer, attempts
+
+
+def _row():
+    return {"message": "hi", "timestamp": datetime.now(UTC)}
+
+
+def test_enqueue_flush_is_retried(monkeypatch):
+    buffer, attempts = _buffer(WriteDurability.ENQUEUE, 2, monkeypatch)
+
+    asyncio.run(buffer._flush([(_row(), None)]))
+
+    assert len(attempts) == 3
+    assert buffer.flushed_rows == 1
+    assert buffer.lost_rows == 0
+
+
+def test_enqueue_rows_are_counted_when_lost(monkeypatch):
+    buffer, attempts = _buffer(WriteDurability.ENQUEUE, 5, monkeypatch)
+
+    asyncio.run(buffer._flush([(_row(), None), (_row(), None)]))
+
+    assert len(attempts) == 3
+    assert buffer.lost_rows == 2
+    assert buffer.stats()["lost_rows"] == 2
+
+
+def test_flush_mode_fails_the_callers(monkeypatch):
+    buffer, attempts = _buffer(WriteDurability.FLUSH, 1, monkeypatch)
+
+    async def run():
+        future = asyncio.get_running_loop().create_future()
+        await buffer._flush([(_row(), future)])
+        return future.exception()
+
+    assert isinstance(asyncio.run(run()), RuntimeError)
+    assert len(attempts) == 1
+    assert buffer.lost_rows == 0
+
+
+def test_cache_failure_keeps_the_flusher_running(monkeypatch):
+    buffer, attempts = _buffer(WriteDurability.FLUSH, 0, monkeypatch)
+
+    async def invalidate(*args):
+        raise ConnectionError("redis unavailable")
+
+    monkeypatch.setattr(module.response_cache, "invalidate", invalidate)
+
+    async def run():
+        await buffer.start(None)
+        await asyncio.wait_for(buffer.submit(_row()), 1)
+        await asyncio.wait_for(buffer.submit(_row()), 1)
+        running = buffer.running
+        await buffer.stop()
+        return running
+
+    assert asyncio.run(run())
+    assert attempts == [1, 1]
+
+
+def test_stop_writes_waiting_rows_and_refuses_new_ones(monkeypatch):
+    buffer, attempts = _buffer(WriteDurability.ENQUEUE, 0, monkeypatch)
+    buffer.max_queue = 1
+
+    async def run():
+        await buffer.start(None)
+        # The flusher has not taken anything yet, so these wait for space
+        waiting = [asyncio.create_task(buffer.submit(_row())) for _ in range(3)]
+        await asyncio.sleep(0)
+        await buffer.stop()
+        await asyncio.gather(*waiting)
+        try:
+            await buffer.submit(_row())
+        except RuntimeError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+    assert sum(attempts) == 3
+    assert buffer.flushed_rows == 3
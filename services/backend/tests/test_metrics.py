@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+import pytest
+from app.services import metrics
+from app.services.metrics import (
+    SERVICE_ERRORS,
+    SERVICE_ROWS,
+    MetricsMiddleware,
+    instrumented,
+    timed,
+)
+from prisma import Prisma
+
+
+class FakeDb(Prisma):
+    def __init__(self) -> None:
+        self.queries: list[str] = []
+
+    async def query_first(self, query: str, *args):
+        self.queries.append(query)
+        return {"QUERY PLAN": [{"Plan": {"Node Type": "Seq Scan"}}]}
+
+
+def _sample(metric, name: str, function: str) -> float:
+    value = metric.collect()[0]
+    for sample in value.samples:
+        if sample.name == name and sample.labels.get("function") == function:
+            return sample.value
+    return 0.0
+
+
+def _request(app):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+    asyncio.run(MetricsMiddleware(app)(scope, receive, send))
+    return dict(messages[0]["headers"])
+
+
+def test_server_timing_reports_the_service_time(monkeypatch):
+    monkeypatch.setattr(metrics, "SERVER_TIMING", True)
+
+    @instrumented()
+    async def timing_service(parameter):
+        with timed("serialize"):
+            pass
+        return parameter
+
+    async def app(scope, receive, send):
+        await timing_service(None)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    header = _request(app)[b"server-timing"].decode()
+
+    assert [metric.split(";")[0] for metric in header.split(", ")] == [
+        "serialize",
+        "db",
+        "total",
+    ]
+
+
+def test_instrumented_counts_rows_and_errors():
+    @instrumented(rows=len)
+    async def counted_service(parameter):
+        if parameter is None:
+            raise ValueError("no rows")
+        return parameter
+
+    asyncio.run(counted_service([1, 2, 3]))
+    with pytest.raises(ValueError):
+        asyncio.run(counted_service(None))
+
+    rows = _sample(SERVICE_ROWS, "logdash_service_rows_sum", "counted_service")
+    errors = _sample(SERVICE_ERRORS, "logdash_service_errors_total", "counted_service")
+    assert (rows, errors) == (3, 1)
+
+
+def test_slow_calls_are_logged_with_their_plan(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_LOG_MS", 0.001)
+    db = FakeDb()
+
+    @instrumented(explain=lambda parameter: ("SELECT 1", []))
+    async def slow_service(parameter, db):
+        await asyncio.sleep(0.001)
+        return parameter
+
+    async def run():
+        await slow_service({"q": "disk"}, db)
+        await asyncio.gather(*metrics._explain_tasks)
+
+    with caplog.at_level(logging.WARNING, logger=metrics.__name__):
+        asyncio.run(run())
+
+    assert db.queries == ["EXPLAIN (FORMAT JSON) SELECT 1"]
+    assert "Seq Scan" in caplog.text
+    assert '"q": "disk"' in caplog.text
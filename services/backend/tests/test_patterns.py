@@ -0,0 +1,38 @@
+import pytest
+from app.utils.patterns import message_pattern, message_template
+
+
+@pytest.mark.parametrize(
+    "message, template",
+    [
+        (
+            "User user_123 logged in from 10.0.0.1:8080",
+            "User <*> logged in from <ip>",
+        ),
+        (
+            "Request 0192f5d4-3c1e-7a5b-8c2d-4e6f8a0b1c2d took 150ms",
+            "Request <uuid> took <*>",
+        ),
+        ("Sent mail to jane.doe@example.com", "Sent mail to <email>"),
+        ("Query 'SELECT 1' returned 25 rows", "Query <str> returned <num> rows"),
+        ("Commit deadbeef12 pushed", "Commit <hex> pushed"),
+        ("Job started at 2025-01-02T03:04:05.123Z", "Job started at <ts>"),
+        (
+            "Retry at 2025-01-02 03:04:05+02:00 (attempt 3)",
+            "Retry at <ts> (attempt <num>)",
+        ),
+        ("Backup of 2025-01-02 done", "Backup of <ts> done"),
+        ("Pool   size  -1.5", "Pool size <num>"),
+    ],
+)
+def test_variable_parts_are_masked(message, template):
+    assert message_template(message) == template
+
+
+def test_messages_of_one_template_share_the_pattern():
+    first, template = message_pattern("Job started at 2025-01-02T03:04:05Z")
+    second, _ = message_pattern("Job started at 2025-11-30T23:59:59.999Z")
+
+    assert first == second
+    assert template == "Job started at <ts>"
+    assert message_pattern("Job stopped at 2025-01-02T03:04:05Z")[0] != first
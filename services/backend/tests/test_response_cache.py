@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime
+
+from app.services.response_cache import MemoryCacheBackend, ResponseCache
+from app.utils.log_filters import LogFilterParameter
+
+
+def _cache() -> ResponseCache:
+    return ResponseCache(enabled=True, backend=MemoryCacheBackend(16), ttl=60)
+
+
+def _counter():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return str(len(calls)).encode()
+
+    return calls, compute
+
+
+def test_invalidation_is_scoped_to_days():
+    async def run():
+        cache = _cache()
+        calls, compute = _counter()
+        past = LogFilterParameter(
+            start_date=datetime(2025, 1, 1), end_date=datetime(2025, 1, 2)
+        )
+        open_ended = LogFilterParameter(start_date=datetime(2025, 1, 1))
+
+        await cache.get_or_compute("logs", past, compute)
+        await cache.get_or_compute("logs", open_ended, compute)
+        now = datetime(2025, 3, 1, 12)
+        await cache.invalidate(now, now)
+        await cache.get_or_compute("logs", past, compute)
+        await cache.get_or_compute("logs", open_ended, compute)
+        assert len(calls) == 3
+
+        await cache.invalidate(datetime(2025, 1, 2, 8), datetime(2025, 1, 2, 9))
+        await cache.get_or_compute("logs", past, compute)
+        await cache.invalidate()
+        await cache.get_or_compute("logs", past, compute)
+        assert len(calls) == 5
+
+    asyncio.run(run())
+
+
+def test_waiters_take_over_from_cancelled_leader():
+    async def run():
+        cache = _cache()
+        parameter = LogFilterParameter()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return b"ok"
+
+        leader = asyncio.create_task(cache.get_or_compute("logs", parameter, slow))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_compute("logs", parameter, fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await waiter == b"ok"
+        assert leader.cancelled()
+        assert cache.coalesced == 1
+
+    asyncio.run(run())
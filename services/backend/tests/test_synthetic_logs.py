@@ -0,0 +1,88 @@
+import random
+import uuid
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from itertools import accumulate
+
+import pytest
+from app.models.log_models import SEVERITY_CODES
+from app.services import synthetic_logs
+from app.services.synthetic_logs import (
+    SyntheticLogsConfig,
+    _uuid7,
+    generate_copy_batch,
+    minute_weights,
+    parse_severity_ratios,
+)
+
+START = datetime(2025, 1, 2, tzinfo=UTC)
+
+
+def _batch(seed: int, rows: int, ratios: dict[str, float]) -> list[list[str]]:
+    config = SyntheticLogsConfig(rows=rows, start=START, end=START + timedelta(hours=1))
+    data = generate_copy_batch(
+        rows,
+        random.Random(seed),
+        config.start,
+        list(accumulate(minute_weights(config))),
+        list(ratios),
+        list(accumulate(ratios.values())),
+        [1, 2],
+        [1.0, 2.0],
+    )
+    return [line.split("\t") for line in data.decode().splitlines()]
+
+
+def test_batches_are_reproducible_from_the_seed():
+    ratios = synthetic_logs.DEFAULT_SEVERITY_RATIOS
+
+    assert _batch(7, 50, ratios) == _batch(7, 50, ratios)
+    assert _batch(7, 50, ratios) != _batch(8, 50, ratios)
+
+
+def test_rows_follow_the_severity_ratios():
+    ratios = parse_severity_ratios("INFO=3,ERROR=1")
+
+    rows = _batch(1, 4000, ratios)
+
+    severities = Counter(int(row[1]) for row in rows)
+    assert set(severities) == {SEVERITY_CODES["INFO"], SEVERITY_CODES["ERROR"]}
+    share = severities[SEVERITY_CODES["INFO"]] / len(rows)
+    assert 0.7 < share < 0.8
+
+
+def test_rows_are_valid_copy_lines():
+    for row in _batch(3, 200, synthetic_logs.DEFAULT_SEVERITY_RATIOS):
+        assert len(row) == 7
+        moment = datetime.strptime(row[4], "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=UTC)
+        assert START <= moment < START + timedelta(hours=1)
+        # The id carries the millisecond of the timestamp
+        assert uuid.UUID(row[0]).int >> 80 == int(moment.timestamp() * 1000)
+
+
+def test_uuid7_is_time_ordered():
+    rng = random.Random(0)
+
+    ids = [_uuid7(milliseconds, rng) for milliseconds in range(1000, 1100)]
+
+    assert ids == sorted(ids)
+    assert {uuid.UUID(value).version for value in ids} == {7}
+    assert {uuid.UUID(value).variant for value in ids} == {uuid.RFC_4122}
+
+
+def test_traffic_peaks_in_the_afternoon():
+    config = SyntheticLogsConfig(
+        rows=0, start=START, end=START + timedelta(days=1), bursts_per_day=0
+    )
+
+    weights = minute_weights(config)
+
+    assert len(weights) == 1440
+    assert weights.index(max(weights)) == 14 * 60
+
+
+def test_unknown_severity_ratios_are_rejected():
+    with pytest.raises(ValueError):
+        parse_severity_ratios("INFO=1,NOTICE=2")
+    with pytest.raises(ValueError):
+        parse_severity_ratios("INFO=0")
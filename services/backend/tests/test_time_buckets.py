@@ -0,0 +1,47 @@
+from datetime import UTC, datetime, timedelta
+
+from app.utils.time_buckets import (
+    ceil_bucket,
+    exclusive_end,
+    floor_bucket,
+    plan_time_range,
+    truncate_ms,
+)
+
+MOMENT = datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=UTC)
+
+
+def test_floor_and_ceil_buckets():
+    assert floor_bucket(MOMENT, "minute") == datetime(2025, 1, 2, 3, 4, tzinfo=UTC)
+    assert floor_bucket(MOMENT, "hour") == datetime(2025, 1, 2, 3, tzinfo=UTC)
+    assert floor_bucket(MOMENT, "day") == datetime(2025, 1, 2, tzinfo=UTC)
+    assert ceil_bucket(MOMENT, "hour") == datetime(2025, 1, 2, 4, tzinfo=UTC)
+    day = datetime(2025, 1, 2, tzinfo=UTC)
+    assert ceil_bucket(day, "day") == day
+
+
+def test_truncate_ms_and_exclusive_end():
+    assert truncate_ms(MOMENT).microsecond == 678000
+    assert exclusive_end(MOMENT) > MOMENT
+    assert exclusive_end(None) is None
+
+
+def test_plan_splits_whole_buckets_from_the_edges():
+    start = datetime(2025, 1, 1, 22, 30, tzinfo=UTC)
+    end = datetime(2025, 1, 4, 1, 15, 30, tzinfo=UTC)
+
+    plan = plan_time_range(start, end)
+
+    days = ("day", datetime(2025, 1, 2, tzinfo=UTC), datetime(2025, 1, 4, tzinfo=UTC))
+    assert days in plan.rollup
+    assert plan.raw == [(datetime(2025, 1, 4, 1, 15, tzinfo=UTC), end)]
+    # The pieces tile the range without gaps or overlaps
+    pieces = sorted([(low, high) for _, low, high in plan.rollup] + plan.raw)
+    assert pieces[0][0] == start and pieces[-1][1] == end
+    assert all(left[1] == right[0] for left, right in zip(pieces, pieces[1:]))
+
+
+def test_empty_range_has_no_plan():
+    plan = plan_time_range(MOMENT, MOMENT - timedelta(hours=1))
+
+    assert plan.rollup == [] and plan.raw == []
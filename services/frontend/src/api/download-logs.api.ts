@@ -4,10 +4,7 @@ import { ofetch } from "ofetch";
 import { z } from "zod";
 
 export async function downloadLogs(params?: Partial<GetLogsParameter>): Promise<Blob> {
-  const validatedParams = GetLogsParameterSchema.parse({
-    ...params,
-    limit: params?.limit || 10000,
-  });
+  const validatedParams = GetLogsParameterSchema.parse(params || {});
 
   try {
     const searchParams = new URLSearchParams();
@@ -24,7 +21,10 @@ export async function downloadLogs(params?: Partial<GetLogsParameter>): Promise<
     if (validatedParams.end_date) {
       searchParams.append("end_date", validatedParams.end_date);
     }
-    searchParams.append("limit", validatedParams.limit.toString());
+    // The export streams every matching row unless a limit is asked for explicitly
+    if (params?.limit) {
+      searchParams.append("limit", validatedParams.limit.toString());
+    }
     searchParams.append("offset", validatedParams.offset.toString());
 
     const url = `${API_BASE_URL}/api/v1/logs/download${searchParams.toString() ? `?${searchParams.toString()}` : ""}`;